@@ -0,0 +1,23 @@
+"""add composite (device_id, ts) index on measurements
+
+Revision ID: 20251120_0004
+Revises: 20251113_0003
+Create Date: 2025-11-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251120_0004'
+down_revision = '20251113_0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_measurements_device_ts', 'measurements', ['device_id', 'ts'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_measurements_device_ts', table_name='measurements')
@@ -0,0 +1,52 @@
+"""create alert_events table
+
+Revision ID: 20251125_0005
+Revises: 20251120_0004
+Create Date: 2025-11-25 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251125_0005'
+down_revision = '20251120_0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'alert_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('bit', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('ended_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('duration_s', sa.Float(), nullable=True),
+        sa.Column('start_measurement_id', sa.Integer(), nullable=True),
+        sa.Column('end_measurement_id', sa.Integer(), nullable=True),
+        sa.Column('samples', sa.Integer(), nullable=True),
+        sa.Column('max_temp_aire_c', sa.Float(), nullable=True),
+        sa.Column('min_temp_aire_c', sa.Float(), nullable=True),
+        sa.Column('max_temp_piel_c', sa.Float(), nullable=True),
+        sa.Column('max_humedad', sa.Float(), nullable=True),
+        sa.Column('min_humedad', sa.Float(), nullable=True),
+        sa.Column('min_peso_g', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alert_events_id'), 'alert_events', ['id'], unique=False)
+    op.create_index('ix_alert_events_device_started', 'alert_events', ['device_id', 'started_at'], unique=False)
+    op.create_index('ix_alert_events_started', 'alert_events', ['started_at'], unique=False)
+    op.create_index(
+        'uq_alert_events_open', 'alert_events', ['device_id', 'bit'], unique=True,
+        postgresql_where=sa.text('ended_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_alert_events_open', table_name='alert_events')
+    op.drop_index('ix_alert_events_started', table_name='alert_events')
+    op.drop_index('ix_alert_events_device_started', table_name='alert_events')
+    op.drop_index(op.f('ix_alert_events_id'), table_name='alert_events')
+    op.drop_table('alert_events')
@@ -0,0 +1,90 @@
+"""alert rules, rule state checkpoints and device wards
+
+Revision ID: 20251201_0006
+Revises: 20251125_0005
+Create Date: 2025-12-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251201_0006'
+down_revision = '20251125_0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('ward', sa.String(), nullable=True))
+    op.create_index(op.f('ix_devices_ward'), 'devices', ['ward'], unique=False)
+
+    op.create_table(
+        'alert_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('variable', sa.String(), nullable=True),
+        sa.Column('op', sa.String(), nullable=True),
+        sa.Column('threshold', sa.Float(), nullable=True),
+        sa.Column('hysteresis', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('window_s', sa.Float(), nullable=True),
+        sa.Column('timeout_s', sa.Float(), nullable=True),
+        sa.Column('device_id', sa.String(), nullable=True),
+        sa.Column('ward', sa.String(), nullable=True),
+        sa.Column('enabled', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alert_rules_id'), 'alert_rules', ['id'], unique=False)
+    op.create_index(op.f('ix_alert_rules_device_id'), 'alert_rules', ['device_id'], unique=False)
+    op.create_index(op.f('ix_alert_rules_ward'), 'alert_rules', ['ward'], unique=False)
+
+    op.create_table(
+        'alert_rule_states',
+        sa.Column('rule_id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('state', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['rule_id'], ['alert_rules.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('rule_id', 'device_id')
+    )
+
+    # Episodios de reglas en alert_events
+    op.add_column('alert_events', sa.Column('rule_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_alert_events_rule_id', 'alert_events', 'alert_rules', ['rule_id'], ['id'], ondelete='CASCADE'
+    )
+    op.drop_index('uq_alert_events_open', table_name='alert_events')
+    op.create_index(
+        'uq_alert_events_open', 'alert_events', ['device_id', 'bit'], unique=True,
+        postgresql_where=sa.text('ended_at IS NULL AND rule_id IS NULL'),
+    )
+    op.create_index(
+        'uq_alert_events_open_rule', 'alert_events', ['device_id', 'rule_id'], unique=True,
+        postgresql_where=sa.text('ended_at IS NULL AND rule_id IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_alert_events_open_rule', table_name='alert_events')
+    op.drop_index('uq_alert_events_open', table_name='alert_events')
+    op.execute('DELETE FROM alert_events WHERE rule_id IS NOT NULL')
+    op.create_index(
+        'uq_alert_events_open', 'alert_events', ['device_id', 'bit'], unique=True,
+        postgresql_where=sa.text('ended_at IS NULL'),
+    )
+    op.drop_constraint('fk_alert_events_rule_id', 'alert_events', type_='foreignkey')
+    op.drop_column('alert_events', 'rule_id')
+
+    op.drop_table('alert_rule_states')
+    op.drop_index(op.f('ix_alert_rules_ward'), table_name='alert_rules')
+    op.drop_index(op.f('ix_alert_rules_device_id'), table_name='alert_rules')
+    op.drop_index(op.f('ix_alert_rules_id'), table_name='alert_rules')
+    op.drop_table('alert_rules')
+
+    op.drop_index(op.f('ix_devices_ward'), table_name='devices')
+    op.drop_column('devices', 'ward')
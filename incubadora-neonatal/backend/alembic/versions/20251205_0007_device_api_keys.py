@@ -0,0 +1,27 @@
+"""per-device API keys for ingest
+
+Revision ID: 20251205_0007
+Revises: 20251201_0006
+Create Date: 2025-12-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251205_0007'
+down_revision = '20251201_0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('api_key_hash', sa.String(length=64), nullable=True))
+    op.add_column('devices', sa.Column('api_key_rotated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_unique_constraint('uq_devices_api_key_hash', 'devices', ['api_key_hash'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_devices_api_key_hash', 'devices', type_='unique')
+    op.drop_column('devices', 'api_key_rotated_at')
+    op.drop_column('devices', 'api_key_hash')
@@ -0,0 +1,25 @@
+"""username prefix index for paginated user listing
+
+Revision ID: 20251208_0008
+Revises: 20251205_0007
+Create Date: 2025-12-08 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251208_0008'
+down_revision = '20251205_0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_users_username_pattern', 'users', ['username'], unique=False,
+        postgresql_ops={'username': 'text_pattern_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_username_pattern', table_name='users')
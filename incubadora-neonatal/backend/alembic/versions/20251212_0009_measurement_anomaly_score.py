@@ -0,0 +1,23 @@
+"""anomaly score column on measurements
+
+Revision ID: 20251212_0009
+Revises: 20251208_0008
+Create Date: 2025-12-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251212_0009'
+down_revision = '20251208_0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('measurements', sa.Column('anomaly_score', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('measurements', 'anomaly_score')
@@ -0,0 +1,41 @@
+"""rolling feature snapshots per device
+
+Revision ID: 20251215_0010
+Revises: 20251212_0009
+Create Date: 2025-12-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251215_0010'
+down_revision = '20251212_0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'device_features',
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('window_s', sa.Integer(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('temp_aire_c_mean', sa.Float(), nullable=True),
+        sa.Column('temp_aire_c_var', sa.Float(), nullable=True),
+        sa.Column('temp_aire_c_slope', sa.Float(), nullable=True),
+        sa.Column('temp_piel_c_mean', sa.Float(), nullable=True),
+        sa.Column('temp_piel_c_var', sa.Float(), nullable=True),
+        sa.Column('temp_piel_c_slope', sa.Float(), nullable=True),
+        sa.Column('humedad_mean', sa.Float(), nullable=True),
+        sa.Column('humedad_var', sa.Float(), nullable=True),
+        sa.Column('humedad_slope', sa.Float(), nullable=True),
+        sa.Column('last_ts', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_measurement_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('device_id', 'window_s')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('device_features')
@@ -0,0 +1,23 @@
+"""soft delete of alert rules (keep their episodes)
+
+Revision ID: 20251218_0011
+Revises: 20251215_0010
+Create Date: 2025-12-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251218_0011'
+down_revision = '20251215_0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('alert_rules', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('alert_rules', 'deleted_at')
@@ -0,0 +1,22 @@
+"""index measurements by (device_id, id) for feature-window catch-up
+
+Revision ID: 20251220_0012
+Revises: 20251218_0011
+Create Date: 2025-12-20 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251220_0012'
+down_revision = '20251218_0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_measurements_device_id_id', 'measurements', ['device_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_measurements_device_id_id', table_name='measurements')
@@ -0,0 +1,154 @@
+# app/alert_engine.py
+"""
+Motor de alertas en la ruta de escritura.
+
+Por cada medicion nueva compara su bitmask ``alerts`` con el estado del
+dispositivo y solo escribe en ``alert_events`` cuando un bit se enciende
+(abre un episodio) o se apaga (lo cierra con fin, duracion, numero de
+muestras y valores extremos). Si el bitmask no cambia no hay trabajo de
+base de datos.
+
+El estado (ultimo bitmask por dispositivo) se guarda en el backend del
+cache de consultas si existe (compartido entre workers con Redis) o en un
+diccionario local. Ante un fallo de cache se reconstruye desde los
+episodios abiertos, que son la fuente de verdad; el indice unico parcial
+``uq_alert_events_open`` impide abrir dos veces el mismo episodio.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+STATE_TTL_S = 3600.0
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _bits(mask: int) -> List[int]:
+    return [1 << i for i in range(mask.bit_length()) if mask & (1 << i)]
+
+
+def open_episode(db: Session, **fields) -> bool:
+    """Inserta un episodio abierto; ``False`` si ya habia uno (indice unico parcial)."""
+    try:
+        with db.begin_nested():
+            db.add(models.AlertEvent(**fields))
+        return True
+    except IntegrityError:
+        return False  # otro worker ya lo abrio
+
+
+def close_episode(db: Session, event: models.AlertEvent, ended_at: datetime, end_measurement_id: Optional[int]) -> None:
+    """Cierra ``event`` con duracion, numero de muestras y extremos del periodo."""
+    # Extremos de las muestras del episodio: [inicio, fin) por (device_id, ts)
+    M = models.Measurement
+    agg = (
+        db.query(
+            func.count(M.id),
+            func.max(M.temp_aire_c), func.min(M.temp_aire_c),
+            func.max(M.temp_piel_c),
+            func.max(M.humedad), func.min(M.humedad),
+            func.min(M.peso_g),
+        )
+        .filter(M.device_id == event.device_id, M.ts >= event.started_at, M.ts < ended_at)
+        .one()
+    )
+    event.ended_at = ended_at
+    event.end_measurement_id = end_measurement_id
+    event.duration_s = (_naive_utc(ended_at) - _naive_utc(event.started_at)).total_seconds()
+    (event.samples, event.max_temp_aire_c, event.min_temp_aire_c, event.max_temp_piel_c,
+     event.max_humedad, event.min_humedad, event.min_peso_g) = agg
+
+
+class AlertEngine:
+    def __init__(self, store=None, ttl: float = STATE_TTL_S):
+        self.store = store
+        self.ttl = ttl
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+
+    # ---- estado por dispositivo ----
+    def _get_state(self, device_id: str) -> Optional[int]:
+        if self.store is not None:
+            raw = self.store.get(f"alert:mask:{device_id}")
+            return int(raw) if raw is not None else None
+        with self._lock:
+            return self._local.get(device_id)
+
+    def _set_state(self, device_id: str, mask: int) -> None:
+        if self.store is not None:
+            self.store.set(f"alert:mask:{device_id}", str(mask).encode(), self.ttl)
+            return
+        with self._lock:
+            self._local[device_id] = mask
+
+    def _open_mask(self, db: Session, device_id: str) -> int:
+        E = models.AlertEvent
+        bits = (
+            db.query(E.bit)
+            .filter(E.device_id == device_id, E.rule_id.is_(None), E.ended_at.is_(None))
+            .all()
+        )
+        mask = 0
+        for (bit,) in bits:
+            mask |= bit
+        return mask
+
+    # ---- transiciones ----
+    def process(self, db: Session, row: models.Measurement) -> None:
+        """Procesa una medicion ya persistida (y confirmada) en ``db``."""
+        mask = row.alerts or 0
+        prev = self._get_state(row.device_id)
+        if prev is None:
+            prev = self._open_mask(db, row.device_id)
+        if prev == mask:
+            self._set_state(row.device_id, mask)
+            return
+
+        for bit in _bits(mask & ~prev):
+            self._open(db, row, bit)
+        for bit in _bits(prev & ~mask):
+            self._close(db, row, bit)
+        db.commit()
+        self._set_state(row.device_id, mask)
+
+    def _open(self, db: Session, row: models.Measurement, bit: int) -> None:
+        if open_episode(db, device_id=row.device_id, bit=bit, started_at=row.ts, start_measurement_id=row.id):
+            self.opened += 1
+
+    def _close(self, db: Session, row: models.Measurement, bit: int) -> None:
+        E = models.AlertEvent
+        event = (
+            db.query(E)
+            .filter(E.device_id == row.device_id, E.bit == bit, E.rule_id.is_(None), E.ended_at.is_(None))
+            .one_or_none()
+        )
+        if event is None:
+            return  # ya cerrado (otro worker) o abierto antes del motor
+        close_episode(db, event, row.ts, row.id)
+        self.closed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"opened": self.opened, "closed": self.closed}
+
+
+def _make_engine() -> AlertEngine:
+    from .cache import query_cache
+    return AlertEngine(store=query_cache.backend)
+
+
+alert_engine = _make_engine()
@@ -0,0 +1,40 @@
+# app/alert_labels.py
+"""
+Tabla unica de los bits del campo ``alerts`` enviado por el firmware
+(``gAlarm_*`` en ``COMPLETE_REMOTE.ino``), usada por la API y alineada con
+el mapeo del frontend (``AlertsPage``).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+# (bit, codigo, sigla del firmware/frontend, etiqueta)
+ALERT_BITS: Tuple[Tuple[int, str, str, str], ...] = (
+    (1, "overtemp", "ST", "Sobretemperatura"),
+    (2, "airflow_fail", "FF", "Falla de flujo"),
+    (4, "sensor_fail", "FS", "Falla de sensor"),
+    (8, "program_fail", "FP", "Falla de programa"),
+    (16, "bad_posture", "PI", "Postura incorrecta"),
+)
+
+ALERT_LABELS: Dict[int, str] = {bit: label for bit, _, _, label in ALERT_BITS}
+ALERT_CODES: Dict[int, str] = {bit: code for bit, code, _, _ in ALERT_BITS}
+ALL_BITS_MASK = sum(ALERT_LABELS)
+
+# Tablas precalculadas para las 32 combinaciones de bits conocidos: el
+# decodificado de una mascara es un acceso por indice, sin recorrer bits
+MASK_LABELS: Tuple[Tuple[str, ...], ...] = tuple(
+    tuple(label for bit, _, _, label in ALERT_BITS if mask & bit) for mask in range(ALL_BITS_MASK + 1)
+)
+MASK_CODES: Tuple[Tuple[str, ...], ...] = tuple(
+    tuple(code for bit, code, _, _ in ALERT_BITS if mask & bit) for mask in range(ALL_BITS_MASK + 1)
+)
+
+
+def labels(mask: int) -> List[str]:
+    """Etiquetas de los bits encendidos en ``mask`` (los bits desconocidos se ignoran)."""
+    return list(MASK_LABELS[mask & ALL_BITS_MASK])
+
+
+def codes(mask: int) -> List[str]:
+    return list(MASK_CODES[mask & ALL_BITS_MASK])
@@ -0,0 +1,129 @@
+# app/alert_summary.py
+"""
+Resumen de alertas por dispositivo e intervalo (``/alerts/summary``).
+
+Todo se agrega en SQL sobre la columna ``alerts`` de ``measurements``:
+
+- ``LEAD(ts)`` por dispositivo da la duracion de cada muestra (hasta la
+  siguiente, acotada a ``max_gap_s`` para no contar huecos sin datos).
+- ``LAG(alerts)`` permite contar episodios como flancos de subida por bit
+  (``alerts & bit`` encendido y ``prev & bit`` apagado).
+- ``alerts & bit`` dentro de ``SUM(CASE ...)`` da muestras y segundos por
+  bit en cada intervalo, y ``alerts & ALL_BITS_MASK`` agrupa por
+  combinacion de bits.
+
+Python solo recorre las filas agregadas (una por dispositivo, intervalo y
+combinacion) y traduce bits y mascaras con las tablas precalculadas de
+``alert_labels``. La duracion de una muestra se asigna entera al intervalo
+en que empieza.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import Float, Integer, and_, case, cast, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .alert_labels import ALERT_BITS, ALL_BITS_MASK, MASK_LABELS
+
+
+def _epoch(col, dialect: str):
+    """Segundos desde la epoca (float) de una columna ``DateTime``."""
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", col), Float)
+    return (func.julianday(col) - 2440587.5) * 86400.0
+
+
+def _bucket(t, bucket_s: int, dialect: str):
+    """Inicio del intervalo de ``bucket_s`` segundos que contiene ``t``."""
+    if dialect == "postgresql":
+        return cast(func.floor(t / bucket_s), Integer) * bucket_s
+    return cast(t / bucket_s, Integer) * bucket_s  # t > 0: truncar == floor
+
+
+def summarize(
+    db: Session,
+    device_ids: Sequence[str],
+    start: datetime,
+    end: datetime,
+    bucket_s: int,
+    max_gap_s: float,
+) -> List[dict]:
+    """
+    Lista de ``{"device_id", "bucket", "samples", "covered_s", "bits", "masks"}``
+    ordenada por dispositivo e intervalo; solo intervalos con mediciones.
+    """
+    if not device_ids:
+        return []
+    dialect = db.get_bind().dialect.name
+    M = models.Measurement
+    mask = func.coalesce(M.alerts, 0).op("&")(ALL_BITS_MASK)
+    t = _epoch(M.ts, dialect)
+    window = {"partition_by": M.device_id, "order_by": M.ts}
+    samples = (
+        select(
+            M.device_id.label("device_id"),
+            mask.label("mask"),
+            t.label("t"),
+            func.lead(t).over(**window).label("next_t"),
+            func.coalesce(func.lag(mask).over(**window), 0).label("prev"),
+        )
+        .where(M.device_id.in_(list(device_ids)), M.ts >= start, M.ts < end)
+        .subquery()
+    )
+
+    end_t = end.timestamp()
+    span = func.coalesce(samples.c.next_t, end_t) - samples.c.t
+    dt = case((span > max_gap_s, max_gap_s), else_=span)
+    bucket = _bucket(samples.c.t, bucket_s, dialect).label("bucket")
+
+    # 1) por bit: muestras, segundos y episodios (flancos de subida)
+    cols = [samples.c.device_id, bucket, func.count().label("samples"), func.sum(dt).label("covered")]
+    for bit, *_ in ALERT_BITS:
+        on = samples.c.mask.op("&")(bit) != 0
+        rising = and_(on, samples.c.prev.op("&")(bit) == 0)
+        cols += [
+            func.sum(case((on, 1), else_=0)),
+            func.sum(case((on, dt), else_=0.0)),
+            func.sum(case((rising, 1), else_=0)),
+        ]
+    per_bit = db.execute(
+        select(*cols).group_by(samples.c.device_id, bucket).order_by(samples.c.device_id, bucket)
+    ).all()
+
+    # 2) por combinacion de bits activos
+    per_mask = db.execute(
+        select(samples.c.device_id, bucket, samples.c.mask, func.count(), func.sum(dt))
+        .where(samples.c.mask != 0)
+        .group_by(samples.c.device_id, bucket, samples.c.mask)
+        .order_by(samples.c.device_id, bucket, samples.c.mask)
+    ).all()
+    masks: Dict[Tuple[str, int], List[dict]] = {}
+    for device_id, b, m, n, secs in per_mask:
+        masks.setdefault((device_id, int(b)), []).append(
+            {"mask": m, "labels": list(MASK_LABELS[m]), "samples": n, "seconds": float(secs or 0.0)}
+        )
+
+    out = []
+    for row in per_bit:
+        device_id, b, n, covered = row[0], int(row[1]), row[2], row[3]
+        bits = []
+        for i, (bit, code, sigla, label) in enumerate(ALERT_BITS):
+            bit_samples, secs, episodes = row[4 + 3 * i: 7 + 3 * i]
+            if bit_samples:
+                bits.append({
+                    "bit": bit, "code": code, "sigla": sigla, "label": label,
+                    "samples": bit_samples, "episodes": episodes,
+                    "seconds": float(secs or 0.0), "minutes": float(secs or 0.0) / 60.0,
+                })
+        out.append({
+            "device_id": device_id,
+            "bucket": datetime.fromtimestamp(b, tz=timezone.utc),
+            "samples": n,
+            "covered_s": float(covered or 0.0),
+            "bits": bits,
+            "masks": masks.get((device_id, b), []),
+        })
+    return out
@@ -10,23 +10,12 @@ from sqlalchemy.orm import Session
 from .db import get_db
 from . import models
 from .schemas import AlertRow
+from .alert_labels import codes
 
 router = APIRouter(prefix="/api/incubadora", tags=["alerts"])
 
-ALERT_LABELS = [
-    ("overtemp", 1),
-    ("airflow_fail", 2),
-    ("sensor_fail", 4),
-    ("program_fail", 8),
-    ("bad_posture", 16),
-]
-
 def decode(mask: int) -> list[str]:
-    out: list[str] = []
-    for name, bit in ALERT_LABELS:
-        if mask & bit:
-            out.append(name)
-    return out
+    return codes(mask)
 
 @router.get("/alerts", response_model=List[AlertRow])
 def recent_alerts(
@@ -35,24 +24,28 @@ def recent_alerts(
     limit: int = Query(default=200, ge=1, le=1000),
     db: Session = Depends(get_db),
 ):
-    start = None
+    # Episodios de alert_events (indice device_id, started_at) en vez de
+    # recorrer measurements muestra a muestra
+    E = models.AlertEvent
+    stmt = select(E)
+    if device_id:
+        stmt = stmt.where(E.device_id == device_id)
     if since_minutes is not None:
         start = datetime.now(timezone.utc) - timedelta(minutes=since_minutes)
-
-    stmt = select(models.Measurement).where(models.Measurement.alerts != None)
-    if device_id:
-        stmt = stmt.where(models.Measurement.device_id == device_id)
-    if start:
-        stmt = stmt.where(models.Measurement.ts >= start)
-    stmt = stmt.order_by(desc(models.Measurement.ts)).limit(limit)
+        stmt = stmt.where(E.started_at >= start)
+    stmt = stmt.order_by(desc(E.started_at)).limit(limit)
 
     rows = db.execute(stmt).scalars().all()
     return [
         AlertRow(
-            ts=r.ts,
+            ts=r.started_at,
             device_id=r.device_id,
-            alerts=r.alerts or 0,
-            labels=decode(r.alerts or 0),
+            mask=r.bit,
+            labels=decode(r.bit),
+            ended_at=r.ended_at,
+            duration_s=r.duration_s,
+            active=r.ended_at is None,
+            samples=r.samples,
         )
         for r in rows
     ]
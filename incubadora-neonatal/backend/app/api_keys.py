@@ -0,0 +1,124 @@
+# app/api_keys.py
+"""
+Claves de API por dispositivo para ``/ingest``.
+
+La clave solo se muestra al generarla; en ``devices.api_key_hash`` se guarda
+su SHA-256 (las claves son aleatorias de 256 bits, no hace falta un hash
+lento como para contrasenas). En memoria se mantiene un indice
+``hash[:16] -> (device_id, hash)`` de todos los dispositivos con clave: la
+verificacion es un SHA-256, un acceso a diccionario y una comparacion en
+tiempo constante (``hmac.compare_digest``) del hash completo, sin consultar
+la base de datos.
+
+Rotar o revocar una clave incrementa el contador ``apikeys`` del backend de
+``query_cache``; cada worker compara la version en cada verificacion y
+recarga el indice si cambio, asi una clave revocada deja de valer en todos
+los workers en la peticion siguiente.
+
+El mismo indice da el conjunto de dispositivos con clave
+(:meth:`ApiKeyCache.has_key`): ``/ingest`` rechaza una muestra sin clave
+que dice venir de uno de ellos, aunque ``INGEST_REQUIRE_API_KEY`` este
+desactivado.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import secrets
+import threading
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import CacheBackend
+
+_LOOKUP_CHARS = 16
+
+
+def generate_key() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def digest(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ApiKeyCache:
+    def __init__(self, session_factory: Optional[Callable[[], Session]], counters: Optional[CacheBackend] = None):
+        self.session_factory = session_factory
+        self.counters = counters
+        self._index: Dict[str, Tuple[str, str]] = {}
+        self._keyed: FrozenSet[str] = frozenset()
+        self._version: Optional[int] = None
+        self._local_gen = 0
+        self._lock = threading.Lock()
+        self.verified = 0
+        self.rejected = 0
+        self.reloads = 0
+
+    def _gen(self) -> int:
+        if self.counters is not None:
+            return self.counters.counters(["apikeys"])[0]
+        return self._local_gen
+
+    def _reload(self, gen: int) -> None:
+        with self.session_factory() as db:
+            rows = (
+                db.query(models.Device.device_id, models.Device.api_key_hash)
+                .filter(models.Device.api_key_hash.isnot(None))
+                .all()
+            )
+        index = {h[:_LOOKUP_CHARS]: (device_id, h) for device_id, h in rows}
+        with self._lock:
+            self._index, self._version = index, gen
+            self._keyed = frozenset(device_id for device_id, _ in rows)
+            self.reloads += 1
+
+    def _sync(self) -> None:
+        gen = self._gen()
+        if self._version != gen:
+            self._reload(gen)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """``device_id`` de la clave o ``None`` si no es valida."""
+        self._sync()
+        h = digest(key)
+        entry = self._index.get(h[:_LOOKUP_CHARS])
+        ok = entry is not None and hmac.compare_digest(entry[1], h)
+        with self._lock:
+            if ok:
+                self.verified += 1
+            else:
+                self.rejected += 1
+        return entry[0] if ok else None
+
+    def has_key(self, device_id: str) -> bool:
+        """``True`` si el dispositivo tiene una clave activa (exige ``X-API-Key``)."""
+        self._sync()
+        return device_id in self._keyed
+
+    def invalidate(self) -> None:
+        """Llamar tras confirmar en la BD una rotacion o revocacion."""
+        if self.counters is not None:
+            self.counters.incr("apikeys")
+        else:
+            with self._lock:
+                self._local_gen += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "keys": len(self._index),
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "reloads": self.reloads,
+        }
+
+
+def _make_cache() -> ApiKeyCache:
+    from .cache import query_cache
+    from .db import SessionLocal
+    return ApiKeyCache(SessionLocal, query_cache.backend)
+
+
+api_keys = _make_cache()
@@ -3,31 +3,40 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from .db import get_db
 from . import models
+from .hashing import HashPoolBroken, HashPoolSaturated, hash_pool
+from .principals import principal_cache
 from .settings import settings
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.jwt_algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
-    deprecated="auto",
-    pbkdf2_sha256__default_rounds=29000
-)
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/incubadora/auth/login")
 
+def _hash_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service busy, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    # En el pool de procesos de app/hashing.py; 503 si esta saturado o se rompio
+    try:
+        return hash_pool.verify(plain_password, hashed_password)
+    except (HashPoolSaturated, HashPoolBroken, TimeoutError):
+        raise _hash_pool_busy()
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    try:
+        return hash_pool.hash(password)
+    except (HashPoolSaturated, HashPoolBroken, TimeoutError):
+        raise _hash_pool_busy()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -52,15 +61,37 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
         return None
     return user
 
-async def get_current_user(
+# Columnas del usuario que se guardan en el cache de principales
+_PRINCIPAL_FIELDS = ("id", "username", "email", "is_admin", "is_active", "created_at")
+
+def _load_principal(db: Session, username: str) -> Optional[dict]:
+    user = get_user_by_username(db, username=username)
+    if user is None:
+        return None
+    return {f: getattr(user, f) for f in _PRINCIPAL_FIELDS}
+
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> models.User:
+    # sync: en un fallo de cache la consulta corre en el threadpool, no en el event loop
+    return user_from_token(db, token)
+
+def user_from_token(db: Session, token: Optional[str]) -> models.User:
+    """
+    Valida un JWT y devuelve su usuario (401 si no es valido).
+
+    El usuario sale del cache de principales (``app/principals.py``): es una
+    instancia transitoria, no asociada a la sesion; para modificarlo hay que
+    cargarlo con ``db.get(models.User, user.id)``.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -68,10 +99,10 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user_by_username(db, username=username)
-    if user is None:
+    snap = principal_cache.resolve(username, lambda: _load_principal(db, username))
+    if snap is None:
         raise credentials_exception
-    return user
+    return models.User(**snap)
 
 async def get_current_active_user(
     current_user: models.User = Depends(get_current_user)
@@ -0,0 +1,221 @@
+# app/cache.py
+"""
+Cache de resultados para los endpoints de consulta (read-through).
+
+Los valores se guardan ya serializados (bytes JSON), de modo que un acierto
+evita tanto la consulta a la base de datos como la serializacion.
+
+La invalidacion es por dispositivo mediante contadores de generacion: cada
+clave incluye la generacion actual de los dispositivos que abarca, y las
+rutas de escritura (ingesta y colector) incrementan la generacion del
+dispositivo afectado. Las entradas viejas dejan de ser alcanzables y las
+expulsa el LRU o el TTL. El mismo esquema funciona con un backend
+compartido entre workers (Redis), donde los contadores son globales.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .settings import settings
+
+
+class CacheBackend:
+    """Interfaz minima que debe implementar un backend de cache."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    def incr(self, counter: str) -> int:
+        raise NotImplementedError
+
+    def counters(self, names: Iterable[str]) -> Tuple[int, ...]:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def info(self) -> Dict[str, int]:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Backend en proceso: LRU acotado por numero de entradas y por bytes,
+    con TTL por entrada. Seguro entre hilos (los endpoints sync corren en
+    el threadpool de Starlette).
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < now:
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+            while self._data and (
+                len(self._data) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self._evictions += 1
+
+    def _drop(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= len(value)
+
+    def incr(self, counter: str) -> int:
+        with self._lock:
+            value = self._counters.get(counter, 0) + 1
+            self._counters[counter] = value
+            return value
+
+    def counters(self, names: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._counters.get(n, 0) for n in names)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+            self._bytes = 0
+
+    def info(self) -> Dict[str, int]:
+        return {"entries": len(self._data), "bytes": self._bytes, "evictions": self._evictions}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Backend compartido entre workers/nodos. Requiere el paquete opcional
+    ``redis`` (no incluido en requirements.txt).
+    """
+
+    def __init__(self, url: str, prefix: str = "incu:qc:"):
+        import redis  # dependencia opcional
+
+        self._r = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._r.get(self._prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._r.set(self._prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def incr(self, counter: str) -> int:
+        return int(self._r.incr(self._prefix + "gen:" + counter))
+
+    def counters(self, names: Iterable[str]) -> Tuple[int, ...]:
+        keys = [self._prefix + "gen:" + n for n in names]
+        if not keys:
+            return ()
+        return tuple(int(v or 0) for v in self._r.mget(keys))
+
+    def clear(self) -> None:
+        for key in self._r.scan_iter(self._prefix + "*"):
+            self._r.delete(key)
+
+
+class QueryCache:
+    """Cache read-through con invalidacion por dispositivo y metricas de aciertos."""
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float = 10.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def key(self, endpoint: str, device_ids: Iterable[str], *parts: object) -> str:
+        """
+        Construye la clave ``endpoint|dev@gen,...|parts``. Los dispositivos se
+        ordenan para que la misma consulta produzca siempre la misma clave.
+        """
+        devs = sorted(set(device_ids))
+        gens = self.backend.counters(f"dev:{d}" for d in devs) if self.backend else ()
+        dev_part = ",".join(f"{d}@{g}" for d, g in zip(devs, gens))
+        return "|".join([endpoint, dev_part, *(str(p) for p in parts)])
+
+    def get_or_set(self, key: str, loader: Callable[[], bytes]) -> bytes:
+        if self.backend is None:
+            return loader()
+        value = self.backend.get(key)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value
+        value = loader()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate_device(self, device_id: str) -> None:
+        if self.backend is None:
+            return
+        self.backend.incr(f"dev:{device_id}")
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        out: Dict[str, object] = {
+            "enabled": self.enabled,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+        if self.backend is not None:
+            out.update(self.backend.info())
+        return out
+
+
+def _make_backend() -> Optional[CacheBackend]:
+    kind = (settings.query_cache_backend or "").lower()
+    if kind == "memory":
+        return MemoryBackend(
+            max_entries=settings.query_cache_max_entries,
+            max_bytes=settings.query_cache_max_bytes,
+        )
+    if kind == "redis":
+        return RedisBackend(settings.query_cache_url)
+    return None
+
+
+query_cache = QueryCache(_make_backend(), ttl=settings.query_cache_ttl_s)
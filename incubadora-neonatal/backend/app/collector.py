@@ -1,17 +1,26 @@
 # backend/app/collector.py
+# -*- coding: latin-1 -*-
 from __future__ import annotations
 import time, threading, requests
 from datetime import datetime, timezone
 from typing import Dict, Any, List
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from .models import Base, Measurement
+from .db import session_factory
+from .feature_store import feature_store
+from .models import Measurement
+from .pipeline import after_insert
+from .routers.ingest import ALIASES
 from .schemas import IngestPayload
 from .settings import settings
 
-# DB engine propio del colector
-engine = create_engine(settings.database_url, future=True, pool_pre_ping=True)
-Base.metadata.create_all(engine)
+# Pool propio del colector (DB_COLLECTOR_*), creado en la primera muestra;
+# el esquema lo crean las migraciones (alembic upgrade head)
+_Session = None
+
+def _session():
+    global _Session
+    if _Session is None:
+        _Session = session_factory("collector")
+    return _Session()
 
 # Dispositivos y periodo desde .env
 _DEVS: List[str] = [u.strip() for u in settings.ESP32_DEVICES.split(",") if u.strip()]
@@ -28,15 +37,18 @@ def _fetch_one(base_url: str):
         r = requests.get(f"{base_url.rstrip('/')}/data", timeout=3.0)
         r.raise_for_status()
         data = r.json()  # {"peso","temperatura","humedad","setControl", ...}
-        # Normaliza al esquema del backend
-        p = IngestPayload(**data, device=base_url)
-        norm = p.normalize()
+        # Normaliza al esquema del backend (mismos alias que /ingest)
+        data = {ALIASES.get(k, k): v for k, v in data.items()}
+        data.setdefault("device_id", base_url)
         # Forzamos TS aware (UTC) para la columna timezone=True
-        norm["ts"] = datetime.now(timezone.utc)
+        data["ts"] = datetime.now(timezone.utc)
+        norm = IngestPayload(**data).model_dump()
 
-        with Session(engine) as s:
-            s.add(Measurement(**norm))
+        with _session() as s:
+            row = Measurement(**norm)
+            s.add(row)
             s.commit()
+            after_insert(row, s)
 
         _REG[base_url]["last_ok"] = datetime.now(timezone.utc).isoformat()
         _REG[base_url]["last_error"] = None
@@ -52,6 +64,11 @@ def _loop():
     while True:
         for u in list(_REG.keys()):
             _fetch_one(u)
+        # Ventanas moviles a device_features (sin lifespan de FastAPI si corre aparte)
+        try:
+            feature_store.maybe_snapshot()
+        except Exception as e:
+            print(f"[collector] snapshot de features: {e}")
         time.sleep(_PERIOD / 1000.0)
 
 def start_background():
@@ -0,0 +1,79 @@
+# app/conditional.py
+"""
+Peticiones condicionales (ETag / Last-Modified) para los endpoints de consulta.
+
+El validador se calcula a partir de la medicion mas reciente (``id``/``ts``)
+de los dispositivos implicados, sin construir el resultado completo; si el
+cliente ya tiene esa version se responde ``304 Not Modified``.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# El cliente debe revalidar siempre, pero puede reutilizar su copia con un 304
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _as_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def http_date(ts: datetime) -> str:
+    return format_datetime(_as_utc(ts).replace(microsecond=0), usegmt=True)
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(
+    request: Request,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    use_modified_since: bool = True,
+) -> bool:
+    """
+    Evalua ``If-None-Match`` (comparacion debil) y, si no viene, ``If-Modified-Since``.
+    """
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        if inm.strip() == "*":
+            return True
+        wanted = _strip_weak(etag)
+        return any(_strip_weak(t) == wanted for t in inm.split(","))
+
+    ims = request.headers.get("if-modified-since")
+    if use_modified_since and ims and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        if since is None:
+            return False
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    return set_validators(Response(status_code=304), etag, last_modified)
@@ -1,9 +1,33 @@
 # app/db.py
+"""
+Engines y sesiones de SQLAlchemy.
+
+Todos los engines del proceso salen de :func:`make_engine`, con el pool de
+su rol (``DB_POOL_*`` para ``api``, ``DB_READ_*`` para ``read`` y
+``DB_COLLECTOR_*``/``DB_EXPORTER_*``): tamano, overflow, espera maxima y
+reciclado. :func:`get_engine` devuelve el engine compartido de cada rol;
+``api`` y ``read`` son los de la API, ``collector`` se crea al usarlo el
+colector y ``exporter`` (exportacion y entrenamiento, lecturas largas por
+bloques) va a la replica si la hay.
+
+Cada pool lleva :class:`PoolMetrics`: los eventos ``connect``,
+``checkout``, ``checkin`` e ``invalidate`` del pool cuentan conexiones en
+uso, pico de uso y de overflow, y :class:`InstrumentedQueuePool` mide
+cuanto espera cada checkout y cuantos acaban en ``TimeoutError`` (pool
+agotado). ``GET /query/pool/stats`` lo expone por rol.
+"""
 from __future__ import annotations
 
-from typing import Iterator
-from sqlalchemy import create_engine
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
+from sqlalchemy.pool import QueuePool
 
 from .settings import settings
 
@@ -15,10 +39,250 @@ _DB_URL = getattr(settings, "db_url", None) or getattr(settings, "database_url",
 if not _DB_URL:
     raise RuntimeError("DB URL is not configured. Define settings.db_url or settings.database_url")
 
+# Replica de solo lectura (opcional). Sin ella las lecturas van al primario.
+_READ_URL = settings.database_read_url or _DB_URL
+
+_WAITS = 1024
+
+
+class PoolMetrics:
+    """Telemetria de un pool, alimentada por sus eventos."""
+
+    def __init__(self, role: str):
+        self.role = role
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=_WAITS)
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.in_use_peak = 0
+        self.overflow_checkouts = 0  # checkouts por encima de pool_size
+        self.overflow_peak = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def attach(self, engine: Engine) -> None:
+        pool_size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 0
+
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+                self.in_use += 1
+                self.in_use_peak = max(self.in_use_peak, self.in_use)
+                if pool_size and self.in_use > pool_size:
+                    self.overflow_checkouts += 1
+                    self.overflow_peak = max(self.overflow_peak, self.in_use - pool_size)
+
+        @event.listens_for(engine, "checkin")
+        def _checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self.checkins += 1
+                self.in_use = max(self.in_use - 1, 0)
+
+        @event.listens_for(engine, "invalidate")
+        def _invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.metrics = self
+
+    def waited(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self, pool: Any = None) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            out: Dict[str, Any] = {
+                "role": self.role,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "in_use": self.in_use,
+                "in_use_peak": self.in_use_peak,
+                "overflow_checkouts": self.overflow_checkouts,
+                "overflow_peak": self.overflow_peak,
+                "wait_total_s": self.wait_total_s,
+                "wait_max_ms": self.wait_max_s * 1000.0,
+            }
+        out["wait_p50_ms"] = waits[len(waits) // 2] * 1000.0 if waits else 0.0
+        out["wait_p99_ms"] = waits[min(int(len(waits) * 0.99), len(waits) - 1)] * 1000.0 if waits else 0.0
+        if isinstance(pool, QueuePool):
+            out.update(
+                pool_size=pool.size(),
+                timeout_s=pool.timeout(),
+                idle=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),  # conexiones abiertas por encima de pool_size
+            )
+        return out
+
+
+class InstrumentedQueuePool(QueuePool):
+    """``QueuePool`` que mide la espera de cada checkout en su :class:`PoolMetrics`."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        metrics = self.metrics
+        if metrics is None:
+            return super().connect()
+        t0 = time.perf_counter()
+        try:
+            conn = super().connect()
+        except PoolTimeout:
+            metrics.waited(time.perf_counter() - t0, timed_out=True)
+            raise
+        metrics.waited(time.perf_counter() - t0)
+        return conn
+
+    def recreate(self):
+        # engine.dispose() crea un pool nuevo: conservar la telemetria
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _pool_kwargs(url: str, role: str) -> dict:
+    # SQLite (tests / desarrollo) no usa QueuePool con overflow
+    if url.startswith("sqlite"):
+        return {}
+    return {"poolclass": InstrumentedQueuePool, **settings.db_pool(role)}
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def make_engine(url: str, role: str, **overrides: Any) -> Engine:
+    """Engine con el pool configurado para ``role`` y su telemetria."""
+    kwargs = dict(pool_pre_ping=True, future=True, **_pool_kwargs(url, role))
+    kwargs.update(overrides)
+    engine = create_engine(url, **kwargs)
+    metrics = _metrics.get(role)
+    if metrics is None:
+        metrics = _metrics[role] = PoolMetrics(role)
+    metrics.attach(engine)
+    return engine
+
+
 # Engine and Session factory
-engine = create_engine(_DB_URL, pool_pre_ping=True, future=True)
+engine = make_engine(_DB_URL, "api")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
 
+read_engine = engine if _READ_URL == _DB_URL else make_engine(_READ_URL, "read")
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+
+_engines.update(api=engine, read=read_engine)
+_ROLE_URLS = {"collector": _DB_URL, "exporter": _READ_URL}
+
+
+def get_engine(role: str) -> Engine:
+    """Engine compartido del rol (``api``, ``read``, ``collector`` o ``exporter``)."""
+    with _engines_lock:
+        found = _engines.get(role)
+        if found is None:
+            if role not in _ROLE_URLS:
+                raise ValueError(f"Unknown database role: {role}")
+            found = _engines[role] = make_engine(_ROLE_URLS[role], role)
+        return found
+
+
+def session_factory(role: str) -> sessionmaker:
+    return sessionmaker(bind=get_engine(role), autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Telemetria de los pools de este proceso, por rol."""
+    with _engines_lock:
+        engines = dict(_engines)
+    out: Dict[str, Any] = {"pid": os.getpid()}
+    for role, eng in engines.items():
+        if eng is engine and role != "api":
+            continue  # "read" sin replica es el mismo engine que "api"
+        out[role] = _metrics[role].stats(eng.pool)
+    return out
+
+
+class SessionRouter:
+    """
+    Elige primario o replica para las lecturas.
+
+    Tras una escritura que el usuario espera ver de inmediato (p. ej.
+    ``link_device``) se llama a :meth:`mark_write`; durante
+    ``sticky_seconds`` sus lecturas van al primario (read-your-writes) para
+    no depender del retraso de replicacion. Si se pasa un ``store`` (backend
+    del cache de consultas) la marca se comparte entre workers.
+    """
+
+    def __init__(self, primary: sessionmaker, replica: sessionmaker, sticky_seconds: float = 5.0, store=None):
+        self.primary = primary
+        self.replica = replica
+        self.sticky_seconds = sticky_seconds
+        self.store = store
+        self._local: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def has_replica(self) -> bool:
+        return self.primary is not self.replica
+
+    def mark_write(self, scope: object) -> None:
+        if not self.has_replica:
+            return
+        key = f"rw:{scope}"
+        if self.store is not None:
+            self.store.set(key, b"1", self.sticky_seconds)
+            return
+        with self._lock:
+            self._local[key] = time.monotonic() + self.sticky_seconds
+
+    def _recent_write(self, scope: object) -> bool:
+        key = f"rw:{scope}"
+        if self.store is not None:
+            return self.store.get(key) is not None
+        with self._lock:
+            until = self._local.get(key)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._local[key]
+                return False
+            return True
+
+    def session_for(self, scope: Optional[object] = None) -> Session:
+        if self.has_replica and (scope is None or not self._recent_write(scope)):
+            return self.replica()
+        return self.primary()
+
+
+def _sticky_store():
+    # El backend del cache de consultas, si existe, comparte la marca entre workers
+    from .cache import query_cache
+    return query_cache.backend
+
+
+session_router = SessionRouter(
+    SessionLocal, ReadSessionLocal, settings.read_your_writes_s, store=_sticky_store()
+)
+
+
 def get_db() -> Iterator[Session]:
     db = SessionLocal()
     try:
@@ -1,10 +1,39 @@
-from fastapi import Header, HTTPException
-from typing import Optional
+from fastapi import Depends, Header, HTTPException
+from typing import Iterator, Optional
+from sqlalchemy.orm import Session
 from .settings import settings
+from .db import session_router
+from .api_keys import api_keys
+from .auth import get_current_active_user
+from . import models
 
 
+def get_read_db(
+    current_user: models.User = Depends(get_current_active_user),
+) -> Iterator[Session]:
+    """
+    Sesion para endpoints GET de solo lectura: usa la replica
+    (``DATABASE_READ_URL``) salvo que el usuario acabe de escribir algo que
+    necesita leer (read-your-writes), en cuyo caso usa el primario.
+    """
+    db = session_router.session_for(current_user.id)
+    try:
+        yield db
+    finally:
+        db.close()
 
 
-def verify_api_key(x_api_key: Optional[str] = Header(None)):
-    if x_api_key != settings.api_key:
-        raise HTTPException(status_code=401, detail="Invalid API key")
\ No newline at end of file
+def verify_api_key(x_api_key: Optional[str] = Header(None)) -> Optional[str]:
+    """
+    Dispositivo autenticado por ``X-API-Key`` (ver ``app/api_keys.py``).
+    Sin cabecera devuelve ``None`` salvo que ``INGEST_REQUIRE_API_KEY`` la
+    exija; una clave invalida siempre es ``401``.
+    """
+    if x_api_key is None:
+        if settings.ingest_require_api_key:
+            raise HTTPException(status_code=401, detail="API key required")
+        return None
+    device_id = api_keys.lookup(x_api_key)
+    if device_id is None:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return device_id
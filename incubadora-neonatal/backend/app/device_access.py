@@ -0,0 +1,138 @@
+# app/device_access.py
+"""
+Cache por usuario de los dispositivos que tiene vinculados.
+
+Las comprobaciones de propiedad de ``/query``, ``/alerts/summary``,
+``/stream`` y ``/ws`` consultaban ``devices`` en cada peticion. Aqui el
+conjunto ``{device_id: name}`` de cada usuario se carga una vez y la
+comprobacion pasa a ser una busqueda en un diccionario.
+
+Las rutas que cambian la vinculacion (``link``/``unlink``/``PATCH``)
+actualizan la entrada del worker en el momento e incrementan el contador
+``owner:{user_id}`` del backend de ``query_cache``; el resto de workers ven
+otra version y recargan en su siguiente peticion. La recarga usa la sesion
+de lectura, que tras ``mark_write`` va al primario (read-your-writes).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import CacheBackend
+
+Devices = Dict[str, Optional[str]]  # device_id -> name (solo lectura)
+
+
+class DeviceAccessCache:
+    def __init__(self, counters: Optional[CacheBackend], ttl: float = 300.0, max_entries: int = 4096):
+        self.counters = counters
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[int, Tuple[float, int, Devices]]" = OrderedDict()
+        self._local_gen: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _gen(self, user_id: int) -> int:
+        if self.counters is not None:
+            return self.counters.counters([f"owner:{user_id}"])[0]
+        with self._lock:
+            return self._local_gen.get(user_id, 0)
+
+    def _bump(self, user_id: int) -> int:
+        if self.counters is not None:
+            return self.counters.incr(f"owner:{user_id}")
+        with self._lock:
+            gen = self._local_gen.get(user_id, 0) + 1
+            self._local_gen[user_id] = gen
+            return gen
+
+    @staticmethod
+    def _load(db: Session, user_id: int) -> Devices:
+        D = models.Device
+        return {d: name for d, name in db.query(D.device_id, D.name).filter(D.user_id == user_id)}
+
+    def devices(self, db: Session, user_id: int) -> Devices:
+        """``{device_id: name}`` de los dispositivos vinculados a ``user_id``."""
+        if not self.enabled:
+            return self._load(db, user_id)
+        gen = self._gen(user_id)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is not None and item[0] >= now and item[1] == gen:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+        devices = self._load(db, user_id)
+        with self._lock:
+            self._data[user_id] = (now + self.ttl, gen, devices)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return devices
+
+    def owns(self, db: Session, user_id: int, device_ids: Iterable[str]) -> bool:
+        devices = self.devices(db, user_id)
+        return all(d in devices for d in device_ids)
+
+    def set_device(self, user_id: int, device_id: str, name: Optional[str] = None, linked: bool = True) -> None:
+        """Aplica un ``link``/``unlink``/cambio de nombre ya confirmado en la BD."""
+        gen = self._bump(user_id)
+        with self._lock:
+            self.updates += 1
+            item = self._data.get(user_id)
+            if item is None:
+                return
+            if item[1] != gen - 1:
+                del self._data[user_id]  # la entrada ya estaba obsoleta
+                return
+            devices = dict(item[2])  # copia: los lectores pueden tener la anterior
+            if linked:
+                devices[device_id] = name
+            else:
+                devices.pop(device_id, None)
+            self._data[user_id] = (time.monotonic() + self.ttl, gen, devices)
+
+    def invalidate(self, user_id: int) -> None:
+        self._bump(user_id)
+        with self._lock:
+            self.updates += 1
+            self._data.pop(user_id, None)
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_s": self.ttl,
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+            "updates": self.updates,
+        }
+
+
+def _make_cache() -> DeviceAccessCache:
+    from .cache import query_cache
+    from .settings import settings
+    return DeviceAccessCache(
+        query_cache.backend,
+        ttl=settings.device_access_ttl_s,
+        max_entries=settings.device_access_max_entries,
+    )
+
+
+device_access = _make_cache()
@@ -0,0 +1,67 @@
+# app/encoding.py
+"""
+Serializacion JSON rapida para respuestas grandes (series, streams).
+
+Usa ``orjson`` cuando esta instalado y cae a ``json`` de la libreria
+estandar en caso contrario, de modo que el backend sigue funcionando
+sin la dependencia opcional.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, timezone
+from typing import Any, Iterable, Optional, Sequence
+
+try:  # pragma: no cover - depende del entorno
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializa ``obj`` a bytes JSON (UTF-8)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def epoch_ms(ts: Optional[datetime]) -> Optional[int]:
+    """Convierte un datetime a milisegundos epoch (naive se asume UTC)."""
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def columnar(
+    rows: Iterable[Sequence[Any]],
+    columns: Sequence[str],
+    ts_epoch_ms: bool = False,
+) -> dict:
+    """
+    Transpone filas (tuplas) a ``{columna: [valores...]}``.
+
+    La primera columna debe ser ``ts``; con ``ts_epoch_ms`` se emite como
+    entero en milisegundos en lugar de ISO-8601.
+    """
+    cols = list(zip(*rows))
+    if not cols:
+        return {name: [] for name in columns}
+    out = {name: list(values) for name, values in zip(columns, cols)}
+    if ts_epoch_ms:
+        out["ts"] = [epoch_ms(t) for t in out["ts"]]
+    return out
+
+
+def loads(data: bytes) -> Any:
+    """Inverso de :func:`dumps`."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
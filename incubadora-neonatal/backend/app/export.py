@@ -0,0 +1,338 @@
+# app/export.py
+"""
+Exportacion columnar de ``measurements`` (Parquet / Arrow IPC / CSV).
+
+Las filas se leen por bloques con paginacion por clave (``id > ultimo``),
+sin cargar la tabla completa en memoria, y se escriben:
+
+- particionadas por dispositivo y dia en un directorio
+  (``device_id=<id>/date=<YYYY-MM-DD>/part-<primer_id>-<ultimo_id>.<ext>``),
+  con una marca de agua (``_watermark.json``, o ``_watermark.<device>.json``
+  si se exporta un solo dispositivo) para exportaciones incrementales (lo
+  usa ``scripts/export_csv.py``), o
+- como un unico flujo de bytes para el endpoint ``/export/measurements``.
+
+``pyarrow`` se importa solo al exportar a Parquet/Arrow.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+FORMATS = ("parquet", "arrow", "csv")
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv"}
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = (
+    "id", "device_id", "ts",
+    "temp_aire_c", "temp_piel_c", "humedad", "luz",
+    "ntc_raw", "ntc_c", "peso_g", "set_control", "alerts",
+)
+
+WATERMARK_FILE = "_watermark.json"
+DEFAULT_CHUNK_ROWS = 20000
+
+Row = Tuple
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:  # pragma: no cover - depende del entorno
+        raise RuntimeError("pyarrow is required for Parquet/Arrow export") from e
+    return pa
+
+
+def arrow_schema():
+    pa = _arrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("device_id", pa.string()),
+        ("ts", pa.timestamp("us", tz="UTC")),
+        ("temp_aire_c", pa.float64()),
+        ("temp_piel_c", pa.float64()),
+        ("humedad", pa.float64()),
+        ("luz", pa.float64()),
+        ("ntc_raw", pa.int32()),
+        ("ntc_c", pa.float64()),
+        ("peso_g", pa.float64()),
+        ("set_control", pa.int32()),
+        ("alerts", pa.int32()),
+    ])
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def iter_chunks(
+    db: Session,
+    since_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+    device_id: Optional[str] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[List[Row]]:
+    """
+    Recorre ``measurements`` en orden de ``id`` por bloques de ``chunk_rows``
+    tuplas (columnas en el orden de ``EXPORT_COLUMNS``), con ``since_id < id <= until_id``.
+    """
+    M = models.Measurement
+    cols = [getattr(M, c) for c in EXPORT_COLUMNS]
+    last = since_id or 0
+    while True:
+        stmt = select(*cols).where(M.id > last)
+        if until_id is not None:
+            stmt = stmt.where(M.id <= until_id)
+        if device_id:
+            stmt = stmt.where(M.device_id == device_id)
+        rows = db.execute(stmt.order_by(M.id).limit(chunk_rows)).all()
+        if not rows:
+            return
+        yield [tuple(r) for r in rows]
+        last = rows[-1][0]
+
+
+def max_id(db: Session, device_id: Optional[str] = None) -> Optional[int]:
+    q = select(func.max(models.Measurement.id))
+    if device_id:
+        q = q.where(models.Measurement.device_id == device_id)
+    return db.execute(q).scalar()
+
+
+def to_table(rows: Sequence[Row]):
+    """Convierte tuplas a ``pyarrow.Table`` columna a columna."""
+    pa = _arrow()
+    schema = arrow_schema()
+    cols = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+    arrays = []
+    for name, values in zip(EXPORT_COLUMNS, cols):
+        if name == "ts":
+            values = [_utc(v) if v is not None else None for v in values]
+        arrays.append(pa.array(values, type=schema.field(name).type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _csv_value(v):
+    if isinstance(v, datetime):
+        return _utc(v).isoformat()
+    return "" if v is None else v
+
+
+def _csv_bytes(rows: Sequence[Row], header: bool) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(EXPORT_COLUMNS)
+    w.writerows([_csv_value(v) for v in r] for r in rows)
+    return buf.getvalue().encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Exportacion particionada a directorio (CLI)
+# ---------------------------------------------------------------------------
+
+def _watermark_path(out_dir: str, device_id: Optional[str] = None) -> str:
+    if device_id is None:
+        return os.path.join(out_dir, WATERMARK_FILE)
+    return os.path.join(out_dir, f"_watermark.{_safe(device_id)}.json")
+
+
+def read_watermark(out_dir: str, device_id: Optional[str] = None) -> Optional[int]:
+    """Marca de agua global o, con ``device_id``, la de ese dispositivo."""
+    path = _watermark_path(out_dir, device_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("last_id")
+
+
+def _device_watermarks(out_dir: str) -> Dict[str, int]:
+    """Marcas de las exportaciones de un solo dispositivo (``device_id`` -> ``last_id``)."""
+    out: Dict[str, int] = {}
+    for name in os.listdir(out_dir):
+        if name.startswith("_watermark.") and name != WATERMARK_FILE and name.endswith(".json"):
+            with open(os.path.join(out_dir, name), encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("device_id") is not None and data.get("last_id") is not None:
+                out[data["device_id"]] = data["last_id"]
+    return out
+
+
+def write_watermark(out_dir: str, last_id: int, device_id: Optional[str] = None) -> None:
+    path = _watermark_path(out_dir, device_id)
+    tmp = path + ".tmp"
+    data = {"last_id": last_id, "updated_at": datetime.now(timezone.utc).isoformat()}
+    if device_id is not None:
+        data["device_id"] = device_id
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)  # atomico: una exportacion interrumpida no avanza la marca
+
+
+def _partition_key(row: Row) -> Tuple[str, str]:
+    return row[1], _utc(row[2]).date().isoformat()
+
+
+def _safe(part: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in part)
+
+
+def _write_file(path: str, fmt: str, rows: Sequence[Row], compression: str) -> None:
+    if fmt == "csv":
+        with open(path, "wb") as f:
+            f.write(_csv_bytes(rows, header=True))
+        return
+    table = to_table(rows)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, path, compression=compression)
+    else:
+        pa = _arrow()
+        options = pa.ipc.IpcWriteOptions(compression=compression if compression in ("zstd", "lz4") else None)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as w:
+            w.write_table(table)
+
+
+def export_partitioned(
+    db: Session,
+    out_dir: str,
+    fmt: str = "parquet",
+    incremental: bool = True,
+    device_id: Optional[str] = None,
+    compression: str = "zstd",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Dict[str, int]:
+    """
+    Exporta a ``out_dir`` particionando por dispositivo y dia. Con
+    ``incremental`` solo exporta filas con ``id`` mayor que la marca de agua
+    y la avanza al terminar. Devuelve ``{"rows", "files", "last_id"}``.
+
+    Con ``device_id`` la marca es la de ese dispositivo
+    (``_watermark.<device>.json``) y no mueve la global, asi una exportacion
+    de un dispositivo no hace saltar filas de los demas. Para no duplicar
+    filas, cada dispositivo parte del maximo entre la marca global y la suya.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    since = None
+    skip_until: Dict[str, int] = {}
+    if incremental:
+        since = read_watermark(out_dir)
+        if device_id is not None:
+            own = read_watermark(out_dir, device_id)
+            since = max(since or 0, own or 0) or None
+        else:
+            skip_until = {d: w for d, w in _device_watermarks(out_dir).items() if w > (since or 0)}
+    until = max_id(db, device_id)
+    stats = {"rows": 0, "files": 0, "last_id": since or 0}
+    if until is None:
+        return stats
+
+    for chunk in iter_chunks(db, since_id=since, until_id=until, device_id=device_id, chunk_rows=chunk_rows):
+        parts: Dict[Tuple[str, str], List[Row]] = defaultdict(list)
+        for row in chunk:
+            if row[0] <= skip_until.get(row[1], 0):
+                continue  # ya exportada por una exportacion de su dispositivo
+            parts[_partition_key(row)].append(row)
+        for (dev, day), rows in parts.items():
+            folder = os.path.join(out_dir, f"device_id={_safe(dev)}", f"date={day}")
+            os.makedirs(folder, exist_ok=True)
+            name = f"part-{rows[0][0]}-{rows[-1][0]}.{EXTENSIONS[fmt]}"
+            _write_file(os.path.join(folder, name), fmt, rows, compression)
+            stats["files"] += 1
+        stats["rows"] += sum(len(rows) for rows in parts.values())
+        stats["last_id"] = chunk[-1][0]
+
+    if incremental:
+        write_watermark(out_dir, max(stats["last_id"], until), device_id)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Exportacion como flujo de bytes (endpoint)
+# ---------------------------------------------------------------------------
+
+class _Drain(io.RawIOBase):
+    """Sumidero de escritura que acumula bytes hasta que se drenan."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def stream_export(
+    db: Session,
+    fmt: str,
+    since_id: Optional[int] = None,
+    until_id: Optional[int] = None,
+    device_id: Optional[str] = None,
+    compression: str = "zstd",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """
+    Genera el archivo por partes: cada bloque de filas se escribe como un
+    row group (Parquet), un record batch (Arrow IPC stream) o lineas CSV y
+    se emite en cuanto esta listo.
+    """
+    chunks = iter_chunks(db, since_id=since_id, until_id=until_id, device_id=device_id, chunk_rows=chunk_rows)
+    if fmt == "csv":
+        yield _csv_bytes([], header=True)
+        for chunk in chunks:
+            yield _csv_bytes(chunk, header=False)
+        return
+
+    pa = _arrow()
+    sink = _Drain()
+    schema = arrow_schema()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression=compression)
+    elif fmt == "arrow":
+        options = pa.ipc.IpcWriteOptions(compression=compression if compression in ("zstd", "lz4") else None)
+        writer = pa.ipc.new_stream(sink, schema, options=options)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    try:
+        for chunk in chunks:
+            writer.write_table(to_table(chunk))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
@@ -0,0 +1,216 @@
+# app/feature_store.py
+"""
+Almacen en linea de las ventanas moviles de cada dispositivo.
+
+``pipeline.after_insert`` llama a :meth:`FeatureStore.update` con cada
+medicion de ``/ingest`` y del colector: actualiza en O(1) las ventanas de
+5, 15 y 60 minutos del dispositivo (``app/ml_features.py``) y devuelve el
+vector de features que usa el modelo de anomalias.
+
+Con varios workers cada uno recibe solo parte de las muestras de un
+dispositivo. Antes de anadir una muestra se leen las del dispositivo con
+``ultimo id visto < id < id de la muestra`` (indice ``(device_id, id)``,
+normalmente ninguna fila), asi las ventanas de todos los workers tienen
+las mismas muestras que ve el entrenamiento (``ChunkFeatures``). La
+primera muestra de un dispositivo en el worker carga asi sus ultimos 60
+minutos.
+
+Cada ``FEATURE_SNAPSHOT_S`` segundos los dispositivos con muestras nuevas
+se vuelcan a ``device_features`` (una fila por dispositivo y ventana), que
+es lo que sirve ``GET /query/features`` a cualquier worker.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .ml_features import FEATURE_VARIABLES, FEATURE_WINDOWS_S, DeviceWindows, measurement_values, row_values
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = [
+    f"{v}_{stat}" for v in FEATURE_VARIABLES for stat in ("mean", "var", "slope")
+]
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    # Mismo criterio de tiempo que /query/series (UTC naive)
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+
+def _db_value(x: float) -> Optional[float]:
+    return None if math.isnan(x) else x
+
+
+class FeatureStore:
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]],
+        snapshot_s: float = 10.0,
+        max_devices: int = 10000,
+        enabled: bool = True,
+    ):
+        self.session_factory = session_factory
+        self.snapshot_s = snapshot_s
+        self.max_devices = max_devices
+        self.enabled = enabled
+        self._devices: "OrderedDict[str, DeviceWindows]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._next_snapshot = time.monotonic() + snapshot_s
+        self.updates = 0
+        self.warmups = 0
+        self.caught_up = 0
+        self.snapshots = 0
+        self.rows_written = 0
+
+    # ---- ruta de escritura ----
+    def update(self, row: models.Measurement, db: Optional[Session] = None) -> Optional[np.ndarray]:
+        """
+        Anade la medicion (y las que recibieron otros workers antes que ella)
+        a las ventanas de su dispositivo y devuelve sus features. Cada fila
+        se aplica una vez: las de id no mayor que el ultimo aplicado se omiten.
+        """
+        if not self.enabled or row.ts is None:
+            return None
+        with self._lock:
+            dev = self._devices.get(row.device_id)
+            after = dev.last_id if dev is not None else None
+        missed = self._missed(db, row, after)
+        with self._lock:
+            dev = self._devices.get(row.device_id)
+            if dev is None:
+                dev = self._devices[row.device_id] = DeviceWindows()
+                self.warmups += 1
+            else:
+                self.caught_up += len(missed)
+            self._devices.move_to_end(row.device_id)
+            for r in missed:
+                if dev.last_id is None or r[0] > dev.last_id:
+                    dev.update(r[1].timestamp(), row_values(r, range(2, 2 + len(FEATURE_VARIABLES))), r[0])
+            if dev.last_id is None or row.id > dev.last_id:
+                dev.update(row.ts.timestamp(), measurement_values(row), row.id)
+            vector = dev.vector()
+            self._dirty.add(row.device_id)
+            self.updates += 1
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        return vector
+
+    def _missed(self, db: Optional[Session], row: models.Measurement, after: Optional[int]) -> List[Any]:
+        """
+        Filas del dispositivo anteriores a ``row`` y posteriores a ``after``
+        (todas las de la ventana mas larga si el worker no lo conocia).
+        """
+        if db is None:
+            return []
+        M = models.Measurement
+        since = _naive_utc(row.ts) - timedelta(seconds=max(FEATURE_WINDOWS_S))
+        cols = [M.id, M.ts] + [getattr(M, v) for v in FEATURE_VARIABLES]
+        q = select(*cols).where(M.device_id == row.device_id, M.id < row.id, M.ts >= since)
+        if after is not None:
+            q = q.where(M.id > after)
+        return db.execute(q.order_by(M.id)).all()
+
+    def vector(self, device_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            dev = self._devices.get(device_id)
+            return dev.vector() if dev is not None else None
+
+    # ---- instantaneas en device_features ----
+    def snapshot(self, db: Optional[Session] = None) -> int:
+        """Vuelca los dispositivos con muestras nuevas; devuelve las filas escritas."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._next_snapshot = time.monotonic() + self.snapshot_s
+            items = [
+                (d, dev.last_t, dev.last_id, [(int(w.span_s), len(w.buf), w.stats()) for w in dev.windows])
+                for d in dirty
+                if (dev := self._devices.get(d)) is not None
+            ]
+        if not items:
+            return 0
+        own = db is None
+        if own:
+            if self.session_factory is None:
+                return 0
+            db = self.session_factory()
+        try:
+            written = 0
+            for device_id, last_t, last_id, windows in items:
+                last_ts = datetime.fromtimestamp(last_t, tz=timezone.utc) if last_t is not None else None
+                for window_s, samples, stats in windows:
+                    values = {
+                        col: _db_value(x)
+                        for col, x in zip(_COLUMNS, (x for var in stats for x in var))
+                    }
+                    db.merge(models.DeviceFeatures(
+                        device_id=device_id, window_s=window_s, samples=samples,
+                        last_ts=last_ts, last_measurement_id=last_id, **values,
+                    ))
+                    written += 1
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty |= {d for d, *_ in items}  # reintentar en la siguiente
+            raise
+        finally:
+            if own:
+                db.close()
+        with self._lock:
+            self.snapshots += 1
+            self.rows_written += written
+        return written
+
+    def maybe_snapshot(self) -> int:
+        if time.monotonic() < self._next_snapshot:
+            return 0
+        return self.snapshot()
+
+    async def run(self) -> None:
+        """Bucle del ``lifespan``: instantanea cada ``snapshot_s`` segundos."""
+        while True:
+            await asyncio.sleep(self.snapshot_s)
+            try:
+                await asyncio.to_thread(self.maybe_snapshot)
+            except Exception:
+                logger.exception("feature snapshot failed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "devices": len(self._devices),
+                "dirty": len(self._dirty),
+                "updates": self.updates,
+                "warmups": self.warmups,
+                "caught_up": self.caught_up,
+                "snapshots": self.snapshots,
+                "rows_written": self.rows_written,
+            }
+
+
+def _make_store() -> FeatureStore:
+    from .db import SessionLocal
+    from .settings import settings
+    return FeatureStore(
+        SessionLocal,
+        snapshot_s=settings.feature_snapshot_s,
+        max_devices=settings.feature_max_devices,
+        enabled=settings.feature_store_enabled,
+    )
+
+
+feature_store = _make_store()
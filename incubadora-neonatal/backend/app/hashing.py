@@ -0,0 +1,166 @@
+# app/hashing.py
+"""
+Hash y verificacion de contrasenas en un pool de procesos acotado.
+
+``pbkdf2_sha256`` con 29000 rondas cuesta decenas de milisegundos de CPU
+con el GIL tomado; ejecutado dentro de los handlers, una rafaga de logins
+(cambio de turno) ocupa el threadpool y frena las lecturas de telemetria.
+Aqui el calculo va a ``PASSWORD_HASH_WORKERS`` procesos dedicados (contexto
+``spawn``, sin heredar el estado del worker web, y con menor prioridad via
+``nice``) y el numero de operaciones en curso o en cola se limita a
+``workers + PASSWORD_HASH_QUEUE``.
+Por encima de ese limite se lanza :class:`HashPoolSaturated` sin esperar,
+que la API traduce en ``503`` con ``Retry-After``; asi como mucho esa
+cantidad de hilos del threadpool queda esperando un resultado.
+
+Si un proceso del pool muere (OOM, senal) el ejecutor queda roto: la
+llamada en curso lanza :class:`HashPoolBroken` (tambien ``503``) y la
+siguiente crea un pool nuevo.
+
+Con ``PASSWORD_HASH_WORKERS=0`` se calcula en el propio hilo (tests y
+despliegues de un solo usuario).
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=29000
+)
+
+
+# ---- funciones que corren en los procesos del pool ----
+def _init_worker(nice: int) -> None:
+    # Prioridad menor que el worker web: con pocos nucleos las lecturas ganan la CPU
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+class HashPoolSaturated(Exception):
+    """No hay hueco en el pool ni en su cola."""
+
+
+class HashPoolBroken(Exception):
+    """Un proceso del pool murio; la siguiente llamada usa un pool nuevo."""
+
+
+class HashPool:
+    def __init__(self, workers: int = 2, max_queue: int = 8, timeout_s: float = 10.0, nice: int = 10):
+        self.workers = workers
+        self.nice = nice
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self._slots = threading.BoundedSemaphore(max(1, workers + max_queue))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.nice,),
+                )
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashPoolSaturated()
+        fut = executor = None
+        try:
+            with self._lock:
+                self._in_flight += 1
+            executor = self._pool()
+            fut = executor.submit(fn, *args)
+            result = fut.result(timeout=self.timeout_s)
+        except BrokenProcessPool as exc:
+            with self._lock:
+                self.failed += 1
+                if self._executor is executor:  # otro hilo pudo haberlo recreado ya
+                    self._executor = None
+                    self.restarts += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise HashPoolBroken() from exc
+        except TimeoutError:
+            fut.cancel()  # si aun esperaba en la cola del pool, ya no se ejecuta
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run(_verify, password, hashed)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "started": self._executor is not None,
+        }
+
+
+def _make_pool() -> HashPool:
+    from .settings import settings
+    return HashPool(
+        workers=settings.password_hash_workers,
+        max_queue=settings.password_hash_queue,
+        timeout_s=settings.password_hash_timeout_s,
+        nice=settings.password_hash_nice,
+    )
+
+
+hash_pool = _make_pool()
@@ -0,0 +1,324 @@
+# app/inference.py
+"""
+Puntuacion en linea de cada medicion con el modelo activo.
+
+``/ingest`` y el colector solo encolan la fila junto con su vector de
+features, ya calculado por ``feature_store.update`` (``scorer.submit``,
+O(1) y sin esperar); un hilo por worker agrupa lo encolado en micro-lotes
+de hasta ``INFERENCE_BATCH_SIZE`` muestras de cualquier dispositivo o lo
+que llegue en ``INFERENCE_BATCH_WAIT_MS``, puntua el lote con numpy y lo
+guarda en ``measurements.anomaly_score`` con un unico ``UPDATE`` por lote.
+Las filas con alguna feature sin definir (ventana con menos de dos
+muestras, variable nula) quedan sin puntuar.
+
+El modelo se recarga cuando cambia ``CURRENT`` (se comprueba como mucho
+cada ``MODEL_RELOAD_S``): la version nueva se carga aparte y se sustituye
+la referencia de una vez, asi el lote en curso termina con la anterior y
+no se pierde ninguna muestra.
+
+La carga es perezosa: nada se lee al arrancar el worker, sino en el primer
+lote que hay que puntuar. Los parametros se mapean en solo lectura
+(``MODEL_MMAP``, ver ``app/model_store.py``), asi que todos los workers
+comparten la misma copia en la cache de paginas; cada worker publica la
+version que tiene mapeada en ``workers/`` del almacen de modelos.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import query_cache
+from .ml_features import FEATURE_NAMES
+from .model_store import ModelStore
+from .training import score
+
+logger = logging.getLogger(__name__)
+
+_LATENCIES = 2048
+_THROUGHPUT_WINDOW_S = 60.0
+
+
+class LoadedModel(NamedTuple):
+    version: str
+    params: Dict[str, np.ndarray]
+    threshold: float
+    loaded_at: float
+    mmap: bool
+    mapped_bytes: int
+
+
+class ModelHandle:
+    """Referencia al modelo activo; se sustituye entera al cambiar de version."""
+
+    def __init__(self, store: ModelStore, reload_s: float = 5.0, mmap: bool = True):
+        self.store = store
+        self.reload_s = reload_s
+        self.mmap = mmap
+        self._model: Optional[LoadedModel] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._rejected: Optional[str] = None
+        self.swaps = 0
+
+    @property
+    def model(self) -> Optional[LoadedModel]:
+        """Modelo cargado, sin comprobar si hay una version nueva."""
+        return self._model
+
+    def get(self) -> Optional[LoadedModel]:
+        now = time.monotonic()
+        if now - self._checked >= self.reload_s:
+            with self._lock:
+                if now - self._checked >= self.reload_s:
+                    self._checked = now
+                    self._maybe_swap()
+        return self._model
+
+    def _maybe_swap(self) -> None:
+        version = self.store.current()
+        current = self._model
+        if version is None or version == self._rejected or (current is not None and current.version == version):
+            return
+        try:
+            params, meta = self.store.load(version, mmap=self.mmap)
+        except (OSError, ValueError, KeyError):
+            logger.exception("no se pudo cargar el modelo %s", version)
+            return
+        if meta.get("features") != list(FEATURE_NAMES):
+            # Entrenado con otras features (version anterior): no puntuar con el
+            self._rejected = version
+            logger.warning("modelo %s ignorado: sus features no coinciden con las actuales; reentrenar", version)
+            return
+        self._model = LoadedModel(
+            version=version,
+            params=params,
+            threshold=float(params["threshold"]),
+            loaded_at=time.time(),
+            mmap=any(isinstance(a, np.memmap) for a in params.values()),
+            mapped_bytes=sum(int(a.nbytes) for a in params.values()),
+        )
+        self.swaps += 1
+        logger.info("modelo %s activo", version)
+        model = self._model
+        try:
+            self.store.register_worker(
+                version=model.version, loaded_at=model.loaded_at, mmap=model.mmap, mapped_bytes=model.mapped_bytes,
+            )
+        except OSError:
+            logger.exception("no se pudo registrar el worker en %s", self.store.path)
+
+    def close(self) -> None:
+        """Suelta el modelo y borra el registro de este worker."""
+        with self._lock:
+            self._model = None
+            self._checked = 0.0
+        self.store.unregister_worker()
+
+
+class _Item(NamedTuple):
+    id: int
+    device_id: str
+    features: np.ndarray
+    enqueued: float
+
+
+class Scorer:
+    def __init__(
+        self,
+        handle: ModelHandle,
+        session_factory: Optional[Callable[[], Session]],
+        batch_size: int = 256,
+        batch_wait_ms: float = 20.0,
+        queue_size: int = 10000,
+        enabled: bool = True,
+    ):
+        self.handle = handle
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_ms / 1000.0
+        self.enabled = enabled
+        self._queue: "queue.Queue[_Item]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=_LATENCIES)
+        self._recent: Deque[Tuple[float, int]] = deque()
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.unscored = 0
+        self.anomalies = 0
+        self.batches = 0
+        self.errors = 0
+
+    # ---- ruta de escritura ----
+    def submit(self, row: models.Measurement, features: Optional[np.ndarray]) -> bool:
+        """Encola la fila y sus features para puntuarla; ``False`` si no se encola."""
+        if not self.enabled:
+            return False
+        if features is None:
+            with self._lock:
+                self.unscored += 1
+            return False
+        if self._thread is None:
+            self.start()
+        item = _Item(row.id, row.device_id, features, time.perf_counter())
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    # ---- hilo de puntuacion ----
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="scorer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        self.handle.close()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Espera a que se procese todo lo encolado (tests y apagado)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def _next_batch(self) -> List[_Item]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.process(batch)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logger.exception("fallo al puntuar un lote de %d muestras", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # ---- lote ----
+    def process(self, batch: List[_Item]) -> int:
+        """Puntua un lote (en el hilo del scorer); devuelve las filas puntuadas."""
+        model = self.handle.get()
+        if model is None:
+            with self._lock:
+                self.unscored += len(batch)
+            return 0
+
+        # las variables ausentes no cuentan; NaN si no queda ninguna
+        scores = score(np.stack([item.features for item in batch]), model.params)
+        ok = ~np.isnan(scores)
+        ids = [item.id for item, good in zip(batch, ok) if good]
+        scores = scores[ok]
+        if ids:
+            with self.session_factory() as db:
+                db.execute(
+                    update(models.Measurement),
+                    [{"id": i, "anomaly_score": float(s)} for i, s in zip(ids, scores)],
+                )
+                db.commit()
+            # /query/latest pudo cachear la fila antes de tener puntuacion
+            for device_id in {item.device_id for item in batch}:
+                query_cache.invalidate_device(device_id)
+
+        done = time.perf_counter()
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.scored += len(ids)
+            self.unscored += len(batch) - len(ids)
+            self.anomalies += int((scores > model.threshold).sum())
+            self._latencies.extend((done - item.enqueued) * 1000.0 for item in batch)
+            self._recent.append((now, len(ids)))
+            while self._recent and now - self._recent[0][0] > _THROUGHPUT_WINDOW_S:
+                self._recent.popleft()
+        return len(ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else None
+            recent = list(self._recent)
+            out = {
+                "enabled": self.enabled,
+                "running": self._thread is not None,
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "scored": self.scored,
+                "unscored": self.unscored,
+                "anomalies": self.anomalies,
+                "batches": self.batches,
+                "errors": self.errors,
+            }
+        model = self.handle.model
+        span = (time.monotonic() - recent[0][0]) if recent else 0.0
+        out.update(
+            model_version=model.version if model else None,
+            model_loaded_at=model.loaded_at if model else None,
+            model_mmap=model.mmap if model else False,
+            model_mapped_bytes=model.mapped_bytes if model else 0,
+            model_swaps=self.handle.swaps,
+            avg_batch=(self.scored + self.unscored) / self.batches if self.batches else 0.0,
+            throughput_per_s=sum(n for _, n in recent) / max(span, 1.0) if recent else 0.0,
+            latency_p50_ms=float(np.percentile(latencies, 50)) if latencies is not None else 0.0,
+            latency_p99_ms=float(np.percentile(latencies, 99)) if latencies is not None else 0.0,
+        )
+        return out
+
+
+def _make_scorer() -> Scorer:
+    from .db import SessionLocal
+    from .model_store import model_store
+    from .settings import settings
+    return Scorer(
+        ModelHandle(model_store, reload_s=settings.model_reload_s, mmap=settings.model_mmap),
+        SessionLocal,
+        batch_size=settings.inference_batch_size,
+        batch_wait_ms=settings.inference_batch_wait_ms,
+        queue_size=settings.inference_queue_size,
+        enabled=settings.inference_enabled,
+    )
+
+
+scorer = _make_scorer()
@@ -0,0 +1,249 @@
+# app/live.py
+"""
+Broker en proceso para telemetria en tiempo real.
+
+La ingesta y el colector publican cada medicion nueva (``broker.publish``)
+y los endpoints de streaming se suscriben a un conjunto de dispositivos.
+Cada suscriptor tiene una cola acotada: si el cliente es lento se descarta
+el evento mas antiguo (drop-oldest), de modo que un cliente lento nunca
+hace crecer la memoria del servidor. Los suscriptores que declaran una
+tasa maxima reciben en cambio solo el ultimo valor de cada dispositivo
+(conflacion, ver :class:`ConflatingSubscription`).
+
+``publish`` se puede llamar desde el event loop (ingesta, ``async``) o
+desde otro hilo (colector); en el segundo caso la entrega se agenda en el
+loop con ``call_soon_threadsafe``.
+
+Ademas el broker guarda los ultimos ``replay_size`` eventos de cada
+dispositivo para reanudar streams (``Last-Event-ID``): el id del evento es
+el id de la medicion, creciente. :meth:`Broker.replay` devuelve los eventos
+posteriores a un id y los dispositivos para los que el buffer no alcanza
+(hay que consultar la base de datos).
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from .encoding import dumps, epoch_ms
+from .settings import settings
+
+# Campos de la medicion que viajan en cada evento
+EVENT_FIELDS = (
+    "device_id", "temp_aire_c", "temp_piel_c", "humedad", "luz",
+    "ntc_c", "peso_g", "set_control", "alerts",
+)
+
+
+def measurement_event(row: Any) -> Dict[str, Any]:
+    """Evento serializable a partir de una fila ``Measurement`` ya persistida."""
+    event = {"id": row.id, "ts": row.ts.isoformat() if row.ts else None, "ts_ms": epoch_ms(row.ts)}
+    for name in EVENT_FIELDS:
+        event[name] = getattr(row, name, None)
+    return event
+
+
+def sse_frame(event: Dict[str, Any]) -> str:
+    """Trama SSE con ``id`` (permite ``Last-Event-ID``) y el evento en JSON."""
+    return f"id: {event['id']}\nevent: measurement\ndata: {dumps(event).decode()}\n\n"
+
+
+class Subscription:
+    """Cola acotada de un cliente, filtrada por ``device_ids``."""
+
+    def __init__(self, device_ids: Iterable[str], maxsize: int = 256):
+        self.device_ids = frozenset(device_ids)
+        self.queue: Deque[Dict[str, Any]] = deque(maxlen=maxsize)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1  # deque(maxlen) expulsa el mas antiguo
+        self.queue.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Siguiente evento, o ``None`` si vence ``timeout`` sin eventos."""
+        while not self.queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.queue.popleft()
+
+
+class ConflatingSubscription(Subscription):
+    """
+    Suscripcion con tasa maxima: guarda solo el ultimo evento de cada
+    dispositivo y los entrega en lotes a lo sumo ``max_rate`` veces por
+    segundo. El trabajo por cliente es O(dispositivos x tasa) y no depende
+    de cuantas muestras se publiquen.
+    """
+
+    def __init__(self, device_ids: Iterable[str], max_rate: float):
+        super().__init__(device_ids, maxsize=1)
+        self.max_rate = max_rate
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self.conflated = 0
+        self._next_flush = 0.0
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if event["device_id"] in self.latest:
+            self.conflated += 1
+        self.latest[event["device_id"]] = event
+        self._ready.set()
+
+    def discard(self, device_ids: Iterable[str]) -> None:
+        for dev in device_ids:
+            self.latest.pop(dev, None)
+
+    async def get_batch(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Ultimo evento de cada dispositivo con cambios, ordenados por id,
+        respetando ``max_rate``. Lista vacia si vence ``timeout`` sin eventos.
+        """
+        loop = asyncio.get_running_loop()
+        wait = self._next_flush - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        while not self.latest:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = sorted(self.latest.values(), key=lambda e: e["id"])
+        self.latest.clear()
+        self._next_flush = loop.time() + 1.0 / self.max_rate
+        return batch
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        raise TypeError("use get_batch() on a conflating subscription")
+
+
+class Broker:
+    def __init__(self, queue_size: int = 256, replay_size: int = 512):
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self._by_device: Dict[str, Set[Subscription]] = {}
+        self._recent: Dict[str, Deque[Dict[str, Any]]] = {}
+        # Por dispositivo: id del ultimo evento expulsado del buffer
+        self._evicted: Dict[str, int] = {}
+        # Toda medicion con id mayor que este ha pasado por el broker
+        self.covered_from: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.replayed = 0
+
+    def subscribe(self, device_ids: Iterable[str], max_rate: Optional[float] = None) -> Subscription:
+        """Con ``max_rate`` devuelve una :class:`ConflatingSubscription`."""
+        self._loop = asyncio.get_running_loop()
+        if max_rate:
+            sub = ConflatingSubscription(device_ids, max_rate)
+        else:
+            sub = Subscription(device_ids, self.queue_size)
+        with self._lock:
+            for dev in sub.device_ids:
+                self._by_device.setdefault(dev, set()).add(sub)
+        return sub
+
+    def update(self, sub: Subscription, device_ids: Iterable[str]) -> None:
+        """Cambia los dispositivos de una suscripcion existente (WebSocket)."""
+        with self._lock:
+            self._remove(sub)
+            sub.device_ids = frozenset(device_ids)
+            for dev in sub.device_ids:
+                self._by_device.setdefault(dev, set()).add(sub)
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._remove(sub)
+
+    def _remove(self, sub: Subscription) -> None:
+        for dev in sub.device_ids:
+            subs = self._by_device.get(dev)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_device[dev]
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self.published += 1
+        with self._lock:
+            self._remember(event)
+            if event.get("device_id") not in self._by_device:
+                return
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is loop:
+            self._deliver(event)
+        elif loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._deliver, event)
+
+    def _remember(self, event: Dict[str, Any]) -> None:
+        if self.replay_size <= 0:
+            return
+        dev = event.get("device_id")
+        ring = self._recent.get(dev)
+        if ring is None:
+            ring = self._recent[dev] = deque(maxlen=self.replay_size)
+        if len(ring) == ring.maxlen:
+            self._evicted[dev] = ring[0]["id"]
+        ring.append(event)
+
+    def mark_covered(self, max_id: Optional[int]) -> None:
+        """
+        Registra el mayor id de medicion existente en este momento (se llama
+        una vez, con el broker ya recibiendo eventos): lo posterior esta en
+        el buffer o fue expulsado de el.
+        """
+        if self.covered_from is None:
+            self.covered_from = max_id or 0
+
+    def replay(self, device_ids: Iterable[str], last_id: int) -> Tuple[List[Dict[str, Any]], Set[str]]:
+        """
+        Eventos con ``id > last_id`` de ``device_ids`` guardados en memoria,
+        ordenados por id, y el conjunto de dispositivos cuyo hueco no cubre
+        el buffer.
+        """
+        events: List[Dict[str, Any]] = []
+        missing: Set[str] = set()
+        with self._lock:
+            for dev in device_ids:
+                floor = self._evicted.get(dev, self.covered_from)
+                if floor is None or last_id < floor:
+                    missing.add(dev)
+                    continue
+                events.extend(e for e in self._recent.get(dev, ()) if e["id"] > last_id)
+        events.sort(key=lambda e: e["id"])
+        self.replayed += len(events)
+        return events, missing
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._by_device.get(event["device_id"], ()))
+        for sub in subs:
+            sub.offer(event)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            subs = {s for group in self._by_device.values() for s in group}
+        return {
+            "subscribers": len(subs),
+            "devices": len(self._by_device),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in subs),
+            "conflated": sum(getattr(s, "conflated", 0) for s in subs),
+            "replayed": self.replayed,
+        }
+
+
+broker = Broker(settings.live_queue_size, settings.live_replay_size)
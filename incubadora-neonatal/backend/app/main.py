@@ -1,10 +1,43 @@
 # app/main.py
 from fastapi.middleware.cors import CORSMiddleware
 from .settings import settings
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
-from .routers import ingest, query, alerts, models_router, auth, devices
+from .live import broker
+from .pubsub import transport
+from .rules import rule_engine
+from .hashing import hash_pool
+from .training import trainer
+from .inference import scorer
+from .feature_store import feature_store
+from .routers import ingest, query, alerts, rules, models_router, auth, devices, export, stream, live_ws
 
-app = FastAPI(title="Incubadora API", version="v0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un receptor de eventos en vivo por worker (LISTEN en el transporte postgres)
+    transport.start(broker.publish)
+    # Temporizadores de reglas "no_data" y checkpoint del estado de reglas
+    rules_task = asyncio.create_task(rule_engine.run())
+    # Instantaneas periodicas de las ventanas moviles en device_features
+    features_task = asyncio.create_task(feature_store.run())
+    yield
+    rules_task.cancel()
+    features_task.cancel()
+    try:
+        await asyncio.to_thread(feature_store.snapshot)
+    except Exception:
+        # la siguiente arrancada recalcula las ventanas desde measurements
+        logging.getLogger(__name__).exception("feature snapshot failed")
+    transport.stop()
+    hash_pool.shutdown()
+    trainer.shutdown()
+    scorer.stop()
+
+
+app = FastAPI(title="Incubadora API", version="v0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Export-Watermark", "X-Has-More", "X-Next-Cursor"],
 )
 
 api = APIRouter(prefix="/incubadora")
@@ -19,8 +53,12 @@ api.include_router(auth)
 api.include_router(ingest)
 api.include_router(query)
 api.include_router(alerts)
+api.include_router(rules)
 api.include_router(models_router)
 api.include_router(devices)
+api.include_router(export)
+api.include_router(stream)
+api.include_router(live_ws)
 
 app.include_router(api)
 @app.get("/healthz")
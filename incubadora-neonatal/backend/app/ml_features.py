@@ -0,0 +1,205 @@
+# app/ml_features.py
+"""
+Features de ventanas moviles por dispositivo, actualizadas muestra a muestra.
+
+Para ``temp_aire_c``, ``temp_piel_c`` y ``humedad`` y ventanas de 5, 15 y
+60 minutos se mantienen media, varianza y pendiente por minuto (minimos
+cuadrados frente a ``ts``). Cada ventana guarda sus muestras en un buffer
+circular (``deque``) y los momentos de Welford de ``(t, valor)`` por
+variable; al entrar una muestra se suma y al salir por el otro extremo se
+resta con la formula inversa, asi cada muestra cuesta O(1) amortizado sin
+recorrer la ventana.
+
+La misma clase :class:`DeviceWindows` alimenta el almacen en linea
+(``app/feature_store.py``: ingesta, colector e inferencia) y el
+entrenamiento (:class:`ChunkFeatures` sobre ``export.iter_chunks``), de
+modo que el modelo ve exactamente las mismas features al entrenar y al
+puntuar.
+
+Una variable sin dato (p. ej. ``temp_piel_c`` en modo aire o desde el
+colector) deja NaN solo en sus features: :func:`present_mask` marca por
+fila las variables completas y el modelo puntua con las que haya.
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .export import EXPORT_COLUMNS
+
+FEATURE_VARIABLES = ("temp_aire_c", "temp_piel_c", "humedad")
+FEATURE_WINDOWS_S = (300, 900, 3600)
+WINDOW_STATS = ("mean", "var", "slope")
+FEATURE_NAMES = tuple(f"{v}_value" for v in FEATURE_VARIABLES) + tuple(
+    f"{v}_{s}_{w // 60}m" for w in FEATURE_WINDOWS_S for v in FEATURE_VARIABLES for s in WINDOW_STATS
+)
+# Muestras minimas de una variable en una ventana para dar estadisticos
+MIN_SAMPLES = 2
+# Variable (indice en FEATURE_VARIABLES) de cada feature de FEATURE_NAMES
+FEATURE_VARIABLE_INDEX = np.array(
+    list(range(len(FEATURE_VARIABLES)))
+    + [i for _ in FEATURE_WINDOWS_S for i in range(len(FEATURE_VARIABLES)) for _ in WINDOW_STATS]
+)
+
+_NAN = float("nan")
+_ID = EXPORT_COLUMNS.index("id")
+_DEVICE = EXPORT_COLUMNS.index("device_id")
+_TS = EXPORT_COLUMNS.index("ts")
+_VARS = [EXPORT_COLUMNS.index(v) for v in FEATURE_VARIABLES]
+
+Sample = Tuple[float, Tuple[Optional[float], ...]]  # (t, valores por variable)
+
+
+class _Moments:
+    """Momentos de Welford de ``(t, v)`` con altas y bajas."""
+
+    __slots__ = ("n", "mt", "mv", "m2t", "m2v", "c")
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mt = self.mv = self.m2t = self.m2v = self.c = 0.0
+
+    def add(self, t: float, v: float) -> None:
+        self.n += 1
+        dt = t - self.mt
+        dv = v - self.mv
+        self.mt += dt / self.n
+        self.mv += dv / self.n
+        self.m2t += dt * (t - self.mt)
+        self.m2v += dv * (v - self.mv)
+        self.c += dt * (v - self.mv)
+
+    def remove(self, t: float, v: float) -> None:
+        if self.n <= 1:
+            self.__init__()
+            return
+        self.n -= 1
+        dt = t - self.mt
+        dv = v - self.mv
+        self.mt -= dt / self.n
+        self.mv -= dv / self.n
+        self.m2t -= dt * (t - self.mt)
+        self.m2v -= dv * (v - self.mv)
+        self.c -= dt * (v - self.mv)
+
+    def stats(self) -> Tuple[float, float, float]:
+        """``(media, varianza, pendiente por minuto)``; NaN con pocas muestras."""
+        if self.n < MIN_SAMPLES:
+            return _NAN, _NAN, _NAN
+        slope = self.c / self.m2t * 60.0 if self.m2t > 1e-12 else 0.0
+        return self.mv, max(self.m2v / self.n, 0.0), slope
+
+
+class RollingWindow:
+    __slots__ = ("span_s", "buf", "moments")
+
+    def __init__(self, span_s: float):
+        self.span_s = span_s
+        self.buf: Deque[Sample] = deque()
+        self.moments = [_Moments() for _ in FEATURE_VARIABLES]
+
+    def add(self, t: float, values: Tuple[Optional[float], ...]) -> None:
+        self.buf.append((t, values))
+        for m, v in zip(self.moments, values):
+            if v is not None:
+                m.add(t, v)
+        limit = t - self.span_s
+        while self.buf and self.buf[0][0] <= limit:
+            old_t, old = self.buf.popleft()
+            for m, v in zip(self.moments, old):
+                if v is not None:
+                    m.remove(old_t, v)
+
+    def stats(self) -> List[Tuple[float, float, float]]:
+        return [m.stats() for m in self.moments]
+
+
+class DeviceWindows:
+    """Ventanas de :data:`FEATURE_WINDOWS_S` de un dispositivo."""
+
+    __slots__ = ("windows", "origin", "last_t", "last_id", "last_values")
+
+    def __init__(self, windows_s: Sequence[float] = FEATURE_WINDOWS_S):
+        self.windows = [RollingWindow(w) for w in windows_s]
+        self.origin: Optional[float] = None
+        self.last_t: Optional[float] = None
+        self.last_id: Optional[int] = None
+        self.last_values: Tuple[Optional[float], ...] = (None,) * len(FEATURE_VARIABLES)
+
+    def update(self, t: float, values: Tuple[Optional[float], ...], id: Optional[int] = None) -> None:
+        if self.origin is None:
+            self.origin = t  # tiempos relativos: momentos con mejor precision
+        rel = t - self.origin
+        for w in self.windows:
+            w.add(rel, values)
+        self.last_t, self.last_id, self.last_values = t, id, values
+
+    def vector(self) -> np.ndarray:
+        """Features en el orden de :data:`FEATURE_NAMES` (NaN si faltan datos)."""
+        out = [_NAN if v is None else v for v in self.last_values]
+        for w in self.windows:
+            for stats in w.stats():
+                out.extend(stats)
+        return np.array(out, dtype=np.float64)
+
+
+def present_mask(X: np.ndarray) -> np.ndarray:
+    """
+    Mascara ``(filas, features)``: ``True`` en las features de las variables
+    con todas sus features definidas (valor actual y estadisticos de cada
+    ventana). Una variable a medias cuenta como ausente entera.
+    """
+    nan = np.isnan(X)
+    missing = np.zeros((X.shape[0], len(FEATURE_VARIABLES)), dtype=bool)
+    for i in range(len(FEATURE_VARIABLES)):
+        missing[:, i] = nan[:, FEATURE_VARIABLE_INDEX == i].any(axis=1)
+    return ~missing[:, FEATURE_VARIABLE_INDEX]
+
+
+def _value(v) -> Optional[float]:
+    if v is None:
+        return None
+    v = float(v)
+    return None if math.isnan(v) else v
+
+
+def row_values(row, columns: Sequence[int] = _VARS) -> Tuple[Optional[float], ...]:
+    """Valores de :data:`FEATURE_VARIABLES` de una tupla (posiciones ``columns``)."""
+    return tuple(_value(row[i]) for i in columns)
+
+
+def measurement_values(row) -> Tuple[Optional[float], ...]:
+    """Valores de :data:`FEATURE_VARIABLES` de un ``models.Measurement``."""
+    return tuple(_value(getattr(row, v)) for v in FEATURE_VARIABLES)
+
+
+class ChunkFeatures:
+    """
+    Features de cada fila de bloques de ``export.iter_chunks`` (orden de
+    ``id``), con las ventanas de cada dispositivo vivas entre bloques.
+    """
+
+    def __init__(self) -> None:
+        self._devices: Dict[str, DeviceWindows] = {}
+
+    def push(self, rows: Sequence[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        """``(ids, X)`` de las filas con al menos una variable completa (NaN en el resto)."""
+        ids: List[int] = []
+        vectors: List[np.ndarray] = []
+        for r in rows:
+            if r[_TS] is None:
+                continue
+            dev = self._devices.get(r[_DEVICE])
+            if dev is None:
+                dev = self._devices[r[_DEVICE]] = DeviceWindows()
+            dev.update(r[_TS].timestamp(), row_values(r), r[_ID])
+            ids.append(r[_ID])
+            vectors.append(dev.vector())
+        if not vectors:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(FEATURE_NAMES)))
+        X = np.stack(vectors)
+        keep = present_mask(X).any(axis=1)
+        return np.array(ids, dtype=np.int64)[keep], X[keep]
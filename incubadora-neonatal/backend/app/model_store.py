@@ -0,0 +1,271 @@
+# app/model_store.py
+"""
+Artefactos versionados del modelo en disco.
+
+Estructura bajo ``MODEL_DIR``::
+
+    <model_dir>/<name>/
+        CURRENT              version activa (p. ej. "v0.0.3")
+        status.json          estado del entrenamiento (progreso, metricas...)
+        training.lock        existe mientras hay un entrenamiento en curso
+        v0.0.3/meta.json     metadatos y metricas
+        v0.0.3/params/*.npy  un array de numpy por parametro
+        workers/<host>-<pid>.json  version que tiene mapeada cada worker
+
+Una version se escribe en un directorio temporal y se publica con
+``os.replace``; ``CURRENT`` y ``status.json`` tambien se reemplazan de forma
+atomica. Asi todos los workers y el proceso de entrenamiento comparten el
+estado a traves del disco y nunca leen un artefacto a medio escribir.
+
+Cada parametro es un ``.npy`` sin comprimir que :meth:`ModelStore.load`
+abre con ``np.load(mmap_mode="r")``: los workers no copian los arrays a su
+memoria sino que mapean el mismo fichero, de modo que comparten una sola
+copia en la cache de paginas del sistema y solo se leen las paginas que se
+usan. Los ficheros de una version no se modifican nunca (una version nueva
+es otro directorio), asi que el mapeo de solo lectura es seguro. Las
+versiones antiguas con ``params.npz`` se siguen pudiendo cargar (en memoria).
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+CURRENT_FILE = "CURRENT"
+STATUS_FILE = "status.json"
+LOCK_FILE = "training.lock"
+PARAMS_DIR = "params"
+WORKERS_DIR = "workers"
+
+
+def _version_key(version: str) -> Tuple:
+    parts = version.lstrip("v").split(".")
+    return tuple(int(p) if p.isdigit() else -1 for p in parts)
+
+
+def _write_atomic(path: str, data: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _alive(pid: Any) -> bool:
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, pero es de otro usuario
+    return True
+
+
+class ModelStore:
+    def __init__(self, root: str, name: str, initial_version: str = "v0.0.1"):
+        self.root = root
+        self.name = name
+        self.initial_version = initial_version
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.root, self.name)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # ---- versiones ----
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        found = [
+            d for d in os.listdir(self.path)
+            if not d.startswith(".") and os.path.isfile(os.path.join(self.path, d, "meta.json"))
+        ]
+        return sorted(found, key=_version_key)
+
+    def next_version(self) -> str:
+        versions = self.versions()
+        if not versions:
+            return self.initial_version
+        last = versions[-1]
+        parts = last.split(".")
+        if parts and parts[-1].isdigit():
+            parts[-1] = str(int(parts[-1]) + 1)
+            return ".".join(parts)
+        return f"{last}.1"
+
+    def current(self) -> Optional[str]:
+        try:
+            with open(self._file(CURRENT_FILE), encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    def save(self, version: str, params: Dict[str, np.ndarray], meta: Dict[str, Any]) -> str:
+        """Escribe la version completa y la publica con un rename atomico."""
+        os.makedirs(self.path, exist_ok=True)
+        final = os.path.join(self.path, version)
+        if os.path.exists(final):
+            raise FileExistsError(f"la version {version} ya existe")
+        tmp = tempfile.mkdtemp(dir=self.path, prefix=f".{version}-")
+        try:
+            os.mkdir(os.path.join(tmp, PARAMS_DIR))
+            for key, value in params.items():
+                np.save(os.path.join(tmp, PARAMS_DIR, f"{key}.npy"), np.asarray(value))
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2, sort_keys=True)
+            os.replace(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return final
+
+    def activate(self, version: str) -> None:
+        if not os.path.isfile(os.path.join(self.path, version, "meta.json")):
+            raise FileNotFoundError(f"la version {version} no existe")
+        _write_atomic(self._file(CURRENT_FILE), version + "\n")
+
+    def load_meta(self, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self.path, version, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, version: str, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """Parametros (``np.memmap`` de solo lectura si ``mmap``) y metadatos de ``version``."""
+        base = os.path.join(self.path, version)
+        params_dir = os.path.join(base, PARAMS_DIR)
+        if os.path.isdir(params_dir):
+            params = {
+                f[:-4]: np.load(os.path.join(params_dir, f), mmap_mode="r" if mmap else None)
+                for f in sorted(os.listdir(params_dir)) if f.endswith(".npy")
+            }
+        else:
+            # version anterior a los .npy: un .npz no se puede mapear
+            with np.load(os.path.join(base, "params.npz")) as data:
+                params = {k: data[k] for k in data.files}
+        return params, self.load_meta(version)
+
+    # ---- estado del entrenamiento ----
+    def read_status(self) -> Dict[str, Any]:
+        try:
+            with open(self._file(STATUS_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def write_status(self, **fields: Any) -> Dict[str, Any]:
+        """Mezcla ``fields`` en ``status.json`` (un solo escritor: quien tiene el lock)."""
+        os.makedirs(self.path, exist_ok=True)
+        status = self.read_status()
+        status.update(fields)
+        status["updated_at"] = time.time()
+        _write_atomic(self._file(STATUS_FILE), json.dumps(status, sort_keys=True))
+        return status
+
+    # ---- version mapeada por cada worker ----
+    def _worker_file(self, pid: int, host: str) -> str:
+        return os.path.join(self.path, WORKERS_DIR, f"{host}-{pid}.json")
+
+    def register_worker(self, **fields: Any) -> None:
+        """Publica lo que tiene cargado este proceso (lo lee ``/models/status``)."""
+        pid, host = os.getpid(), socket.gethostname()
+        os.makedirs(os.path.join(self.path, WORKERS_DIR), exist_ok=True)
+        record = dict(fields, pid=pid, host=host, updated_at=time.time())
+        _write_atomic(self._worker_file(pid, host), json.dumps(record, sort_keys=True))
+
+    def unregister_worker(self) -> None:
+        try:
+            os.unlink(self._worker_file(os.getpid(), socket.gethostname()))
+        except FileNotFoundError:
+            pass
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Workers registrados; se borran los de este host cuyo proceso ya no existe."""
+        folder = os.path.join(self.path, WORKERS_DIR)
+        if not os.path.isdir(folder):
+            return []
+        host = socket.gethostname()
+        out = []
+        for name in sorted(os.listdir(folder)):
+            if name.startswith(".") or not name.endswith(".json"):
+                continue
+            path = os.path.join(folder, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    record = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            if record.get("host") == host and not _alive(record.get("pid")):
+                try:
+                    os.unlink(path)  # worker reiniciado o muerto sin apagado limpio
+                except FileNotFoundError:
+                    pass
+                continue
+            out.append(record)
+        return out
+
+    # ---- exclusion entre workers ----
+    def acquire_lock(self, stale_after_s: float) -> Optional[str]:
+        """
+        Crea ``training.lock`` y devuelve su token de propietario; ``None`` si
+        otro entrenamiento esta en curso.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        path = self._file(LOCK_FILE)
+        try:
+            if time.time() - os.path.getmtime(path) > stale_after_s:
+                os.unlink(path)  # el proceso que lo tenia murio sin liberarlo
+        except FileNotFoundError:
+            pass
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+        return token
+
+    def touch_lock(self) -> None:
+        """Latido del entrenamiento en curso: ``acquire_lock`` juzga el lock por su mtime."""
+        try:
+            os.utime(self._file(LOCK_FILE))
+        except FileNotFoundError:
+            pass
+
+    def locked(self) -> bool:
+        return os.path.exists(self._file(LOCK_FILE))
+
+    def release_lock(self, token: Optional[str] = None) -> None:
+        """Borra ``training.lock``; con ``token``, solo si sigue siendo de ese propietario."""
+        path = self._file(LOCK_FILE)
+        try:
+            if token is not None:
+                with open(path) as f:
+                    if f.read() != token:
+                        return  # ya liberado y tomado por otro entrenamiento
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _make_store() -> ModelStore:
+    from .settings import settings
+    return ModelStore(settings.model_dir, settings.model_name, settings.model_ver)
+
+
+model_store = _make_store()
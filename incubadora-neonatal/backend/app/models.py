@@ -1,6 +1,6 @@
 # app/models.py
 from __future__ import annotations
-from sqlalchemy import Column, Integer, String, Float, DateTime, func, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, func, Boolean, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 from .db import Base
 
@@ -20,6 +20,15 @@ class Measurement(Base):
     peso_g       = Column(Float, nullable=True)
     set_control  = Column(Integer, nullable=True)
     alerts       = Column(Integer, nullable=True)
+    # Puntuacion del modelo de anomalias (app/inference.py); NULL = sin puntuar
+    anomaly_score = Column(Float, nullable=True)
+
+    # Series por dispositivo ordenadas por tiempo (/query/series, /query/latest)
+    # y filas de un dispositivo posteriores a un id (feature_store, reenvio del stream)
+    __table_args__ = (
+        Index("ix_measurements_device_ts", "device_id", "ts"),
+        Index("ix_measurements_device_id_id", "device_id", "id"),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -35,15 +44,128 @@ class User(Base):
     # Relación 1:N con Device
     devices = relationship("Device", back_populates="user", cascade="all, delete-orphan")
 
+    # Filtro por prefijo de /auth/users (LIKE 'abc%' con indice en cualquier collation)
+    __table_args__ = (
+        Index("ix_users_username_pattern", "username", postgresql_ops={"username": "text_pattern_ops"}),
+    )
+
 class Device(Base):
     __tablename__ = "devices"
 
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(String, unique=True, index=True, nullable=False)  # ID único del dispositivo físico
     name = Column(String, nullable=True)  # Nombre opcional para el dispositivo
+    ward = Column(String, nullable=True, index=True)  # Sala/servicio (agrupa reglas de alerta)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  # Nullable para permitir desvinculación
+    api_key_hash = Column(String(64), nullable=True, unique=True)  # SHA-256 de la clave de /ingest
+    api_key_rotated_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Relación N:1 con User
     user = relationship("User", back_populates="devices")
+
+
+class AlertEvent(Base):
+    """Episodio de alerta: un bit del bitmask ``alerts`` activo entre ``started_at`` y ``ended_at``."""
+    __tablename__ = "alert_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String, nullable=False)
+    bit = Column(Integer, nullable=False)  # bit del firmware; 0 en episodios de reglas
+    rule_id = Column(Integer, ForeignKey("alert_rules.id", ondelete="CASCADE"), nullable=True)  # NULL = firmware
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=True)  # NULL = episodio en curso
+    duration_s = Column(Float, nullable=True)
+    start_measurement_id = Column(Integer, nullable=True)
+    end_measurement_id = Column(Integer, nullable=True)
+    samples = Column(Integer, nullable=True)
+
+    # Valores extremos durante el episodio (se calculan al cerrarlo)
+    max_temp_aire_c = Column(Float, nullable=True)
+    min_temp_aire_c = Column(Float, nullable=True)
+    max_temp_piel_c = Column(Float, nullable=True)
+    max_humedad = Column(Float, nullable=True)
+    min_humedad = Column(Float, nullable=True)
+    min_peso_g = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_alert_events_device_started", "device_id", "started_at"),
+        Index("ix_alert_events_started", "started_at"),
+        # Como mucho un episodio abierto por dispositivo y bit / regla (tambien entre workers)
+        Index(
+            "uq_alert_events_open", "device_id", "bit", unique=True,
+            postgresql_where=ended_at.is_(None) & rule_id.is_(None),
+            sqlite_where=ended_at.is_(None) & rule_id.is_(None),
+        ),
+        Index(
+            "uq_alert_events_open_rule", "device_id", "rule_id", unique=True,
+            postgresql_where=ended_at.is_(None) & rule_id.isnot(None),
+            sqlite_where=ended_at.is_(None) & rule_id.isnot(None),
+        ),
+    )
+
+
+class AlertRule(Base):
+    """
+    Regla de alerta evaluada en el servidor. Alcance: un dispositivo
+    (``device_id``), una sala (``ward``) o todos si ambos son NULL.
+
+    - ``threshold``: ``variable`` ``op`` ``threshold``; se apaga al volver
+      ``hysteresis`` unidades por debajo/encima del umbral.
+    - ``rate``: variacion de ``variable`` por minuto en ``window_s`` segundos
+      comparada con ``threshold`` (``op`` ``>`` subida, ``<`` bajada).
+    - ``no_data``: ninguna medicion en ``timeout_s`` segundos.
+    """
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # threshold | rate | no_data
+    variable = Column(String, nullable=True)
+    op = Column(String, nullable=True)  # ">" | "<"
+    threshold = Column(Float, nullable=True)
+    hysteresis = Column(Float, nullable=False, default=0.0)
+    window_s = Column(Float, nullable=True)
+    timeout_s = Column(Float, nullable=True)
+    device_id = Column(String, nullable=True, index=True)
+    ward = Column(String, nullable=True, index=True)
+    enabled = Column(Boolean, nullable=False, default=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # borrada: se conservan sus episodios
+
+
+class AlertRuleState(Base):
+    """Checkpoint del estado incremental de una regla para un dispositivo."""
+    __tablename__ = "alert_rule_states"
+
+    rule_id = Column(Integer, ForeignKey("alert_rules.id", ondelete="CASCADE"), primary_key=True)
+    device_id = Column(String, primary_key=True)
+    active = Column(Boolean, nullable=False, default=False)
+    state = Column(Text, nullable=True)  # JSON (ventana de la regla rate, ultimo dato...)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class DeviceFeatures(Base):
+    """
+    Ultima instantanea de las ventanas moviles de un dispositivo
+    (``app/feature_store.py``): media, varianza y pendiente por minuto.
+    """
+    __tablename__ = "device_features"
+
+    device_id = Column(String, primary_key=True)
+    window_s = Column(Integer, primary_key=True)  # 300 | 900 | 3600
+    samples = Column(Integer, nullable=False, default=0)
+    temp_aire_c_mean = Column(Float, nullable=True)
+    temp_aire_c_var = Column(Float, nullable=True)
+    temp_aire_c_slope = Column(Float, nullable=True)  # por minuto
+    temp_piel_c_mean = Column(Float, nullable=True)
+    temp_piel_c_var = Column(Float, nullable=True)
+    temp_piel_c_slope = Column(Float, nullable=True)
+    humedad_mean = Column(Float, nullable=True)
+    humedad_var = Column(Float, nullable=True)
+    humedad_slope = Column(Float, nullable=True)
+    last_ts = Column(DateTime(timezone=True), nullable=True)
+    last_measurement_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
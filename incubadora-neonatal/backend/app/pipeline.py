@@ -0,0 +1,50 @@
+# app/pipeline.py
+"""
+Etapas que se ejecutan tras persistir una medicion, comunes a la ingesta
+HTTP (``routers/ingest.py``) y al colector (``collector.py``).
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .alert_engine import alert_engine
+from .cache import query_cache
+from .feature_store import feature_store
+from .inference import scorer
+from .live import measurement_event
+from .models import Measurement
+from .pubsub import transport
+from .rules import rule_engine
+
+logger = logging.getLogger(__name__)
+
+
+def after_insert(row: Measurement, db: Optional[Session] = None) -> None:
+    """
+    Invalida el cache del dispositivo, actualiza los episodios de alerta
+    del firmware y de las reglas del servidor (si se pasa la sesion ``db``),
+    actualiza las ventanas moviles del dispositivo, encola la fila y sus
+    features para el modelo de anomalias y publica el evento en vivo (a
+    todos los workers). Un fallo de los motores de alertas o de las
+    features no invalida la medicion.
+    """
+    query_cache.invalidate_device(row.device_id)
+    if db is not None:
+        for engine in (alert_engine, rule_engine):
+            try:
+                engine.process(db, row)
+            except Exception:
+                db.rollback()
+                logger.exception("%s failed for %s", type(engine).__name__, row.device_id)
+    try:
+        features = feature_store.update(row, db)
+    except Exception:
+        if db is not None:
+            db.rollback()
+        features = None
+        logger.exception("feature_store failed for %s", row.device_id)
+    scorer.submit(row, features)
+    transport.publish(measurement_event(row))
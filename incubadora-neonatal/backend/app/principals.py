@@ -0,0 +1,112 @@
+# app/principals.py
+"""
+Cache de usuarios autenticados (principales) para ``get_current_user``.
+
+Cada peticion autenticada valida el JWT y necesita el usuario del ``sub``;
+en vez de consultar ``users`` en cada peticion se guarda una copia de sus
+columnas publicas (sin ``hashed_password``) en un LRU acotado con TTL.
+
+La invalidacion usa el mismo esquema de contadores de generacion que el
+cache de consultas: las rutas que modifican un usuario incrementan
+``user:{username}`` en el backend de ``query_cache`` (compartido entre
+workers con Redis), y una entrada solo es valida si fue cargada con la
+generacion vigente. Asi un usuario desactivado queda fuera en la peticion
+siguiente en cualquier worker, sin esperar al TTL.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from .cache import CacheBackend
+
+Snapshot = Dict[str, object]
+
+
+class PrincipalCache:
+    def __init__(self, counters: Optional[CacheBackend], ttl: float = 30.0, max_entries: int = 4096):
+        self.counters = counters
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, int, Snapshot]]" = OrderedDict()
+        self._local_gen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _gen(self, username: str) -> int:
+        if self.counters is not None:
+            return self.counters.counters([f"user:{username}"])[0]
+        with self._lock:
+            return self._local_gen.get(username, 0)
+
+    def resolve(self, username: str, loader: Callable[[], Optional[Snapshot]]) -> Optional[Snapshot]:
+        """Copia cacheada del usuario o ``loader()`` (``None`` si no existe, no se cachea)."""
+        if not self.enabled:
+            return loader()
+        # La generacion se lee antes de cargar: una invalidacion concurrente
+        # deja la entrada nueva ya obsoleta en lugar de perderse
+        gen = self._gen(username)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(username)
+            if item is not None and item[0] >= now and item[1] == gen:
+                self._data.move_to_end(username)
+                self.hits += 1
+                return item[2]
+            self.misses += 1
+        snap = loader()
+        if snap is None:
+            return None
+        with self._lock:
+            self._data[username] = (now + self.ttl, gen, snap)
+            self._data.move_to_end(username)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return snap
+
+    def invalidate(self, *usernames: Optional[str]) -> None:
+        for username in {u for u in usernames if u}:
+            if self.counters is not None:
+                self.counters.incr(f"user:{username}")
+            with self._lock:
+                if self.counters is None:
+                    self._local_gen[username] = self._local_gen.get(username, 0) + 1
+                self._data.pop(username, None)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_s": self.ttl,
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def _make_cache() -> PrincipalCache:
+    from .cache import query_cache
+    from .settings import settings
+    return PrincipalCache(
+        query_cache.backend,
+        ttl=settings.auth_cache_ttl_s,
+        max_entries=settings.auth_cache_max_entries,
+    )
+
+
+principal_cache = _make_cache()
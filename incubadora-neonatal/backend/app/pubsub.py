@@ -0,0 +1,223 @@
+# app/pubsub.py
+"""
+Transporte de eventos en vivo entre workers.
+
+El broker de ``app/live.py`` solo reparte a los clientes conectados a su
+propio proceso. El transporte decide como llega cada evento a los brokers:
+
+- ``memory``: entrega directa al broker local (un solo worker, pruebas).
+- ``postgres``: ``pg_notify`` en un canal; cada worker mantiene una unica
+  conexion con ``LISTEN`` en un hilo y reparte localmente lo que recibe.
+  Asi un evento ingerido en cualquier worker o nodo llega a todos los
+  clientes. El worker que publica tambien recibe su propia notificacion,
+  por lo que no entrega localmente para no duplicar. ``publish`` solo
+  encola (sin bloquear la ingesta ni ocupar conexiones del pool): otro
+  hilo envia los ``NOTIFY`` por lotes en su propia conexion.
+
+Se elige con ``LIVE_TRANSPORT`` y se arranca/detiene en el ``lifespan``
+de la aplicacion.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import select
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .encoding import dumps
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+# Limite de payload de NOTIFY en PostgreSQL (8000 bytes por defecto)
+MAX_NOTIFY_BYTES = 7999
+
+
+class Transport:
+    """Interfaz: ``publish`` desde cualquier worker, ``start`` registra el receptor local."""
+
+    name = "base"
+
+    def start(self, handler: Handler) -> None:
+        raise NotImplementedError
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transport": self.name}
+
+
+class MemoryTransport(Transport):
+    name = "memory"
+
+    def __init__(self, handler: Optional[Handler] = None):
+        self._handler = handler
+
+    def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        if self._handler is not None:
+            self._handler(event)
+
+
+class PostgresTransport(Transport):
+    """
+    ``LISTEN/NOTIFY`` con una conexion de escucha y otra de envio por
+    worker, cada una en su hilo.
+    """
+
+    name = "postgres"
+
+    def __init__(self, engine, channel: str = "incubadora_live", poll_timeout: float = 5.0, reconnect_s: float = 2.0,
+                 queue_size: int = 4096, batch_size: int = 256):
+        self.engine = engine
+        self.channel = channel
+        self.poll_timeout = poll_timeout
+        self.reconnect_s = reconnect_s
+        self.batch_size = batch_size
+        self._handler: Optional[Handler] = None
+        self._thread: Optional[threading.Thread] = None
+        self._sender: Optional[threading.Thread] = None
+        self._outbox: "queue.Queue[str]" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def start(self, handler: Handler) -> None:
+        self._handler = handler
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._listen_loop, name="live-listener", daemon=True)
+            self._thread.start()
+            self._sender = threading.Thread(target=self._send_loop, name="live-notify", daemon=True)
+            self._sender.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in (self._thread, self._sender):
+            if thread is not None:
+                thread.join(timeout=self.poll_timeout + 1)
+        self._thread = self._sender = None
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Encola el evento para el hilo de envio; si la cola esta llena se descarta."""
+        payload = dumps(event).decode()
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            logger.warning("live event too large for NOTIFY (device %s)", event.get("device_id"))
+            return
+        try:
+            self._outbox.put_nowait(payload)
+        except queue.Full:
+            self.dropped += 1
+
+    def _connect(self, listen: bool = True):
+        raw = self.engine.raw_connection()
+        raw.detach()  # conexion dedicada: no vuelve al pool
+        conn = raw.driver_connection
+        conn.autocommit = listen
+        if listen:
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}"')
+        return raw, conn
+
+    def _next_batch(self) -> List[str]:
+        try:
+            batch = [self._outbox.get(timeout=self.poll_timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._outbox.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_loop(self) -> None:
+        raw, batch = None, []
+        while not self._stop.is_set() or batch or not self._outbox.empty():
+            try:
+                batch = batch or self._next_batch()
+                if not batch:
+                    continue
+                if raw is None:
+                    raw, conn = self._connect(listen=False)
+                with conn.cursor() as cur:
+                    # un solo commit por lote: los NOTIFY salen juntos al confirmar
+                    cur.executemany("SELECT pg_notify(%s, %s)", [(self.channel, p) for p in batch])
+                conn.commit()
+                self.sent += len(batch)
+                batch = []
+            except Exception:
+                self.errors += 1
+                logger.exception("pg_notify failed; retrying in %.1fs", self.reconnect_s)
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+                    raw = None
+                if self._stop.wait(self.reconnect_s):
+                    break
+        if raw is not None:
+            raw.close()
+
+    def _listen_loop(self) -> None:
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw, conn = self._connect()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        self.received += 1
+                        if self._handler is not None:
+                            self._handler(json.loads(note.payload))
+            except Exception:
+                self.errors += 1
+                logger.exception("live listener disconnected; retrying in %.1fs", self.reconnect_s)
+                self._stop.wait(self.reconnect_s)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "transport": self.name,
+            "channel": self.channel,
+            "listening": self._thread is not None and self._thread.is_alive(),
+            "sent": self.sent,
+            "received": self.received,
+            "errors": self.errors,
+            "notify_dropped": self.dropped,
+            "notify_pending": self._outbox.qsize(),
+        }
+
+
+def make_transport(kind: str) -> Transport:
+    if kind == "postgres":
+        from .db import engine
+        return PostgresTransport(engine, settings.live_channel, queue_size=settings.live_publish_queue_size)
+    if kind == "memory":
+        from .live import broker
+        return MemoryTransport(broker.publish)
+    raise ValueError(f"Unknown live transport: {kind}")
+
+
+transport = make_transport(settings.live_transport)
@@ -2,8 +2,12 @@
 from .ingest import router as ingest
 from .query import router as query
 from .alerts import router as alerts
+from .rules import router as rules
 from .models_router import router as models_router
 from .auth import router as auth
 from .devices import router as devices
+from .export import router as export
+from .stream import router as stream
+from .live_ws import router as live_ws
 
-__all__ = ["ingest", "query", "alerts", "models_router", "auth", "devices"]
+__all__ = ["ingest", "query", "alerts", "rules", "models_router", "auth", "devices", "export", "stream", "live_ws"]
@@ -1,44 +1,89 @@
-# app/routers/alerts.py
-from fastapi import APIRouter, Depends
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
-from ..db import get_db
+from typing import List, Optional
+from ..deps import get_read_db
 from .. import models, schemas
 from ..auth import get_current_active_user
+from ..alert_labels import labels
+from ..alert_summary import summarize
+from ..device_access import device_access
+from ..settings import settings
 
 router = APIRouter(tags=["alerts"])
 
-# Mapeo bitmask 
-ALERT_LABELS = {
-    1: "Alta temp aire",
-    2: "Baja temp aire",
-    4: "Alta humedad",
-    8: "Baja humedad",
-    16: "Bajo peso",
-}
-
 @router.get("/alerts", response_model=List[schemas.AlertRow])
 def alerts(
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(default=100, ge=1, le=1000),
+    device_id: Optional[str] = None,
+    since_minutes: Optional[int] = Query(default=None, ge=1),
+    active: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
+    """
+    Episodios de alerta (uno por bit encendido o regla activada) de los
+    dispositivos del usuario, del mas reciente al mas antiguo. Los escriben
+    los motores de la ingesta (``app/alert_engine.py`` y ``app/rules.py``).
+    """
+    E = models.AlertEvent
     q = (
-        db.query(models.Measurement)
-        .filter(models.Measurement.alerts != None)
-        .order_by(models.Measurement.ts.desc())
-        .limit(limit)
+        db.query(E, models.AlertRule.name)
+        .outerjoin(models.AlertRule, models.AlertRule.id == E.rule_id)
+        .join(models.Device, models.Device.device_id == E.device_id)
+        .filter(models.Device.user_id == current_user.id)
     )
-    result = []
-    for m in q.all():
-        mask = m.alerts or 0
-        labels = [label for bit, label in ALERT_LABELS.items() if mask & bit]
-        result.append(
-            schemas.AlertRow(
-                ts=m.ts,
-                device_id=m.device_id,
-                mask=mask,
-                labels=labels,
-            )
+    if device_id:
+        q = q.filter(E.device_id == device_id)
+    if since_minutes is not None:
+        start = datetime.now(timezone.utc) - timedelta(minutes=since_minutes)
+        q = q.filter(E.started_at >= start)
+    if active is not None:
+        q = q.filter(E.ended_at.is_(None) if active else E.ended_at.isnot(None))
+    q = q.order_by(E.started_at.desc()).limit(limit)
+
+    return [
+        schemas.AlertRow(
+            ts=e.started_at,
+            device_id=e.device_id,
+            mask=e.bit,
+            labels=[rule_name] if e.rule_id else labels(e.bit),
+            rule_id=e.rule_id,
+            ended_at=e.ended_at,
+            duration_s=e.duration_s,
+            active=e.ended_at is None,
+            samples=e.samples,
+            max_temp_aire_c=e.max_temp_aire_c,
+            min_temp_aire_c=e.min_temp_aire_c,
+            max_temp_piel_c=e.max_temp_piel_c,
+            max_humedad=e.max_humedad,
+            min_humedad=e.min_humedad,
+            min_peso_g=e.min_peso_g,
+        )
+        for e, rule_name in q.all()
+    ]
+
+
+@router.get("/alerts/summary", response_model=List[schemas.AlertSummaryBucket])
+def alerts_summary(
+    device_id: Optional[str] = None,
+    since_minutes: int = Query(default=24 * 60, ge=1, le=60 * 24 * 31),
+    bucket_minutes: int = Query(default=60, ge=1, le=24 * 60),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Muestras, episodios y minutos por bit de alerta y por intervalo de
+    ``bucket_minutes`` para los dispositivos del usuario, agregados en SQL
+    sobre ``measurements.alerts`` (ver ``app/alert_summary.py``).
+    """
+    owned = device_access.devices(db, current_user.id)
+    if device_id and device_id not in owned:
+        raise HTTPException(
+            status_code=403,
+            detail="Device not linked to your account or does not exist"
         )
-    return result
+    devices = [device_id] if device_id else sorted(owned)
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(minutes=since_minutes)
+    return summarize(db, devices, start, end, bucket_minutes * 60, settings.alerts_summary_max_gap_s)
@@ -1,8 +1,10 @@
 # app/routers/auth.py
 from __future__ import annotations
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..db import get_db
 from .. import models, schemas
@@ -14,6 +16,9 @@ from ..auth import (
     get_current_admin_user,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from ..device_access import device_access
+from ..hashing import hash_pool
+from ..principals import principal_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -72,6 +77,9 @@ def update_users_me(
     db: Session = Depends(get_db),
 ):
     """Permite al usuario actualizar su propia cuenta"""
+    # current_user viene del cache de principales: cargar la fila para modificarla
+    current_user = db.get(models.User, current_user.id)
+    old_username = current_user.username
     if user_update.username and user_update.username != current_user.username:
         existing = db.query(models.User).filter(models.User.username == user_update.username).first()
         if existing:
@@ -89,6 +97,7 @@ def update_users_me(
     
     db.commit()
     db.refresh(current_user)
+    principal_cache.invalidate(old_username, current_user.username)
     return current_user
 
 @router.post("/create-first-admin", response_model=schemas.UserOut)
@@ -149,13 +158,46 @@ def create_admin(
     db.refresh(db_user)
     return db_user
 
+def _like_prefix(prefix: str) -> str:
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
 @router.get("/users", response_model=list[schemas.UserOut])
 def list_users(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=500),
+    after_id: Optional[int] = Query(default=None, ge=0),
+    is_active: Optional[bool] = None,
+    is_admin: Optional[bool] = None,
+    username_prefix: Optional[str] = Query(default=None, min_length=1, max_length=64),
     current_user: models.User = Depends(get_current_admin_user),
     db: Session = Depends(get_db),
 ):
-    users = db.query(models.User).all()
-    return users
+    """
+    Usuarios por ``id`` ascendente con paginacion keyset: la pagina
+    siguiente se pide con ``after_id`` = cabecera ``X-Next-Cursor``.
+    ``X-Has-More`` indica si quedan filas sin contar la tabla (se lee una
+    fila de mas). Solo se leen las columnas de ``UserOut``; el filtro por
+    prefijo usa ``ix_users_username_pattern``.
+    """
+    U = models.User
+    stmt = select(U.id, U.username, U.email, U.is_admin, U.is_active, U.created_at)
+    if after_id is not None:
+        stmt = stmt.where(U.id > after_id)
+    if is_active is not None:
+        stmt = stmt.where(U.is_active == is_active)
+    if is_admin is not None:
+        stmt = stmt.where(U.is_admin == is_admin)
+    if username_prefix:
+        stmt = stmt.where(U.username.like(_like_prefix(username_prefix), escape="\\"))
+    rows = db.execute(stmt.order_by(U.id).limit(limit + 1)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    response.headers["X-Has-More"] = "true" if has_more else "false"
+    if has_more:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [row._asdict() for row in rows]
 
 @router.put("/users/{user_id}", response_model=schemas.UserOut)
 def update_user(
@@ -167,6 +209,7 @@ def update_user(
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+    old_username = db_user.username
     
     if user_update.username and user_update.username != db_user.username:
         existing = db.query(models.User).filter(models.User.username == user_update.username).first()
@@ -185,6 +228,7 @@ def update_user(
     
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(old_username, db_user.username)
     return db_user
 
 @router.patch("/users/{user_id}/toggle-admin", response_model=schemas.UserOut)
@@ -202,6 +246,7 @@ def toggle_admin(
     db_user.is_admin = not db_user.is_admin
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(db_user.username)
     return db_user
 
 @router.patch("/users/{user_id}/toggle-active", response_model=schemas.UserOut)
@@ -219,6 +264,7 @@ def toggle_active(
     db_user.is_active = not db_user.is_active
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate(db_user.username)
     return db_user
 
 @router.delete("/users/{user_id}")
@@ -233,7 +279,26 @@ def delete_user(
     if db_user.id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
+    username = db_user.username
     db.delete(db_user)
     db.commit()
+    principal_cache.invalidate(username)
+    device_access.invalidate(user_id)  # sus dispositivos se borran en cascada
     return {"ok": True}
 
+
+@router.get("/cache/stats")
+def principal_cache_stats(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Metricas del cache de principales (aciertos, fallos, invalidaciones)."""
+    return principal_cache.stats()
+
+
+@router.get("/hash/stats")
+def hash_pool_stats(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Estado del pool de hash de contrasenas (en curso, completadas, rechazadas con 503)."""
+    return hash_pool.stats()
+
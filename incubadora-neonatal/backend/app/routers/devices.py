@@ -5,15 +5,19 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from ..db import get_db
+from ..db import get_db, session_router
+from ..deps import get_read_db
 from .. import models, schemas
 from ..auth import get_current_active_user
+from ..api_keys import api_keys, generate_key, digest
+from ..device_access import device_access
+from ..rules import rule_engine
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
 @router.get("/available", response_model=List[schemas.DeviceRow])
 def list_available_devices(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ) -> List[schemas.DeviceRow]:
     """
@@ -116,6 +120,32 @@ def link_device(
     
     db.commit()
     db.refresh(device)
+    session_router.mark_write(current_user.id)
+    device_access.set_device(current_user.id, device_id, device.name)
+    return device
+
+@router.patch("/{device_id}", response_model=schemas.DeviceOut)
+def update_device(
+    device_id: str,
+    payload: schemas.DeviceUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Actualiza nombre y/o sala (``ward``) de un dispositivo vinculado al usuario."""
+    device = db.query(models.Device).filter(
+        models.Device.device_id == device_id,
+        models.Device.user_id == current_user.id,
+    ).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found or not linked to you")
+    for field, value in payload.model_dump(exclude_unset=True).items():
+        setattr(device, field, value)
+    device.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(device)
+    session_router.mark_write(current_user.id)
+    device_access.set_device(current_user.id, device_id, device.name)
+    rule_engine.invalidate()  # las reglas por sala dependen de devices.ward
     return device
 
 @router.post("/{device_id}/unlink", response_model=schemas.DeviceOut)
@@ -144,11 +174,56 @@ def unlink_device(
     device.updated_at = datetime.now(timezone.utc)
     db.commit()
     db.refresh(device)
+    session_router.mark_write(current_user.id)
+    device_access.set_device(current_user.id, device_id, linked=False)
+    return device
+
+def _owned_device(db: Session, device_id: str, user: models.User) -> models.Device:
+    q = db.query(models.Device).filter(models.Device.device_id == device_id)
+    if not user.is_admin:
+        q = q.filter(models.Device.user_id == user.id)
+    device = q.first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found or not linked to your account")
+    return device
+
+@router.post("/{device_id}/api-key", response_model=schemas.DeviceApiKey)
+def rotate_api_key(
+    device_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Genera (o rota) la clave de API con la que el dispositivo envia a
+    ``/ingest``. La clave anterior deja de valer de inmediato; la nueva solo
+    se muestra en esta respuesta.
+    """
+    device = _owned_device(db, device_id, current_user)
+    key = generate_key()
+    device.api_key_hash = digest(key)
+    device.api_key_rotated_at = datetime.now(timezone.utc)
+    db.commit()
+    api_keys.invalidate()
+    return schemas.DeviceApiKey(device_id=device.device_id, api_key=key, rotated_at=device.api_key_rotated_at)
+
+@router.delete("/{device_id}/api-key", response_model=schemas.DeviceOut)
+def revoke_api_key(
+    device_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Revoca la clave de API del dispositivo."""
+    device = _owned_device(db, device_id, current_user)
+    device.api_key_hash = None
+    device.api_key_rotated_at = None
+    db.commit()
+    db.refresh(device)
+    api_keys.invalidate()
     return device
 
 @router.get("/my-devices", response_model=List[schemas.DeviceOut])
 def list_my_devices(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ) -> List[schemas.DeviceOut]:
     """
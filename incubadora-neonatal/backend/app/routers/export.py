@@ -0,0 +1,61 @@
+# app/routers/export.py
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from ..deps import get_read_db
+from .. import models
+from ..auth import get_current_admin_user
+from ..export import EXTENSIONS, MEDIA_TYPES, max_id, stream_export
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+@router.get("/measurements")
+def export_measurements(
+    format: Literal["parquet", "arrow", "csv"] = Query(default="parquet"),
+    device_id: Optional[str] = None,
+    since_id: Optional[int] = Query(default=None, ge=0),
+    compression: Literal["zstd", "snappy", "lz4", "none"] = Query(default="zstd"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """
+    Descarga las mediciones como Parquet, Arrow IPC (stream) o CSV, generadas
+    por bloques mientras se envian. Solo administradores.
+
+    ``since_id`` permite exportaciones incrementales: el header
+    ``X-Export-Watermark`` trae el ultimo ``id`` incluido, que se pasa como
+    ``since_id`` en la siguiente descarga.
+    """
+    if format != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="pyarrow is not installed on the server")
+    if format == "parquet" and compression == "lz4":
+        compression = "lz4_raw"
+
+    until = max_id(db, device_id)
+    watermark = until if until is not None else (since_id or 0)
+
+    def body():
+        try:
+            yield from stream_export(
+                db, format, since_id=since_id, until_id=watermark, device_id=device_id,
+                compression=compression,
+            )
+        finally:
+            db.close()
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    filename = f"measurements-{device_id or 'all'}-{stamp}.{EXTENSIONS[format]}"
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Watermark": str(watermark),
+        },
+    )
@@ -10,24 +10,33 @@ such as 'TEMP Air: 26.3 C | Skin: 102.6 C' and map them onto the
 appropriate measurement fields.  Any fields not present in the input
 are left 'None' in the database row.
 
-Previous iterations of this project attempted to broadcast new
-measurements to ServerSent Events (SSE) subscribers for realtime
-updates.  The current code base does not include an SSE manager,
-so this router simply returns after persisting a measurement.  If
-streaming functionality is added again, a broadcast call can be added
-just before returning.
+Devices authenticate with a per-device ``X-API-Key`` header (see
+``app/api_keys.py``); the key determines ``device_id``.  Requests without
+a key are accepted unless ``INGEST_REQUIRE_API_KEY`` is set.
+
+After persisting a measurement the router runs the shared post-insert
+pipeline (``app/pipeline.py``), which invalidates the query cache for
+the device, opens or closes alert episodes in ``alert_events`` when the
+``alerts`` bitmask changes, queues the row for the online anomaly scorer
+(``app/inference.py``; the response never waits for the model), and
+publishes the measurement to the live
+broker that feeds the ServerSent Events (SSE) stream in ``routers/stream.py``.
 """
 from __future__ import annotations
 
+import asyncio
 import re
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Body, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
+from ..api_keys import api_keys
 from ..db import get_db
+from ..deps import verify_api_key
 from ..models import Measurement
+from ..pipeline import after_insert
 from ..schemas import IngestPayload, MeasurementOut
 
 router = APIRouter(tags=["ingest"])
@@ -161,10 +170,43 @@ def _parse_text_payload(text: str) -> Dict[str, Any]:
     return out
 
 
+def _store(db: Session, data: Dict[str, Any], key_device: Optional[str]) -> int:
+    """Resuelve el dispositivo, valida, guarda la medicion y ejecuta ``after_insert``."""
+    # Con X-API-Key el dispositivo sale de la clave; sin clave (si se permite)
+    # se conserva el comportamiento del firmware antiguo, salvo para los
+    # dispositivos que ya tienen clave (rotada o no): sus muestras la exigen
+    if key_device is not None:
+        if data.get("device_id") and data["device_id"] != key_device:
+            raise HTTPException(status_code=403, detail="device_id does not match API key")
+        data["device_id"] = key_device
+    else:
+        if not data.get("device_id"):
+            data["device_id"] = "esp32"
+        if api_keys.has_key(str(data["device_id"])):
+            raise HTTPException(status_code=401, detail="API key required for this device")
+    if not data.get("ts"):
+        data["ts"] = datetime.now(timezone.utc)
+
+    # Validar con Pydantic y persistir
+    try:
+        m_in = IngestPayload(**data)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    row = Measurement(**m_in.model_dump())
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    after_insert(row, db)
+
+    return row.id
+
+
 @router.post("/ingest")
 async def ingest(
     request: Request,
     db: Session = Depends(get_db),
+    key_device: Optional[str] = Depends(verify_api_key),
 ) -> Dict[str, Any]:
     ctype = request.headers.get("content-type", "").lower()
 
@@ -195,22 +237,8 @@ async def ingest(
         # cualquier otro content-type
         raise HTTPException(status_code=415, detail="Unsupported payload type")
 
-    # Defaults
-    if not data.get("device_id"):
-        data["device_id"] = "esp32"
-    if not data.get("ts"):
-        data["ts"] = datetime.now(timezone.utc)
-
-    # Validar con Pydantic y persistir
-    try:
-        m_in = IngestPayload(**data)
-    except Exception as e:
-        raise HTTPException(status_code=422, detail=str(e))
-
-    row = Measurement(**m_in.model_dump())
-    db.add(row)
-    db.commit()
-    db.refresh(row)
-
-    return {"ok": True, "id": row.id}
+    # El guardado y el pipeline posterior hacen E/S sincrona de BD (episodios,
+    # recarga de reglas, historial de ventanas): fuera del bucle de eventos
+    row_id = await asyncio.to_thread(_store, db, data, key_device)
+    return {"ok": True, "id": row_id}
 
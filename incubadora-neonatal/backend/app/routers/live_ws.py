@@ -0,0 +1,219 @@
+# app/routers/live_ws.py
+"""
+Canal WebSocket de telemetria en vivo con tramas delta.
+
+Protocolo (``GET /ws?token=<jwt>&encoding=json|msgpack``):
+
+- El cliente envia operaciones como JSON (texto) o MessagePack (binario):
+  ``{"op": "subscribe", "devices": [...], "max_rate": 2}``,
+  ``{"op": "unsubscribe", "devices": [...]}`` y ``{"op": "ping", "t": ...}``.
+- El servidor responde ``{"op": "subscribed", "devices": [...]}``,
+  ``{"op": "pong", "t": ...}`` y envia mediciones como
+  ``{"op": "m", "d": "<device_id>", "id": ..., "ts_ms": ..., <campos>}``.
+  La primera trama de cada dispositivo lleva todos los campos; las
+  siguientes solo los que cambiaron respecto a lo ultimo enviado en esa
+  conexion. El cliente reconstruye el estado fusionando las tramas.
+
+Cada conexion tiene un tope de tramas por segundo (``max_rate``, acotado
+por ``WS_MAX_RATE``): si llegan muestras mas rapido se conserva solo la
+ultima por dispositivo hasta el siguiente envio. Tambien se limita la tasa
+de mensajes del cliente (``WS_CLIENT_MSG_RATE``).
+
+La vinculacion se vuelve a comprobar con ``device_access`` al suscribirse y,
+como mucho cada ``WS_ACCESS_RECHECK_S`` segundos, al entregar mediciones:
+los dispositivos desvinculados o reasignados se quitan de la suscripcion y
+se avisa con ``{"op": "subscribed", "devices": [...], "revoked": [...]}``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from sqlalchemy.orm import Session
+
+from ..auth import user_from_token
+from ..device_access import device_access
+from ..db import get_db
+from ..encoding import dumps
+from ..live import EVENT_FIELDS, broker
+from ..settings import settings
+
+try:  # pragma: no cover - depende del entorno
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+router = APIRouter(tags=["stream"])
+
+# Campos que pueden ir en una trama delta (device_id viaja como "d")
+DELTA_FIELDS = tuple(f for f in EVENT_FIELDS if f != "device_id")
+
+
+def delta_frame(event: Dict[str, Any], last: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Trama con solo los campos que cambiaron respecto a ``last`` (que se
+    actualiza in situ). ``id`` y ``ts_ms`` siempre se incluyen.
+    """
+    frame: Dict[str, Any] = {"op": "m", "d": event["device_id"], "id": event["id"], "ts_ms": event["ts_ms"]}
+    for name in DELTA_FIELDS:
+        value = event.get(name)
+        if name not in last or last[name] != value:
+            frame[name] = value
+            last[name] = value
+    return frame
+
+
+class _Connection:
+    def __init__(self, ws: WebSocket, db: Session, user_id: int, owned: Set[str], binary: bool):
+        self.ws = ws
+        self.db = db
+        self.user_id = user_id
+        self.owned = owned
+        self.binary = binary
+        self.sub = broker.subscribe((), max_rate=settings.ws_max_rate)
+        self.last_sent: Dict[str, Dict[str, Any]] = {}
+        self._check_lock = asyncio.Lock()
+        self._next_check = time.monotonic() + settings.ws_access_recheck_s
+
+    async def send(self, msg: Dict[str, Any]) -> None:
+        if self.binary:
+            await self.ws.send_bytes(msgpack.packb(msg, use_bin_type=True))
+        else:
+            await self.ws.send_text(dumps(msg).decode())
+
+    def decode(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            if message.get("bytes") is not None:
+                if msgpack is None:
+                    return None
+                data = msgpack.unpackb(message["bytes"], raw=False)
+            else:
+                data = json.loads(message.get("text") or "")
+        except Exception:
+            return None
+        return data if isinstance(data, dict) else None
+
+    async def subscribed(self, **extra: Any) -> None:
+        await self.send({"op": "subscribed", "devices": sorted(self.sub.device_ids), "max_rate": self.sub.max_rate, **extra})
+
+    def drop(self, devices: Set[str]) -> None:
+        broker.update(self.sub, self.sub.device_ids - devices)
+        self.sub.discard(devices)
+        for dev in devices:
+            self.last_sent.pop(dev, None)
+
+    async def recheck(self) -> None:
+        """
+        Recarga los dispositivos del usuario (con la cache de ``device_access``
+        basta leer el contador de version si nada cambio) y deja de enviar
+        los que ya no le pertenecen.
+        """
+        async with self._check_lock:  # reader y writer comparten la sesion
+            self._next_check = time.monotonic() + settings.ws_access_recheck_s
+            self.owned = await asyncio.to_thread(_owned, self.db, self.user_id)
+        revoked = self.sub.device_ids - self.owned
+        if revoked:
+            self.drop(revoked)
+            await self.subscribed(revoked=sorted(revoked))
+
+    async def handle(self, msg: Dict[str, Any]) -> None:
+        op = msg.get("op")
+        if op == "ping":
+            await self.send({"op": "pong", "t": msg.get("t")})
+        elif op == "subscribe":
+            await self.recheck()
+            wanted = msg.get("devices")
+            devices = self.owned if wanted in (None, "*") else self.owned & set(map(str, wanted or ()))
+            rate = msg.get("max_rate")
+            if isinstance(rate, (int, float)) and rate > 0:
+                self.sub.max_rate = min(float(rate), settings.ws_max_rate)
+            broker.update(self.sub, self.sub.device_ids | devices)
+            await self.subscribed()
+        elif op == "unsubscribe":
+            self.drop(set(map(str, msg.get("devices") or ())))
+            await self.subscribed()
+        else:
+            await self.send({"op": "error", "detail": f"unknown op: {op}"})
+
+    async def reader(self) -> None:
+        window_start = time.monotonic()
+        count = 0
+        while True:
+            message = await self.ws.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            now = time.monotonic()
+            if now - window_start >= 1.0:
+                window_start, count = now, 0
+            count += 1
+            if count > settings.ws_client_msg_rate:
+                await self.ws.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            msg = self.decode(message)
+            if msg is None:
+                await self.send({"op": "error", "detail": "invalid message"})
+                continue
+            await self.handle(msg)
+
+    async def writer(self) -> None:
+        # Conflacion: la suscripcion entrega el ultimo valor por dispositivo a max_rate
+        while True:
+            batch = await self.sub.get_batch()
+            if time.monotonic() >= self._next_check:
+                await self.recheck()
+            for event in batch:
+                dev = event["device_id"]
+                if dev in self.sub.device_ids:
+                    await self.send(delta_frame(event, self.last_sent.setdefault(dev, {})))
+
+
+def _authorize(db: Session, token: Optional[str]) -> Tuple[int, Set[str]]:
+    """Usuario del token y sus dispositivos (consultas bloqueantes: con ``to_thread``)."""
+    try:
+        user = user_from_token(db, token)
+        if not user.is_active:
+            raise ValueError("inactive")
+        return user.id, set(device_access.devices(db, user.id))
+    finally:
+        db.close()
+
+
+def _owned(db: Session, user_id: int) -> Set[str]:
+    """Dispositivos de ``user_id``; cierra la sesion para no retener la conexion."""
+    try:
+        return set(device_access.devices(db, user_id))
+    finally:
+        db.close()
+
+
+@router.websocket("/ws")
+async def live_ws(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    encoding: str = "json",
+    db: Session = Depends(get_db),
+):
+    try:
+        user_id, owned = await asyncio.to_thread(_authorize, db, token)
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    binary = encoding == "msgpack"
+    if binary and msgpack is None:
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+
+    await websocket.accept()
+    conn = _Connection(websocket, db, user_id, owned, binary)
+    tasks = [asyncio.create_task(conn.reader()), asyncio.create_task(conn.writer())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        broker.unsubscribe(conn.sub)
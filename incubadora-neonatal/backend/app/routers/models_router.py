@@ -1,48 +1,78 @@
 # app/routers/models_router.py
 from __future__ import annotations
-from fastapi import APIRouter, BackgroundTasks, Depends
-from datetime import datetime
-from ..schemas import ModelStatus
+from datetime import datetime, timezone
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from ..schemas import InferenceStats, ModelStatus, ModelWorker
 from ..settings import settings
 from ..auth import get_current_admin_user
+from ..deps import get_read_db
+from ..model_store import model_store
+from ..training import TrainingInProgress, trainer
+from ..inference import scorer
 from .. import models
 
 router = APIRouter(prefix="/models", tags=["models"])
 
-# Estado inicial del modelo
-_STATE = ModelStatus(
-    algo=settings.model_name,
-    version=settings.model_ver,
-    training=False,
-    updated_at=None,
-)
+
+def _dt(epoch: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc) if epoch else None
+
+
+def _inference() -> InferenceStats:
+    stats = scorer.stats()
+    stats["model_loaded_at"] = _dt(stats["model_loaded_at"])
+    return InferenceStats(pid=os.getpid(), **stats)
+
+
+def _workers() -> List[ModelWorker]:
+    return [
+        ModelWorker(**dict(w, loaded_at=_dt(w.get("loaded_at")), updated_at=_dt(w.get("updated_at"))))
+        for w in model_store.workers()
+    ]
+
+
+def _status() -> ModelStatus:
+    # Estado compartido en disco: lo escribe el proceso de entrenamiento
+    st = model_store.read_status()
+    version = model_store.current()
+    meta = model_store.load_meta(version) if version else {}
+    return ModelStatus(
+        algo=meta.get("algo", settings.model_name),
+        version=version or settings.model_ver,
+        training=bool(st.get("training")) and trainer.busy,
+        updated_at=_dt(st.get("updated_at") or meta.get("trained_at")),
+        training_version=st.get("training_version"),
+        stage=st.get("stage"),
+        progress=st.get("progress"),
+        started_at=_dt(st.get("started_at")),
+        duration_s=st.get("duration_s", meta.get("duration_s")),
+        samples=st.get("samples") or meta.get("samples") or {},
+        metrics=st.get("metrics") or meta.get("metrics") or {},
+        error=st.get("error"),
+        inference=_inference(),
+        workers=_workers(),
+    )
+
 
 @router.get("/status", response_model=ModelStatus)
 def get_status(
     current_user: models.User = Depends(get_current_admin_user)
 ) -> ModelStatus:
-    return _STATE
+    return _status()
+
 
-@router.post("/retrain", response_model=ModelStatus)
+@router.post("/retrain", response_model=ModelStatus, status_code=202)
 def retrain(
-    background: BackgroundTasks,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_admin_user)
 ) -> ModelStatus:
-    global _STATE
-
-    # Simula entrenamiento en background
-    def _job():
-        import time
-        time.sleep(2)
-        _STATE.training = False
-        _STATE.updated_at = datetime.utcnow()
-
-    _STATE.training = True
-    background.add_task(_job)
-
-    # Aumenta el �ltimo n�mero de versi�n
-    parts = _STATE.version.split(".")
-    if parts and parts[-1].isdigit():
-        parts[-1] = str(int(parts[-1]) + 1)
-        _STATE.version = ".".join(parts)
-    return _STATE
+    # El proceso de entrenamiento abre su propia conexion (replica si hay)
+    db_url = db.get_bind().url.render_as_string(hide_password=False)
+    try:
+        trainer.start(db_url)
+    except TrainingInProgress:
+        raise HTTPException(status_code=409, detail="Ya hay un entrenamiento en curso")
+    return _status()
@@ -1,19 +1,75 @@
 # app/routers/query.py
 from __future__ import annotations
-from typing import List, Optional
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Literal, Optional, Tuple, Union
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from ..db import get_db
+from sqlalchemy import func, or_, select
+from ..deps import get_read_db
+from ..db import pool_stats
 from .. import models, schemas
+from ..cache import query_cache
+from ..device_access import device_access
+from ..conditional import is_not_modified, make_etag, not_modified_response, set_validators
+from ..encoding import columnar, dumps, loads
+from ..settings import settings
+from ..stats import STATS_VARIABLES, compute_stats
+from ..feature_store import feature_store
+from ..ml_features import FEATURE_VARIABLES
 from ..auth import get_current_active_user, get_current_admin_user
 
 router = APIRouter(prefix="/query", tags=["query"])
+logger = logging.getLogger(__name__)
+
+# Columnas de SeriesPoint en el orden del formato columnar (ts siempre primero)
+SERIES_COLUMNS = ("ts", "temp_aire_c", "temp_piel_c", "humedad", "peso_g")
+
+_DEVICE_ROWS = TypeAdapter(List[schemas.DeviceRow])
+_SERIES_ROWS = TypeAdapter(List[schemas.SeriesPoint])
+_GROUPED_SERIES = TypeAdapter(Dict[str, List[schemas.SeriesPoint]])
+
+
+def _json(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+def _newest(
+    db: Session, device_ids: List[str], since_minutes: Optional[int] = None
+) -> Tuple[Optional[int], Optional[datetime], Optional[datetime]]:
+    """
+    Validador barato para ETag/Last-Modified: (max id, max ts, min ts) de las
+    mediciones de los dispositivos (dentro de la ventana si la hay). Solo
+    agrega sobre indices y tambien pasa por el cache, asi que mientras no
+    llegue una muestra nueva no toca la base de datos.
+    """
+    def load() -> bytes:
+        if not device_ids:
+            return dumps([None, None, None])
+        q = db.query(
+            func.max(models.Measurement.id),
+            func.max(models.Measurement.ts),
+            func.min(models.Measurement.ts),
+        ).filter(models.Measurement.device_id.in_(device_ids))
+        if since_minutes:
+            cutoff = datetime.utcnow() - timedelta(minutes=since_minutes)
+            q = q.filter(models.Measurement.ts >= cutoff)
+        return dumps(list(q.one()))
+
+    key = query_cache.key("newest", device_ids, since_minutes)
+    max_id, max_ts, min_ts = loads(query_cache.get_or_set(key, load))
+    return max_id, _parse_ts(max_ts), _parse_ts(min_ts)
+
+
+def _parse_ts(value) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
 
 @router.get("/devices", response_model=List[schemas.DeviceRow])
 def list_devices(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ) -> List[schemas.DeviceRow]:
     """
@@ -21,6 +77,17 @@ def list_devices(
     Incluye un objeto 'metrics' con los valores mas recientes o vacio
     si aun no hay mediciones.
     """
+    # Dispositivos vinculados al usuario actual ({device_id: name}, cacheado)
+    user_devices = device_access.devices(db, current_user.id)
+    # Los nombres forman parte de la clave: renombrar un dispositivo no pasa por la ingesta
+    names = ",".join(f"{k}={name or ''}" for k, name in sorted(user_devices.items()))
+    key = query_cache.key("devices", user_devices.keys(), names)
+    return _json(query_cache.get_or_set(
+        key, lambda: _DEVICE_ROWS.dump_json(_device_rows(db, user_devices))
+    ))
+
+
+def _device_rows(db: Session, user_devices: dict) -> List[schemas.DeviceRow]:
     # Obtener todos los device_ids de las mediciones
     device_entries = (
         db.query(
@@ -32,18 +99,10 @@ def list_devices(
         .all()
     )
 
-    # Obtener los dispositivos vinculados al usuario actual
-    user_devices = {
-        d.device_id: d for d in db.query(models.Device)
-        .filter(models.Device.user_id == current_user.id)
-        .all()
-    }
-
     result: List[schemas.DeviceRow] = []
     for entry in device_entries:
         # Solo mostrar dispositivos vinculados al usuario actual
-        device_record = user_devices.get(entry.id)
-        if not device_record:
+        if entry.id not in user_devices:
             continue  # Saltar dispositivos no vinculados al usuario
 
         # Última medición para rellenar metrics
@@ -72,7 +131,7 @@ def list_devices(
                 id=entry.id,
                 last_seen=last_seen_iso,
                 is_linked=True,  # Todos los dispositivos aquí están vinculados
-                name=device_record.name,
+                name=user_devices[entry.id],
                 metrics=metrics,
             )
         )
@@ -81,22 +140,29 @@ def list_devices(
 
 @router.get("/latest", response_model=schemas.MeasurementOut)
 def latest(
+    request: Request,
     device_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
     # Verificar que el dispositivo esté vinculado al usuario actual
-    device = db.query(models.Device).filter(
-        models.Device.device_id == device_id,
-        models.Device.user_id == current_user.id
-    ).first()
-    
-    if not device:
+    if not device_access.owns(db, current_user.id, [device_id]):
         raise HTTPException(
             status_code=403,
             detail="Device not linked to your account or does not exist"
         )
     
+    max_id, max_ts, _ = _newest(db, [device_id])
+    etag = make_etag("latest", device_id, max_id, max_ts)
+    if max_id is not None and is_not_modified(request, etag, max_ts):
+        return not_modified_response(etag, max_ts)
+
+    key = query_cache.key("latest", [device_id])
+    response = _json(query_cache.get_or_set(key, lambda: _latest_body(db, device_id)))
+    return set_validators(response, etag, max_ts)
+
+
+def _latest_body(db: Session, device_id: str) -> bytes:
     m = (
         db.query(models.Measurement)
         .filter(models.Measurement.device_id == device_id)
@@ -105,94 +171,286 @@ def latest(
     )
     if not m:
         raise HTTPException(status_code=404, detail="No measurements found")
-    return m
+    return schemas.MeasurementOut.model_validate(m).model_dump_json().encode()
 
-@router.get("/series", response_model=List[schemas.SeriesPoint])
+@router.get("/series", response_model=Union[List[schemas.SeriesPoint], Dict[str, List[schemas.SeriesPoint]]])
 def series(
-    device_id: Optional[str] = None,
+    request: Request,
+    device_id: List[str] = Query(default=[]),
     since_minutes: Optional[int] = None,
     limit: Optional[int] = None,
-    db: Session = Depends(get_db),
+    format: Literal["rows", "columnar"] = Query(default="rows"),
+    ts_format: Literal["iso", "epoch_ms"] = Query(default="iso"),
+    group_by_device: bool = False,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_active_user),
 ):
-    q = db.query(models.Measurement)
-    
-    if device_id:
-        # Verificar que el dispositivo esté vinculado al usuario actual
-        device = db.query(models.Device).filter(
-            models.Device.device_id == device_id,
-            models.Device.user_id == current_user.id
-        ).first()
-        
-        if not device:
+    """
+    Serie temporal de mediciones en orden ascendente.
+
+    ``device_id`` puede repetirse (``?device_id=a&device_id=b``); sin
+    ``device_id`` se usan todos los dispositivos vinculados al usuario. Con
+    mas de un ``device_id`` o con ``group_by_device=true`` la respuesta se
+    agrupa por dispositivo (``{"<device_id>": [...]}``) y ``limit`` se
+    aplica a cada dispositivo; la comprobacion de propiedad sale del cache
+    de dispositivos del usuario y los datos de un unico recorrido por
+    ``ix_measurements_device_ts``.
+
+    Con ``format=columnar`` devuelve ``{"ts": [...], "temp_aire_c": [...], ...}``
+    construido directamente desde tuplas de columnas (sin instanciar objetos
+    ORM ni modelos Pydantic). ``ts_format=epoch_ms`` emite los timestamps
+    como milisegundos epoch, el formato que consume la libreria de graficas.
+    """
+    requested = list(dict.fromkeys(device_id))
+    grouped = group_by_device or len(requested) > 1
+
+    if requested:
+        # Verificar que todos los dispositivos estén vinculados al usuario
+        if not device_access.owns(db, current_user.id, requested):
             raise HTTPException(
                 status_code=403,
                 detail="Device not linked to your account or does not exist"
             )
-        
-        q = q.filter(models.Measurement.device_id == device_id)
+        device_ids = requested
     else:
         # Si no se especifica device_id, solo mostrar mediciones de dispositivos del usuario
-        user_device_ids = [
-            d.device_id for d in db.query(models.Device)
-            .filter(models.Device.user_id == current_user.id)
-            .all()
-        ]
-        
-        # Debug: Log para ver qué device_ids están vinculados
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"User {current_user.id} has linked devices: {user_device_ids}")
-        
-        # Debug: Ver qué device_ids hay en las mediciones recientes (últimas 24 horas)
-        recent_cutoff = datetime.utcnow() - timedelta(hours=24)
-        recent_device_ids = [
-            d[0] for d in db.query(models.Measurement.device_id)
-            .filter(models.Measurement.ts >= recent_cutoff)
-            .distinct()
-            .limit(10)
-            .all()
-        ]
-        logger.info(f"Recent device_ids in measurements (last 24h): {recent_device_ids}")
-        
-        if user_device_ids:
-            q = q.filter(models.Measurement.device_id.in_(user_device_ids))
-            
-            # Debug: Verificar cuántas mediciones hay antes del filtro de tiempo
-            # Clonar la query para contar sin afectar la original
-            count_q = db.query(models.Measurement).filter(
-                models.Measurement.device_id.in_(user_device_ids)
-            )
-            total_before_time = count_q.count()
-            logger.info(f"Total measurements for user devices (before time filter): {total_before_time}")
-        else:
-            # Usuario sin dispositivos vinculados
-            logger.info(f"User {current_user.id} has no linked devices")
-            # Si hay device_ids recientes pero no vinculados, informar
-            if recent_device_ids:
-                logger.warning(f"Found recent device_ids {recent_device_ids} but user has no linked devices")
-            return []
-    
+        device_ids = sorted(device_access.devices(db, current_user.id))
+        if not device_ids:
+            logger.info("User %s has no linked devices", current_user.id)
+
+    # El ETag depende de la muestra mas reciente y de la mas antigua de la ventana;
+    # If-Modified-Since no se evalua porque una ventana deslizante cambia sin
+    # que llegue una muestra nueva.
+    params = (since_minutes, limit, format, ts_format, grouped)
+    max_id, max_ts, min_ts = _newest(db, device_ids, since_minutes)
+    etag = make_etag("series", ",".join(sorted(device_ids)), *params, max_id, max_ts, min_ts)
+    if is_not_modified(request, etag, max_ts, use_modified_since=False):
+        return not_modified_response(etag, max_ts)
+
+    key = query_cache.key("series", device_ids, *params)
+    response = _json(query_cache.get_or_set(
+        key, lambda: _series_body(db, device_ids, *params)
+    ))
+    return set_validators(response, etag, max_ts)
+
+
+def _series_body(
+    db: Session,
+    device_ids: List[str],
+    since_minutes: Optional[int],
+    limit: Optional[int],
+    format: str,
+    ts_format: str,
+    grouped: bool = False,
+) -> bytes:
+    if grouped:
+        return _grouped_series_body(db, device_ids, since_minutes, limit, format, ts_format)
+    if not device_ids:
+        return dumps(columnar([], SERIES_COLUMNS)) if format == "columnar" else b"[]"
+
+    q = db.query(models.Measurement)
+    if len(device_ids) == 1:
+        q = q.filter(models.Measurement.device_id == device_ids[0])
+    else:
+        q = q.filter(models.Measurement.device_id.in_(device_ids))
+
     if since_minutes:
         cutoff = datetime.utcnow() - timedelta(minutes=since_minutes)
         q = q.filter(models.Measurement.ts >= cutoff)
-        
-        # Debug: Verificar cuántas mediciones hay después del filtro de tiempo
-        import logging
-        logger = logging.getLogger(__name__)
-        count_after_time = q.count()
-        logger.info(f"Measurements after time filter (last {since_minutes} minutes): {count_after_time}")
-    
+
     # Ordenar ascendente directamente para evitar reverse() costoso
     q = q.order_by(models.Measurement.ts.asc())
     if limit:
         q = q.limit(limit)
+
+    if format == "columnar":
+        cols = [getattr(models.Measurement, name) for name in SERIES_COLUMNS]
+        rows = q.with_entities(*cols).all()
+        body = columnar(rows, SERIES_COLUMNS, ts_epoch_ms=(ts_format == "epoch_ms"))
+        return dumps(body)
+
     rows = q.all()
-    
-    # Debug: Log final
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"Returning {len(rows)} measurements for user {current_user.id}")
-    
-    # Ya están en orden ascendente, no necesitamos reverse
-    return rows
+    logger.debug("Returning %d measurements for devices %s", len(rows), device_ids)
+    return _SERIES_ROWS.dump_json(_SERIES_ROWS.validate_python(rows, from_attributes=True))
+
+
+def _grouped_series_body(
+    db: Session,
+    device_ids: List[str],
+    since_minutes: Optional[int],
+    limit: Optional[int],
+    format: str,
+    ts_format: str,
+) -> bytes:
+    """
+    Una sola consulta ordenada por (device_id, ts) que recorre el indice
+    compuesto; con ``limit`` se numeran las filas por dispositivo con
+    ROW_NUMBER() para aplicar el limite a cada uno.
+    """
+    M = models.Measurement
+    cols = [M.device_id] + [getattr(M, name) for name in SERIES_COLUMNS]
+    filters = [M.device_id.in_(device_ids)]
+    if since_minutes:
+        filters.append(M.ts >= datetime.utcnow() - timedelta(minutes=since_minutes))
+
+    if limit:
+        rn = func.row_number().over(partition_by=M.device_id, order_by=M.ts.asc()).label("rn")
+        sub = select(*cols, rn).where(*filters).subquery()
+        stmt = (
+            select(*[sub.c[c.key] for c in cols])
+            .where(sub.c.rn <= limit)
+            .order_by(sub.c.device_id, sub.c.ts)
+        )
+    else:
+        stmt = select(*cols).where(*filters).order_by(M.device_id, M.ts)
+
+    epoch = ts_format == "epoch_ms"
+    if format == "columnar":
+        out: Dict[str, object] = {d: columnar([], SERIES_COLUMNS) for d in device_ids}
+    else:
+        out = {d: [] for d in device_ids}
+    for dev, group in groupby(db.execute(stmt), key=itemgetter(0)):
+        rows = [r[1:] for r in group]
+        if format == "columnar":
+            out[dev] = columnar(rows, SERIES_COLUMNS, ts_epoch_ms=epoch)
+        else:
+            out[dev] = [dict(zip(SERIES_COLUMNS, r)) for r in rows]
+
+    if format == "columnar":
+        return dumps(out)
+    return _GROUPED_SERIES.dump_json(_GROUPED_SERIES.validate_python(out))
+
+
+@router.get("/stats", response_model=schemas.DeviceStats)
+def stats(
+    device_id: str,
+    since_minutes: int = Query(default=8 * 60, ge=1, le=60 * 24 * 31),
+    end: Optional[datetime] = None,
+    temp_aire_c_min: Optional[float] = None,
+    temp_aire_c_max: Optional[float] = None,
+    temp_piel_c_min: Optional[float] = None,
+    temp_piel_c_max: Optional[float] = None,
+    humedad_min: Optional[float] = None,
+    humedad_max: Optional[float] = None,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Resumen de un turno para un dispositivo: media, min, max, desviacion,
+    percentiles y tiempo en rango de temperatura de aire, piel y humedad
+    sobre la ventana ``[end - since_minutes, end)`` (``end`` por defecto es
+    ahora). Los rangos por defecto vienen de la configuracion
+    (``STATS_RANGE_*``) y pueden ajustarse por parametro.
+    """
+    if not device_access.owns(db, current_user.id, [device_id]):
+        raise HTTPException(
+            status_code=403,
+            detail="Device not linked to your account or does not exist"
+        )
+
+    overrides = {
+        "temp_aire_c": (temp_aire_c_min, temp_aire_c_max),
+        "temp_piel_c": (temp_piel_c_min, temp_piel_c_max),
+        "humedad": (humedad_min, humedad_max),
+    }
+    ranges = {}
+    for var in STATS_VARIABLES:
+        lo, hi = settings.stats_range(var)
+        o_lo, o_hi = overrides[var]
+        ranges[var] = (lo if o_lo is None else o_lo, hi if o_hi is None else o_hi)
+
+    # Mismo criterio de tiempo que /query/series (UTC naive)
+    if end is None:
+        end_ts = datetime.utcnow()
+    elif end.tzinfo is not None:
+        end_ts = end.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        end_ts = end
+    start_ts = end_ts - timedelta(minutes=since_minutes)
+
+    def load() -> bytes:
+        result = compute_stats(db, device_id, start_ts, end_ts, ranges)
+        out = schemas.DeviceStats(device_id=device_id, start=start_ts, end=end_ts, **result)
+        return out.model_dump_json().encode()
+
+    # Sin "end" explicito la ventana se desliza: el TTL del cache acota la deriva
+    key = query_cache.key(
+        "stats", [device_id], since_minutes, end_ts.isoformat() if end else None, sorted(ranges.items())
+    )
+    return _json(query_cache.get_or_set(key, load))
+
+
+@router.get("/features", response_model=List[schemas.DeviceFeaturesOut])
+def features(
+    device_id: List[str] = Query(default=[]),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Features de ventana movil (5, 15 y 60 min) de cada dispositivo: media,
+    varianza y pendiente por minuto de aire, piel y humedad, tal y como las
+    mantiene ``app/feature_store.py`` en la ingesta. Es la ultima
+    instantanea de ``device_features`` (como mucho ``FEATURE_SNAPSHOT_S``
+    de retraso); no recorre ``measurements``. Sin ``device_id`` se usan
+    todos los dispositivos vinculados al usuario.
+    """
+    requested = list(dict.fromkeys(device_id))
+    if requested:
+        if not device_access.owns(db, current_user.id, requested):
+            raise HTTPException(
+                status_code=403,
+                detail="Device not linked to your account or does not exist"
+            )
+        device_ids = requested
+    else:
+        device_ids = sorted(device_access.devices(db, current_user.id))
+    if not device_ids:
+        return []
+
+    rows = db.execute(
+        select(models.DeviceFeatures)
+        .where(models.DeviceFeatures.device_id.in_(device_ids))
+        .order_by(models.DeviceFeatures.device_id, models.DeviceFeatures.window_s)
+    ).scalars().all()
+    out = []
+    for dev, windows in groupby(rows, key=lambda r: r.device_id):
+        windows = list(windows)
+        newest = windows[-1]  # todas las ventanas se vuelcan en la misma instantanea
+        out.append(schemas.DeviceFeaturesOut(
+            device_id=dev,
+            last_ts=newest.last_ts,
+            last_measurement_id=newest.last_measurement_id,
+            updated_at=newest.updated_at,
+            windows=[
+                schemas.WindowFeatures(
+                    window_min=w.window_s // 60,
+                    samples=w.samples,
+                    variables={
+                        var: schemas.WindowStats(
+                            mean=getattr(w, f"{var}_mean"),
+                            var=getattr(w, f"{var}_var"),
+                            slope=getattr(w, f"{var}_slope"),
+                        )
+                        for var in FEATURE_VARIABLES
+                    },
+                )
+                for w in windows
+            ],
+        ))
+    return out
+
+
+@router.get("/pool/stats")
+def db_pool_stats(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Telemetria de los pools de conexiones del worker que responde, por rol."""
+    return pool_stats()
+
+
+@router.get("/cache/stats")
+def cache_stats(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Metricas del cache de resultados de consulta, del de dispositivos por usuario y del almacen de features."""
+    return {**query_cache.stats(), "device_access": device_access.stats(), "features": feature_store.stats()}
@@ -0,0 +1,94 @@
+# app/routers/rules.py
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..alert_engine import close_episode
+from ..auth import get_current_active_user, get_current_admin_user
+from ..db import get_db
+from ..deps import get_read_db
+from ..device_access import device_access
+from ..rules import rule_engine
+
+router = APIRouter(prefix="/alerts/rules", tags=["alerts"])
+
+
+def _check_scope(db: Session, user: models.User, device_id) -> None:
+    """Los usuarios solo gestionan reglas de sus dispositivos; salas y globales, solo admin."""
+    if user.is_admin:
+        return
+    if not device_id or device_id not in device_access.devices(db, user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions for this rule scope")
+
+
+@router.get("", response_model=List[schemas.AlertRuleOut])
+def list_rules(
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """Reglas que aplican a los dispositivos del usuario (todas para administradores)."""
+    R = models.AlertRule
+    q = db.query(R).filter(R.deleted_at.is_(None))
+    if not current_user.is_admin:
+        devices = list(device_access.devices(db, current_user.id))
+        wards = []
+        if devices:
+            D = models.Device
+            wards = [w for (w,) in db.query(D.ward).filter(D.device_id.in_(devices), D.ward.isnot(None)).distinct()]
+        q = q.filter(or_(
+            R.device_id.in_(devices),
+            R.ward.in_(wards),
+            (R.device_id.is_(None) & R.ward.is_(None)),
+        ))
+    return q.order_by(R.id).all()
+
+
+@router.post("", response_model=schemas.AlertRuleOut, status_code=status.HTTP_201_CREATED)
+def create_rule(
+    payload: schemas.AlertRuleIn,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    _check_scope(db, current_user, payload.device_id)
+    rule = models.AlertRule(**payload.model_dump(), created_by=current_user.id)
+    db.add(rule)
+    db.commit()
+    db.refresh(rule)
+    rule_engine.invalidate()
+    return rule
+
+
+@router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Desactiva la regla y la marca como borrada. Sus episodios se conservan
+    (historial de alertas con el nombre de la regla); los abiertos se cierran.
+    """
+    R = models.AlertRule
+    rule = db.query(R).filter(R.id == rule_id, R.deleted_at.is_(None)).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    _check_scope(db, current_user, rule.device_id)
+    now = datetime.now(timezone.utc)
+    E = models.AlertEvent
+    for event in db.query(E).filter(E.rule_id == rule_id, E.ended_at.is_(None)).all():
+        close_episode(db, event, now, None)
+    db.query(models.AlertRuleState).filter(models.AlertRuleState.rule_id == rule_id).delete()
+    rule.enabled = False
+    rule.deleted_at = now
+    db.commit()
+    rule_engine.invalidate()
+
+
+@router.get("/stats")
+def rule_stats(current_user: models.User = Depends(get_current_admin_user)):
+    """Reglas cargadas, estados en memoria, temporizadores y transiciones del worker."""
+    return rule_engine.stats()
@@ -1,30 +1,179 @@
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+# app/routers/stream.py
+"""
+Server-Sent Events con las mediciones en tiempo real.
+
+``GET /stream`` se suscribe al broker en proceso (``app/live.py``) y
+reenvia cada medicion nueva de los dispositivos del usuario. Como
+``EventSource`` no permite headers, el token JWT puede ir en el parametro
+``token`` ademas del header ``Authorization``.
+
+Al reconectar, ``EventSource`` envia ``Last-Event-ID`` (el id de la ultima
+medicion recibida). Se reenvia solo el hueco: desde el buffer del broker
+si lo cubre y, si no, desde la base de datos (hasta
+``LIVE_REPLAY_MAX_ROWS``; si el hueco es mayor se envia ``event: reset``
+para que el cliente recargue con ``/query/series``).
+
+Los ids salen de una secuencia y el orden de asignacion no es el de
+commit: con ingestas concurrentes una fila de id menor puede confirmarse
+despues de que el cliente viera una mayor. Por eso el reenvio empieza
+``LIVE_REPLAY_OVERLAP_IDS`` ids antes de ``Last-Event-ID`` (cota de
+inserciones en vuelo a la vez) y la entrega es *al menos una vez* en ese
+solape: el cliente descarta por ``id`` los eventos que ya tenia.
+"""
+from __future__ import annotations
+
 import asyncio
+from typing import List, Optional, Set, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..auth import get_current_admin_user, user_from_token
+from ..device_access import device_access
+from ..db import get_db
+from ..live import broker, measurement_event, sse_frame
+from ..pubsub import transport
+from ..settings import settings
 
+router = APIRouter(tags=["stream"])
 
-router = APIRouter(prefix="/api/incubadora", tags=["stream"])
 
+def _bearer(request: Request) -> Optional[str]:
+    header = request.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
 
-subscribers: set[asyncio.Queue[str]] = set()
+
+def _open(db: Session, token: Optional[str], device_id: List[str]) -> Tuple[Set[str], Optional[int]]:
+    """
+    Usuario, dispositivos del stream y, si el broker aun no lo sabe, el
+    mayor id de medicion. Consultas bloqueantes: se llama con ``to_thread``.
+    """
+    user = user_from_token(db, token)
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    owned = set(device_access.devices(db, user.id))
+    devices = owned & set(device_id) if device_id else owned
+    max_id = None
+    if broker.covered_from is None:
+        max_id = db.query(func.max(models.Measurement.id)).scalar()
+    return devices, max_id
+
+
+def _backlog(db: Session, devices: Set[str], resume: int) -> Tuple[List[dict], bool]:
+    """
+    Eventos a reenviar a un cliente que vio hasta ``resume`` (con el solape
+    ``LIVE_REPLAY_OVERLAP_IDS``) y si hay que pedirle que recargue.
+    Puede consultar la BD: se llama con ``to_thread``.
+    """
+    since = max(resume - settings.live_replay_overlap_ids, 0)
+    backlog, missing = broker.replay(devices, since)
+    if missing:
+        from_db = _db_replay(db, missing, since, settings.live_replay_max_rows)
+        if from_db is None:
+            return [], True
+        backlog = sorted(backlog + from_db, key=lambda e: e["id"])
+    return backlog, False
+
+
+def _db_replay(db: Session, devices, last_id: int, limit: int):
+    """Mediciones con ``id > last_id`` de ``devices``; ``None`` si superan ``limit``."""
+    M = models.Measurement
+    rows = (
+        db.query(M)
+        .filter(M.device_id.in_(devices), M.id > last_id)
+        .order_by(M.id)
+        .limit(limit + 1)
+        .all()
+    )
+    if len(rows) > limit:
+        return None
+    return [measurement_event(r) for r in rows]
 
 
 @router.get("/stream")
-async def stream():
-    q: asyncio.Queue[str] = asyncio.Queue()
-    subscribers.add(q)
+async def stream(
+    request: Request,
+    device_id: List[str] = Query(default=[]),
+    token: Optional[str] = None,
+    last_event_id: Optional[int] = Query(default=None),
+    max_rate: Optional[float] = Query(default=None, gt=0, le=50),
+    last_event_id_header: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+    db: Session = Depends(get_db),
+):
+    """
+    Stream SSE de mediciones. Sin ``device_id`` se suscribe a todos los
+    dispositivos vinculados al usuario; los ``device_id`` que no le
+    pertenecen se ignoran. ``Last-Event-ID`` (header o parametro
+    ``last_event_id``) reanuda el stream reenviando lo perdido (y un
+    solape de ids que el cliente debe descartar si ya los tenia).
+    Con ``max_rate`` (eventos por segundo y dispositivo) se envia solo el
+    ultimo valor de cada dispositivo a esa tasa.
+    """
+    # La sesion es sincrona: sus consultas van a un hilo, no al bucle de eventos
+    devices, max_id = await asyncio.to_thread(_open, db, token or _bearer(request), device_id)
+    if broker.covered_from is None:
+        broker.mark_covered(max_id)
+
+    # Suscribirse antes de leer el hueco: lo que llegue entretanto queda en
+    # cola y se descarta por id si ya se reenvio
+    sub = broker.subscribe(devices, max_rate=max_rate)
 
+    resume = last_event_id
+    if resume is None and last_event_id_header and last_event_id_header.strip().isdigit():
+        resume = int(last_event_id_header.strip())
+    backlog, reset = [], False
+    try:
+        if resume is not None and devices:
+            backlog, reset = await asyncio.to_thread(_backlog, db, devices, resume)
+    except Exception:
+        broker.unsubscribe(sub)
+        raise
+
+    # La sesion no se necesita durante el stream: liberar la conexion ya
+    await asyncio.to_thread(db.close)
+    heartbeat = settings.live_heartbeat_s
 
     async def event_gen():
         try:
-            yield "retry: 5000"
+            yield "retry: 5000\n\n"
+            if reset:
+                yield "event: reset\ndata: {}\n\n"
+            replayed = {e["id"] for e in backlog}
+            for event in backlog:
+                yield sse_frame(event)
             while True:
-                msg = await q.get()
-                yield msg
+                if max_rate:
+                    events = await sub.get_batch(timeout=heartbeat)
+                else:
+                    event = await sub.get(timeout=heartbeat)
+                    events = [event] if event is not None else []
+                if await request.is_disconnected():
+                    break
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                # los ya enviados en el reenvio se omiten
+                frames = "".join(sse_frame(e) for e in events if e["id"] not in replayed)
+                if frames:
+                    yield frames
         except asyncio.CancelledError:
             pass
         finally:
-            subscribers.discard(q)
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-    return StreamingResponse(event_gen(), media_type="text/event-stream")
\ No newline at end of file
+@router.get("/stream/stats")
+def stream_stats(current_user: models.User = Depends(get_current_admin_user)):
+    """Suscriptores activos, eventos publicados y descartados por colas llenas."""
+    return {**broker.stats(), **transport.stats()}
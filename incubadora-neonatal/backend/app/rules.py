@@ -0,0 +1,444 @@
+# app/rules.py
+"""
+Motor de reglas de alerta del servidor (tabla ``alert_rules``).
+
+Complementa el bitmask ``alerts`` del firmware con reglas configurables
+por dispositivo, por sala (``devices.ward``) o globales:
+
+- ``threshold``: umbral con histeresis (se enciende al cruzar el umbral y
+  se apaga al volver ``hysteresis`` unidades atras).
+- ``rate``: variacion por minuto dentro de una ventana deslizante.
+- ``no_data``: sin mediciones durante ``timeout_s`` segundos.
+
+Cada medicion se evalua en O(1) por regla: el estado incremental (activa o
+no, ventana de la regla ``rate``) vive en memoria por (regla, dispositivo)
+y se guarda periodicamente en ``alert_rule_states`` para sobrevivir a un
+reinicio. Las reglas ``no_data`` no consultan la tabla de mediciones
+periodicamente: cada muestra reprograma un plazo en una rueda de
+temporizadores y solo al vencer se confirma (una consulta indexada) que
+ningun otro worker recibio datos entretanto.
+
+Las activaciones abren episodios en ``alert_events`` (con ``rule_id``) y
+las desactivaciones los cierran, igual que los bits del firmware
+(``app/alert_engine.py``).
+
+Con varios workers se usan contadores del backend de ``query_cache``
+(como ``apikeys`` en ``app/api_keys.py``):
+
+- ``rules``: cambios de reglas o de salas; los demas workers recargan en
+  su siguiente medicion.
+- ``rule_ep:{rule_id}:{device_id}``: cada apertura o cierre de un episodio.
+  Con cada medicion se leen los contadores de las reglas del dispositivo
+  y, solo para los que cambiaron, se consulta en ``alert_events`` si el
+  episodio sigue abierto. Asi un episodio ``no_data`` abierto por el
+  temporizador de un worker se cierra aunque la siguiente medicion llegue
+  a otro, sin recargar el resto de estados.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .alert_engine import close_episode, open_episode
+from .cache import CacheBackend
+from .encoding import epoch_ms
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("threshold", "rate", "no_data")
+VARIABLES = ("temp_aire_c", "temp_piel_c", "humedad", "peso_g", "luz", "ntc_c")
+OPS = (">", "<")
+
+Key = Tuple[int, str]  # (rule_id, device_id)
+
+
+class TimerWheel:
+    """
+    Rueda de temporizadores con ranuras de ``tick_s`` segundos.
+    ``schedule``/``cancel`` son O(1); ``advance`` solo recorre las ranuras
+    transcurridas desde la llamada anterior. Los plazos mas lejanos que una
+    vuelta completa se quedan en su ranura hasta que vencen.
+    """
+
+    def __init__(self, tick_s: float = 1.0, slots: int = 512):
+        self.tick_s = tick_s
+        self.slots = slots
+        self._wheel: List[Dict[Hashable, float]] = [dict() for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._cursor: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        self.cancel(key)
+        slot = int(deadline // self.tick_s) % self.slots
+        self._wheel[slot][key] = deadline
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._wheel[slot].pop(key, None)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Claves cuyo plazo vencio hasta ``now`` (se retiran de la rueda)."""
+        now_tick = int(now // self.tick_s)
+        if self._cursor is None:
+            steps = self.slots  # primera pasada: revisar toda la rueda
+        else:
+            # La ranura actual se revisa siempre: pudo recibir plazos tras la ultima pasada
+            steps = min(max(now_tick - self._cursor + 1, 1), self.slots)
+        expired: List[Hashable] = []
+        for tick in range(now_tick - steps + 1, now_tick + 1):
+            bucket = self._wheel[tick % self.slots]
+            if not bucket:
+                continue
+            for key, deadline in list(bucket.items()):
+                if deadline <= now:
+                    del bucket[key]
+                    del self._slot_of[key]
+                    expired.append(key)
+        self._cursor = now_tick
+        return expired
+
+
+class RuleState:
+    __slots__ = ("active", "window")
+
+    def __init__(self, active: bool = False, window: Optional[List[Tuple[float, float]]] = None):
+        self.active = active
+        self.window: Deque[Tuple[float, float]] = deque(window or ())
+
+    def dump(self) -> str:
+        return json.dumps({"window": list(self.window)})
+
+
+def _crossed(op: str, value: float, threshold: float, hysteresis: float, active: bool) -> bool:
+    """Nuevo estado de una comparacion con histeresis."""
+    if op == ">":
+        return value > threshold - hysteresis if active else value > threshold
+    return value < threshold + hysteresis if active else value < threshold
+
+
+class RuleEngine:
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None,
+                 reload_s: float = 30.0, checkpoint_s: float = 60.0, tick_s: float = 1.0,
+                 counters: Optional[CacheBackend] = None):
+        self.session_factory = session_factory
+        self.counters = counters
+        self.reload_s = reload_s
+        self.checkpoint_s = checkpoint_s
+        self.wheel = TimerWheel(tick_s)
+        self._lock = threading.RLock()
+        self._rules: Dict[int, models.AlertRule] = {}
+        self._global: List[int] = []
+        self._by_device: Dict[str, List[int]] = {}
+        self._by_ward: Dict[str, List[int]] = {}
+        self._ward_of: Dict[str, str] = {}
+        self._device_rules: Dict[str, Tuple[int, ...]] = {}
+        self._states: Dict[Key, RuleState] = {}
+        self._seen: Dict[Key, int] = {}  # version de rule_ep:* ya sincronizada
+        self._dirty: Set[Key] = set()
+        self._next_reload = 0.0
+        self._version: Optional[int] = None
+        self._local_gen = 0
+        self._next_checkpoint = time.monotonic() + checkpoint_s
+        self.evaluations = 0
+        self.activations = 0
+        self.deactivations = 0
+        self.checkpoints = 0
+
+    # ---- carga de reglas ----
+    def _gen(self) -> int:
+        if self.counters is not None:
+            return self.counters.counters(["rules"])[0]
+        return self._local_gen
+
+    def invalidate(self) -> None:
+        """
+        Fuerza recargar reglas y salas en la proxima medicion de todos los
+        workers. Llamar tras confirmar en la BD un cambio de reglas o salas.
+        """
+        if self.counters is not None:
+            self.counters.incr("rules")
+        else:
+            with self._lock:
+                self._local_gen += 1
+
+    def _maybe_reload(self, db: Session) -> None:
+        gen = self._gen()
+        if gen == self._version and time.monotonic() < self._next_reload:
+            return
+        R = models.AlertRule
+        rules = db.query(R).filter(R.enabled.is_(True), R.deleted_at.is_(None)).all()
+        wards = db.query(models.Device.device_id, models.Device.ward).filter(models.Device.ward.isnot(None)).all()
+        rule_ids = [r.id for r in rules]
+        saved = (
+            db.query(models.AlertRuleState).filter(models.AlertRuleState.rule_id.in_(rule_ids)).all()
+            if rule_ids else []
+        )
+        E = models.AlertEvent
+        open_keys = set(
+            db.query(E.rule_id, E.device_id).filter(E.rule_id.in_(rule_ids), E.ended_at.is_(None)).all()
+            if rule_ids else ()
+        )
+        for r in rules:
+            db.expunge(r)
+        with self._lock:
+            self._rules = {r.id: r for r in rules}
+            self._global, self._by_device, self._by_ward = [], {}, {}
+            for r in rules:
+                if r.device_id:
+                    self._by_device.setdefault(r.device_id, []).append(r.id)
+                elif r.ward:
+                    self._by_ward.setdefault(r.ward, []).append(r.id)
+                else:
+                    self._global.append(r.id)
+            self._ward_of = {d: w for d, w in wards}
+            self._device_rules = {}
+            # Estados de reglas borradas se descartan; los guardados se restauran
+            self._states = {k: s for k, s in self._states.items() if k[0] in self._rules}
+            self._seen = {k: v for k, v in self._seen.items() if k[0] in self._rules}
+            now = time.time()
+            for st in saved:
+                key = (st.rule_id, st.device_id)
+                if key not in self._states:
+                    window = json.loads(st.state).get("window") if st.state else None
+                    self._states[key] = RuleState(st.active, [tuple(p) for p in window or ()])
+                    rule = self._rules[st.rule_id]
+                    if rule.kind == "no_data" and not st.active:
+                        # Tras un reinicio, volver a vigilar los dispositivos conocidos
+                        self.wheel.schedule(key, now + rule.timeout_s)
+            # Episodios abiertos o cerrados por otro worker (arranque o recarga)
+            for key, state in self._states.items():
+                if state.active != (key in open_keys):
+                    state.active = key in open_keys
+                    rule = self._rules[key[0]]
+                    if rule.kind == "no_data" and not state.active:
+                        self.wheel.schedule(key, now + rule.timeout_s)
+            for key in open_keys - self._states.keys():
+                self._states[key] = RuleState(True)
+            for key in [k for k in self.wheel._slot_of if k[0] not in self._rules or k in open_keys]:
+                self.wheel.cancel(key)
+            self._version = gen
+            self._next_reload = time.monotonic() + self.reload_s
+
+    def rules_for(self, device_id: str) -> Tuple[int, ...]:
+        ids = self._device_rules.get(device_id)
+        if ids is None:
+            ward = self._ward_of.get(device_id)
+            ids = tuple(self._global + self._by_device.get(device_id, []) + self._by_ward.get(ward, []))
+            self._device_rules[device_id] = ids
+        return ids
+
+    # ---- episodios de otros workers ----
+    @staticmethod
+    def _episode_counter(key: Key) -> str:
+        return f"rule_ep:{key[0]}:{key[1]}"
+
+    def _episode_changed(self, keys: List[Key]) -> None:
+        """Avisa a los demas workers de episodios abiertos o cerrados (tras el commit)."""
+        if self.counters is not None:
+            for key in keys:
+                self.counters.incr(self._episode_counter(key))
+
+    def _sync_episodes(self, db: Session, device_id: str, rule_ids: Tuple[int, ...]) -> None:
+        """Toma de ``alert_events`` el estado de las reglas del dispositivo cuyo episodio cambio en otro worker."""
+        keys = [(rule_id, device_id) for rule_id in rule_ids]
+        versions = self.counters.counters([self._episode_counter(k) for k in keys])
+        stale = {k: v for k, v in zip(keys, versions) if self._seen.get(k, 0) != v}
+        if not stale:
+            return
+        E = models.AlertEvent
+        open_rules = {
+            rule_id for (rule_id,) in db.query(E.rule_id).filter(
+                E.device_id == device_id, E.rule_id.in_([k[0] for k in stale]), E.ended_at.is_(None)
+            )
+        }
+        now = time.time()
+        with self._lock:
+            for key, version in stale.items():
+                self._seen[key] = version
+                rule = self._rules.get(key[0])
+                if rule is None:
+                    continue
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = RuleState()
+                active = key[0] in open_rules
+                if state.active != active:
+                    state.active = active
+                    if rule.kind == "no_data":
+                        if active:
+                            self.wheel.cancel(key)
+                        else:
+                            self.wheel.schedule(key, now + rule.timeout_s)
+
+    # ---- evaluacion por medicion ----
+    def process(self, db: Session, row: models.Measurement) -> None:
+        self._maybe_reload(db)
+        rule_ids = self.rules_for(row.device_id)
+        if self.counters is not None and rule_ids:
+            self._sync_episodes(db, row.device_id, rule_ids)
+        transitions: List[Tuple[models.AlertRule, bool]] = []
+        now = time.time()
+        t = (epoch_ms(row.ts) or now * 1000) / 1000.0
+        with self._lock:
+            for rule_id in rule_ids:
+                rule = self._rules[rule_id]
+                key = (rule_id, row.device_id)
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = RuleState()
+                self.evaluations += 1
+                active = self._evaluate(rule, state, row, t)
+                if rule.kind == "no_data":
+                    self.wheel.schedule(key, now + rule.timeout_s)
+                if active != state.active:
+                    state.active = active
+                    transitions.append((rule, active))
+                    self._dirty.add(key)
+                elif rule.kind == "rate":
+                    self._dirty.add(key)
+        if transitions:
+            for rule, active in transitions:
+                self._transition(db, rule, row.device_id, active, row.ts, row.id)
+            db.commit()
+            self._episode_changed([(rule.id, row.device_id) for rule, _ in transitions])
+
+    def _evaluate(self, rule: models.AlertRule, state: RuleState, row: models.Measurement, t: float) -> bool:
+        if rule.kind == "no_data":
+            return False  # llego una medicion
+        value = getattr(row, rule.variable, None)
+        if value is None:
+            return state.active
+        if rule.kind == "threshold":
+            return _crossed(rule.op, value, rule.threshold, rule.hysteresis or 0.0, state.active)
+        # rate: variacion por minuto entre la muestra mas antigua de la ventana y la actual
+        window = state.window
+        window.append((t, value))
+        while len(window) > 1 and t - window[0][0] > rule.window_s:
+            window.popleft()
+        t0, v0 = window[0]
+        if t - t0 <= 0:
+            return state.active
+        rate = (value - v0) / (t - t0) * 60.0
+        return _crossed(rule.op, rate, rule.threshold, rule.hysteresis or 0.0, state.active)
+
+    def _transition(self, db: Session, rule: models.AlertRule, device_id: str, active: bool,
+                    ts: datetime, measurement_id: Optional[int]) -> None:
+        E = models.AlertEvent
+        if active:
+            if open_episode(db, device_id=device_id, bit=0, rule_id=rule.id,
+                            started_at=ts, start_measurement_id=measurement_id):
+                self.activations += 1
+            return
+        event = (
+            db.query(E)
+            .filter(E.device_id == device_id, E.rule_id == rule.id, E.ended_at.is_(None))
+            .one_or_none()
+        )
+        if event is not None:
+            close_episode(db, event, ts, measurement_id)
+            self.deactivations += 1
+
+    # ---- temporizadores y checkpoint ----
+    def tick(self, now: Optional[float] = None, db: Optional[Session] = None) -> None:
+        """Procesa plazos ``no_data`` vencidos y, si toca, guarda el estado."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = self.wheel.advance(now)
+            checkpoint = bool(self._dirty) and time.monotonic() >= self._next_checkpoint
+        if not expired and not checkpoint:
+            return
+        own = db is None
+        if own:
+            if self.session_factory is None:
+                return
+            db = self.session_factory()
+        try:
+            if expired:
+                self._expire(db, expired, now)
+            if checkpoint:
+                self.checkpoint(db)
+        finally:
+            if own:
+                db.close()
+
+    def _expire(self, db: Session, keys: List[Key], now: float) -> None:
+        M = models.Measurement
+        opened: List[Key] = []
+        for key in keys:
+            rule = self._rules.get(key[0])
+            state = self._states.get(key)
+            if rule is None or state is None or state.active:
+                continue
+            # Confirmar: otro worker pudo recibir datos del dispositivo
+            last_ts = db.query(func.max(M.ts)).filter(M.device_id == key[1]).scalar()
+            last = (epoch_ms(last_ts) or 0) / 1000.0
+            if last and last + rule.timeout_s > now:
+                with self._lock:
+                    self.wheel.schedule(key, last + rule.timeout_s)
+                continue
+            started = datetime.fromtimestamp(last + rule.timeout_s if last else now, tz=timezone.utc)
+            with self._lock:
+                state.active = True
+                self._dirty.add(key)
+            self._transition(db, rule, key[1], True, started, None)
+            opened.append(key)
+        db.commit()
+        self._episode_changed(opened)
+
+    def checkpoint(self, db: Session) -> None:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshot = [(k, self._states[k].active, self._states[k].dump()) for k in dirty if k in self._states]
+            self._next_checkpoint = time.monotonic() + self.checkpoint_s
+        for (rule_id, device_id), active, state in snapshot:
+            db.merge(models.AlertRuleState(rule_id=rule_id, device_id=device_id, active=active, state=state))
+        db.commit()
+        self.checkpoints += 1
+
+    async def run(self) -> None:
+        """Bucle del ``lifespan``: avanza la rueda cada ``tick_s`` segundos."""
+        while True:
+            await asyncio.sleep(self.wheel.tick_s)
+            try:
+                await asyncio.to_thread(self.tick)
+            except Exception:
+                logger.exception("rule engine tick failed")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "rules": len(self._rules),
+                "states": len(self._states),
+                "active": sum(1 for s in self._states.values() if s.active),
+                "timers": len(self.wheel),
+                "evaluations": self.evaluations,
+                "activations": self.activations,
+                "deactivations": self.deactivations,
+                "checkpoints": self.checkpoints,
+            }
+
+
+def _make_engine() -> RuleEngine:
+    from .db import SessionLocal
+    from .cache import query_cache
+    return RuleEngine(SessionLocal, settings.rules_reload_s, settings.rules_checkpoint_s, settings.rules_tick_s,
+                      counters=query_cache.backend)
+
+
+rule_engine = _make_engine()
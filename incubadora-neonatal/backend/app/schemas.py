@@ -1,8 +1,8 @@
 # app/schemas.py
 from __future__ import annotations
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, ConfigDict
+from typing import Dict, Literal, Optional, List
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 # === Medidas ===
 class MeasurementBase(BaseModel):
@@ -53,19 +53,143 @@ class SeriesPoint(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+# === Estadisticas ===
+class VariableStats(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    stddev: Optional[float] = None
+    p05: Optional[float] = None
+    p25: Optional[float] = None
+    p50: Optional[float] = None
+    p75: Optional[float] = None
+    p95: Optional[float] = None
+    range_min: float
+    range_max: float
+    in_range_pct: Optional[float] = None      # % de muestras dentro de [range_min, range_max]
+    in_range_minutes: Optional[float] = None  # in_range_pct aplicado al tiempo cubierto
+
+class DeviceStats(BaseModel):
+    device_id: str
+    start: datetime
+    end: datetime
+    samples: int
+    first_ts: Optional[datetime] = None
+    last_ts: Optional[datetime] = None
+    variables: Dict[str, VariableStats]
+
+class WindowStats(BaseModel):
+    mean: Optional[float] = None
+    var: Optional[float] = None
+    slope: Optional[float] = None  # unidades por minuto
+
+class WindowFeatures(BaseModel):
+    window_min: int
+    samples: int  # muestras en la ventana
+    variables: Dict[str, WindowStats]
+
+class DeviceFeaturesOut(BaseModel):
+    device_id: str
+    last_ts: Optional[datetime] = None  # ultima muestra incluida
+    last_measurement_id: Optional[int] = None
+    updated_at: Optional[datetime] = None  # ultima instantanea
+    windows: List[WindowFeatures]
+
 # === Alertas ===
 class AlertRow(BaseModel):
     ts: datetime
     device_id: Optional[str] = None
     mask: int
     labels: List[str]
+    # Episodio (alert_events): ts = inicio; ended_at NULL = en curso
+    rule_id: Optional[int] = None  # episodios de reglas del servidor (mask = 0)
+    ended_at: Optional[datetime] = None
+    duration_s: Optional[float] = None
+    active: bool = False
+    samples: Optional[int] = None
+    max_temp_aire_c: Optional[float] = None
+    min_temp_aire_c: Optional[float] = None
+    max_temp_piel_c: Optional[float] = None
+    max_humedad: Optional[float] = None
+    min_humedad: Optional[float] = None
+    min_peso_g: Optional[float] = None
+
+class AlertSummaryBit(BaseModel):
+    bit: int
+    code: str
+    sigla: str
+    label: str
+    samples: int
+    episodes: int  # flancos de subida dentro del intervalo
+    seconds: float
+    minutes: float
+
+class AlertSummaryMask(BaseModel):
+    mask: int
+    labels: List[str]
+    samples: int
+    seconds: float
+
+class AlertSummaryBucket(BaseModel):
+    device_id: str
+    bucket: datetime  # inicio del intervalo (UTC)
+    samples: int
+    covered_s: float
+    bits: List[AlertSummaryBit]
+    masks: List[AlertSummaryMask]
 
 # === Modelos (ML) ===
+class InferenceStats(BaseModel):
+    """Puntuacion en linea del worker que responde (``app/inference.py``)."""
+    model_config = ConfigDict(protected_namespaces=())  # campos "model_*"
+    pid: int
+    enabled: bool
+    running: bool
+    model_version: Optional[str] = None  # version cargada en este worker
+    model_loaded_at: Optional[datetime] = None
+    model_swaps: int = 0
+    model_mmap: bool = False  # parametros mapeados (compartidos entre workers)
+    model_mapped_bytes: int = 0
+    queued: int
+    submitted: int
+    dropped: int  # cola llena
+    scored: int
+    unscored: int  # sin modelo o con features sin definir (pocas muestras, nulos)
+    anomalies: int  # puntuacion por encima del umbral
+    batches: int
+    errors: int
+    avg_batch: float
+    throughput_per_s: float  # muestras puntuadas por segundo (ultimo minuto)
+    latency_p50_ms: float  # desde que se encola hasta que se guarda la puntuacion
+    latency_p99_ms: float
+
+class ModelWorker(BaseModel):
+    """Version que tiene cargada un worker (``workers/`` del almacen de modelos)."""
+    pid: int
+    host: str
+    version: str
+    loaded_at: Optional[datetime] = None
+    mmap: bool = False
+    mapped_bytes: int = 0
+    updated_at: Optional[datetime] = None
+
 class ModelStatus(BaseModel):
     algo: str
-    version: str
+    version: str  # version activa (la que se usa para puntuar)
     training: bool = False
     updated_at: Optional[datetime] = None
+    # Ultimo entrenamiento (en curso o terminado)
+    training_version: Optional[str] = None
+    stage: Optional[str] = None  # queued | features | scoring | done | error
+    progress: Optional[float] = None  # 0..1
+    started_at: Optional[datetime] = None
+    duration_s: Optional[float] = None
+    samples: Dict[str, int] = {}
+    metrics: Dict[str, float] = {}
+    error: Optional[str] = None
+    inference: Optional[InferenceStats] = None
+    workers: List[ModelWorker] = []  # todos los workers con un modelo cargado
 
 class DeviceMetrics(BaseModel):
     temp_aire_c: Optional[float] = None
@@ -98,6 +222,7 @@ class MeasurementOut(BaseModel):
     peso_g: Optional[float] = None
     set_control: Optional[str] = None
     alerts: Optional[str] = None
+    anomaly_score: Optional[float] = None
     model_config = ConfigDict(from_attributes=True)  # ORM ? Pydantic
 
 class SeriesPoint(BaseModel):
@@ -146,10 +271,52 @@ class DeviceCreate(DeviceBase):
 class DeviceOut(DeviceBase):
     id: int
     user_id: Optional[int] = None
+    ward: Optional[str] = None
+    api_key_rotated_at: Optional[datetime] = None  # None = sin clave de API
     created_at: datetime
     updated_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class DeviceApiKey(BaseModel):
+    device_id: str
+    api_key: str  # solo se muestra al generarla
+    rotated_at: datetime
+
 class DeviceLinkRequest(BaseModel):
     device_id: str
 
+class DeviceUpdate(BaseModel):
+    name: Optional[str] = None
+    ward: Optional[str] = None
+
+# === Reglas de alerta ===
+class AlertRuleIn(BaseModel):
+    name: str
+    kind: Literal["threshold", "rate", "no_data"]
+    variable: Optional[Literal["temp_aire_c", "temp_piel_c", "humedad", "peso_g", "luz", "ntc_c"]] = None
+    op: Optional[Literal[">", "<"]] = None
+    threshold: Optional[float] = None
+    hysteresis: float = Field(default=0.0, ge=0)
+    window_s: Optional[float] = Field(default=None, gt=0)
+    timeout_s: Optional[float] = Field(default=None, gt=0)
+    device_id: Optional[str] = None
+    ward: Optional[str] = None
+    enabled: bool = True
+
+    @model_validator(mode="after")
+    def _check_kind(self):
+        if self.kind in ("threshold", "rate") and (self.variable is None or self.op is None or self.threshold is None):
+            raise ValueError(f"{self.kind} rules require variable, op and threshold")
+        if self.kind == "rate" and self.window_s is None:
+            raise ValueError("rate rules require window_s")
+        if self.kind == "no_data" and self.timeout_s is None:
+            raise ValueError("no_data rules require timeout_s")
+        if self.device_id and self.ward:
+            raise ValueError("use device_id or ward, not both")
+        return self
+
+class AlertRuleOut(AlertRuleIn):
+    id: int
+    created_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
@@ -17,10 +17,61 @@ class Settings(BaseSettings):
     api_title: str = "Incubadora API"
     api_version: str = "v0.1.0"
     database_url: str = "postgresql+psycopg2://incu:incu@db:5432/incu"
+    # Replica de solo lectura para consultas GET (vacio = usar el primario)
+    database_read_url: str = ""
+    # Pool de conexiones por rol (ver app/db.py): api (primario), read
+    # (replica), collector y exporter (exportacion y entrenamiento).
+    # pool_timeout_s es la espera maxima de un checkout con el pool agotado
+    # y pool_recycle_s la edad a la que se reabre una conexion.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_s: float = 30.0
+    db_pool_recycle_s: int = 1800
+    db_read_pool_size: int = 5
+    db_read_max_overflow: int = 10
+    db_read_pool_timeout_s: float = 30.0
+    db_read_pool_recycle_s: int = 1800
+    db_collector_pool_size: int = 2
+    db_collector_max_overflow: int = 2
+    db_collector_pool_timeout_s: float = 10.0
+    db_collector_pool_recycle_s: int = 1800
+    db_exporter_pool_size: int = 1
+    db_exporter_max_overflow: int = 1
+    db_exporter_pool_timeout_s: float = 60.0
+    db_exporter_pool_recycle_s: int = 1800
+    # Segundos durante los que un usuario lee del primario tras escribir
+    read_your_writes_s: float = 5.0
 
     # info de modelo (para /models)
     model_name: str = "demo"
     model_ver: str = "v0.0.1"
+    # Artefactos versionados (<model_dir>/<model_name>/<version>/) y estado del entrenamiento
+    model_dir: str = "./model_store"
+    # Entrenamiento: procesos (0 = hilo, tests), nice, segundos tras los que
+    # un lock huerfano se ignora y filas por bloque leido de measurements
+    model_train_workers: int = 1
+    model_train_nice: int = 10
+    model_train_timeout_s: float = 3600.0
+    model_train_chunk_rows: int = 20000
+    # 1 de cada N muestras para validacion y percentil de las puntuaciones
+    # de entrenamiento usado como umbral
+    model_val_every: int = 5
+    model_threshold_quantile: float = 0.995
+    # Puntuacion en linea: micro-lotes de hasta N muestras o N ms, muestras
+    # en cola antes de descartar y frecuencia de comprobacion de CURRENT
+    inference_enabled: bool = True
+    inference_batch_size: int = 256
+    inference_batch_wait_ms: float = 20.0
+    inference_queue_size: int = 10000
+    model_reload_s: float = 5.0
+    # Mapear los parametros del modelo en solo lectura (una copia compartida
+    # por todos los workers) en lugar de copiarlos a la memoria de cada uno
+    model_mmap: bool = True
+    # Ventanas moviles por dispositivo (5/15/60 min): segundos entre
+    # instantaneas en device_features y dispositivos en memoria por worker
+    feature_store_enabled: bool = True
+    feature_snapshot_s: float = 10.0
+    feature_max_devices: int = 10000
 
     # IMPORTANTE: string crudo; lo convertimos a lista nosotros
     # Incluye orígenes para desarrollo web y Capacitor (Android/iOS)
@@ -35,6 +86,66 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
 
+    # Cache de resultados de /query ("memory", "redis" o "none")
+    query_cache_backend: str = "memory"
+    query_cache_url: str = "redis://localhost:6379/0"  # solo para backend "redis"
+    query_cache_ttl_s: float = 10.0
+    query_cache_max_entries: int = 2048
+    query_cache_max_bytes: int = 32 * 1024 * 1024
+
+    # /ingest: exigir X-API-Key por dispositivo (False = se aceptan envios sin clave)
+    ingest_require_api_key: bool = False
+
+    # Cache de principales de get_current_user (segundos y entradas; ttl 0 = desactivado)
+    auth_cache_ttl_s: float = 30.0
+    auth_cache_max_entries: int = 4096
+
+    # Hash de contrasenas: procesos dedicados (0 = en el hilo del handler),
+    # operaciones en cola antes de responder 503 y espera maxima por operacion
+    password_hash_workers: int = 2
+    password_hash_queue: int = 8
+    password_hash_timeout_s: float = 10.0
+    # Incremento de nice de esos procesos (menor prioridad que el worker web)
+    password_hash_nice: int = 10
+
+    # Cache por usuario de dispositivos vinculados (comprobaciones de propiedad)
+    device_access_ttl_s: float = 300.0
+    device_access_max_entries: int = 4096
+
+    # Streaming en vivo: eventos en cola por cliente (se descartan los mas antiguos)
+    live_queue_size: int = 256
+    live_heartbeat_s: float = 15.0
+    # Reanudacion con Last-Event-ID: eventos recientes por dispositivo en memoria
+    # y maximo de filas a reenviar desde la BD cuando el hueco supera el buffer
+    live_replay_size: int = 512
+    live_replay_max_rows: int = 5000
+    # Ids reenviados por debajo de Last-Event-ID: filas de id menor que se
+    # confirman tarde con ingestas concurrentes (el cliente descarta duplicados)
+    live_replay_overlap_ids: int = 256
+    # Transporte entre workers: "memory" (un proceso) o "postgres" (LISTEN/NOTIFY)
+    live_transport: str = "memory"
+    live_channel: str = "incubadora_live"
+    # Eventos pendientes de NOTIFY por worker (se descartan si se llena)
+    live_publish_queue_size: int = 4096
+    # WebSocket /ws: tramas por segundo por conexion y mensajes del cliente por segundo
+    ws_max_rate: float = 10.0
+    ws_client_msg_rate: int = 20
+    # Segundos entre comprobaciones de vinculacion de una conexion /ws abierta
+    ws_access_recheck_s: float = 5.0
+
+    # /alerts/summary: duracion maxima atribuida a una muestra (huecos sin datos no cuentan)
+    alerts_summary_max_gap_s: float = 120.0
+
+    # Motor de reglas de alerta: recarga de reglas, checkpoint del estado y tick de temporizadores
+    rules_reload_s: float = 30.0
+    rules_checkpoint_s: float = 60.0
+    rules_tick_s: float = 1.0
+
+    # Rangos objetivo para "tiempo en rango" de /query/stats ("min,max")
+    stats_range_temp_aire_c: str = "32.0,37.5"
+    stats_range_temp_piel_c: str = "36.5,37.5"
+    stats_range_humedad: str = "40,70"
+
     # ---- helpers seguros ----
     @property
     def cors_list(self) -> List[str]:
@@ -49,6 +160,20 @@ class Settings(BaseSettings):
                 pass
         return [x.strip() for x in raw.split(",") if x.strip()]
 
+    def db_pool(self, role: str) -> dict:
+        """Argumentos de pool de ``create_engine`` para un rol de ``app/db.py``."""
+        prefix = "db_" if role == "api" else f"db_{role}_"
+        return {
+            "pool_size": getattr(self, f"{prefix}pool_size"),
+            "max_overflow": getattr(self, f"{prefix}max_overflow"),
+            "pool_timeout": getattr(self, f"{prefix}pool_timeout_s"),
+            "pool_recycle": getattr(self, f"{prefix}pool_recycle_s"),
+        }
+
+    def stats_range(self, variable: str) -> tuple[float, float]:
+        lo, hi = getattr(self, f"stats_range_{variable}").split(",")
+        return float(lo), float(hi)
+
     # ---- alias para compatibilidad con codigo que usa settings.version / settings.name ----
     @property
     def version(self) -> str:  # alias para api_version
@@ -0,0 +1,157 @@
+# app/stats.py
+"""
+Estadisticas resumen por dispositivo (media, min, max, desviacion,
+percentiles y tiempo en rango) calculadas en el servidor.
+
+En PostgreSQL todo se resuelve en una sola consulta agregada
+(``percentile_cont ... WITHIN GROUP``, ``count(...) FILTER``). En otros
+motores (SQLite en desarrollo y tests) se leen solo las columnas necesarias
+por bloques y se calcula con NumPy en una pasada vectorizada.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Variables resumidas y percentiles reportados
+STATS_VARIABLES = ("temp_aire_c", "temp_piel_c", "humedad")
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Filas por bloque al leer columnas en el camino NumPy
+_CHUNK_ROWS = 5000
+
+Ranges = Dict[str, Tuple[float, float]]
+
+
+def compute_stats(
+    db: Session,
+    device_id: str,
+    start: datetime,
+    end: datetime,
+    ranges: Ranges,
+) -> dict:
+    """
+    Devuelve ``{"samples", "first_ts", "last_ts", "variables": {var: {...}}}``
+    para las mediciones de ``device_id`` con ``start <= ts < end``.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _stats_sql(db, device_id, start, end, ranges)
+    return _stats_numpy(db, device_id, start, end, ranges)
+
+
+def _window(device_id: str, start: datetime, end: datetime):
+    M = models.Measurement
+    return (M.device_id == device_id, M.ts >= start, M.ts < end)
+
+
+def _covered_minutes(first_ts: Optional[datetime], last_ts: Optional[datetime]) -> float:
+    if first_ts is None or last_ts is None:
+        return 0.0
+    return (last_ts - first_ts).total_seconds() / 60.0
+
+
+def _variable(
+    count: int,
+    mean, vmin, vmax, std,
+    pcts: List[Optional[float]],
+    in_range: int,
+    minutes: float,
+    bounds: Tuple[float, float],
+) -> dict:
+    pct = (100.0 * in_range / count) if count else None
+    out = {
+        "count": count,
+        "mean": mean,
+        "min": vmin,
+        "max": vmax,
+        "stddev": std,
+        "range_min": bounds[0],
+        "range_max": bounds[1],
+        "in_range_pct": pct,
+        "in_range_minutes": (pct / 100.0 * minutes) if pct is not None else None,
+    }
+    for p, v in zip(PERCENTILES, pcts):
+        out[f"p{p:02d}"] = v
+    return out
+
+
+def _stats_sql(db: Session, device_id: str, start: datetime, end: datetime, ranges: Ranges) -> dict:
+    M = models.Measurement
+    fractions = cast(postgresql.array([p / 100.0 for p in PERCENTILES]), postgresql.ARRAY(Float))
+    cols = [func.count(), func.min(M.ts), func.max(M.ts)]
+    for var in STATS_VARIABLES:
+        col = getattr(M, var)
+        lo, hi = ranges[var]
+        cols += [
+            func.count(col),
+            func.avg(col),
+            func.min(col),
+            func.max(col),
+            func.stddev_samp(col),
+            func.percentile_cont(fractions).within_group(col).cast(postgresql.ARRAY(Float)),
+            func.count(col).filter(col.between(lo, hi)),
+        ]
+    row = db.execute(select(*cols).where(*_window(device_id, start, end))).one()
+
+    samples, first_ts, last_ts = row[0], row[1], row[2]
+    minutes = _covered_minutes(first_ts, last_ts)
+    variables = {}
+    for i, var in enumerate(STATS_VARIABLES):
+        count, mean, vmin, vmax, std, pcts, in_range = row[3 + 7 * i: 10 + 7 * i]
+        variables[var] = _variable(
+            count,
+            float(mean) if mean is not None else None,
+            vmin, vmax, std,
+            list(pcts) if pcts else [None] * len(PERCENTILES),
+            in_range, minutes, ranges[var],
+        )
+    return {"samples": samples, "first_ts": first_ts, "last_ts": last_ts, "variables": variables}
+
+
+def _stats_numpy(db: Session, device_id: str, start: datetime, end: datetime, ranges: Ranges) -> dict:
+    M = models.Measurement
+    stmt = (
+        select(M.ts, *[getattr(M, v) for v in STATS_VARIABLES])
+        .where(*_window(device_id, start, end))
+        .order_by(M.ts)
+        .execution_options(yield_per=_CHUNK_ROWS)
+    )
+    chunks: List[np.ndarray] = []
+    first_ts = last_ts = None
+    for part in db.execute(stmt).partitions():
+        if first_ts is None:
+            first_ts = part[0][0]
+        last_ts = part[-1][0]
+        # None -> NaN al convertir a float
+        chunks.append(np.array([r[1:] for r in part], dtype=float))
+
+    data = np.concatenate(chunks) if chunks else np.empty((0, len(STATS_VARIABLES)))
+    minutes = _covered_minutes(first_ts, last_ts)
+    variables = {}
+    for i, var in enumerate(STATS_VARIABLES):
+        col = data[:, i]
+        col = col[~np.isnan(col)]
+        count = int(col.size)
+        if not count:
+            variables[var] = _variable(0, None, None, None, None, [None] * len(PERCENTILES), 0, minutes, ranges[var])
+            continue
+        lo, hi = ranges[var]
+        variables[var] = _variable(
+            count,
+            float(col.mean()),
+            float(col.min()),
+            float(col.max()),
+            float(col.std(ddof=1)) if count > 1 else None,
+            [float(v) for v in np.percentile(col, PERCENTILES)],
+            int(np.count_nonzero((col >= lo) & (col <= hi))),
+            minutes,
+            ranges[var],
+        )
+    return {"samples": int(data.shape[0]), "first_ts": first_ts, "last_ts": last_ts, "variables": variables}
@@ -0,0 +1,371 @@
+# app/training.py
+"""
+Entrenamiento del modelo de anomalias fuera de los workers web.
+
+El modelo es una distancia de Mahalanobis sobre las features de
+:mod:`app.ml_features`: media y desviacion por feature, matriz de
+correlacion con *shrinkage* hacia la identidad y umbral en el percentil
+``MODEL_THRESHOLD_QUANTILE`` de las puntuaciones de entrenamiento. Solo
+numpy y CPU; no necesita red ni GPU.
+
+``measurements`` se lee una sola vez por bloques de ``id``
+(``export.iter_chunks``), sin cargar la tabla:
+
+1. cada fila pasa por las mismas ventanas moviles que usa la ingesta
+   (``ml_features.ChunkFeatures``, O(1) por fila); las features se
+   escriben en un fichero temporal y se acumulan, por pares de features
+   presentes, ``n``, ``sum(x)`` y ``sum(x x^T)`` de las filas de
+   entrenamiento (``id % MODEL_VAL_EVERY != 0``); una variable ausente
+   (``temp_piel_c`` de un colector) no descarta la fila;
+2. se puntuan las features precalculadas, leidas del fichero con
+   ``np.memmap`` (sin volver a la base de datos): una muestra aleatoria
+   de las de entrenamiento fija el umbral y las de validacion dan las
+   metricas.
+
+El trabajo corre en un ``ProcessPoolExecutor`` de un proceso (``spawn``,
+con ``nice``) que abre su propia conexion; el progreso, la duracion y las
+metricas se escriben en ``status.json`` del :class:`ModelStore`, que leen
+todos los workers. ``training.lock`` impide dos entrenamientos a la vez.
+"""
+from __future__ import annotations
+
+import functools
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from . import models
+from .db import make_engine
+from .export import iter_chunks, max_id
+from .ml_features import FEATURE_NAMES, FEATURE_WINDOWS_S, ChunkFeatures, present_mask
+from .model_store import ModelStore
+
+ALGO = "mahalanobis"
+_RESERVOIR = 100_000
+_MIN_SAMPLES = 50
+_STATUS_EVERY_S = 0.5
+
+
+class TrainingInProgress(Exception):
+    """Ya hay un entrenamiento en curso (en este u otro worker)."""
+
+
+def score(X: np.ndarray, params: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Distancia de Mahalanobis al cuadrado dividida por el numero de features.
+
+    Las filas con variables ausentes (:func:`ml_features.present_mask`) se
+    puntuan con la distribucion marginal de las presentes: el bloque de
+    ``corr`` de esas features, invertido una vez por patron de ausencias.
+    NaN si la fila no tiene ninguna variable que el modelo conozca.
+    """
+    z = (X - params["mean"]) / params["scale"]
+    mask = present_mask(X)
+    available = params.get("available")
+    if available is not None:
+        mask &= np.asarray(available, dtype=bool)
+    if mask.all():
+        return np.einsum("ij,jk,ik->i", z, params["precision"], z) / z.shape[1]
+    out = np.full(len(z), np.nan)
+    corr = params["corr"] if "corr" in params else np.linalg.pinv(params["precision"])
+    patterns, inverse = np.unique(mask, axis=0, return_inverse=True)
+    for p, cols in enumerate(patterns):
+        k = int(cols.sum())
+        if not k:
+            continue
+        rows = inverse.reshape(-1) == p
+        zs = z[np.ix_(rows, cols)]
+        precision = params["precision"] if k == len(cols) else np.linalg.pinv(corr[np.ix_(cols, cols)])
+        out[rows] = np.einsum("ij,jk,ik->i", zs, precision, zs) / k
+    return out
+
+
+def fit_moments(
+    n: np.ndarray, shift: np.ndarray, s: np.ndarray, ss: np.ndarray, shrinkage: float, min_count: int = 2
+) -> Dict[str, np.ndarray]:
+    """
+    Parametros a partir de momentos por pares acumulados sobre ``x - shift``.
+
+    ``n[i, j]`` cuenta las filas con las features ``i`` y ``j`` presentes,
+    ``s[i, j]`` suma ``x_i`` en esas filas y ``ss[i, j]`` suma ``x_i x_j``.
+    Sin ausencias equivale a la covarianza de siempre. Las features con
+    menos de ``min_count`` filas quedan fuera (``available``).
+    """
+    k = len(shift)
+    available = np.diag(n) >= min_count
+    nn = np.maximum(n, 1)
+    m = s / nn  # m[i, j]: media de x_i en las filas con i y j
+    cov = ss / nn - m * m.T
+    scale = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    scale[(scale < 1e-9) | ~available] = 1.0  # feature constante o ausente: no aporta distancia
+    corr = np.clip(cov / np.outer(scale, scale), -1.0, 1.0)
+    corr[(n < min_count) | ~np.outer(available, available)] = 0.0
+    np.fill_diagonal(corr, 1.0)
+    corr = (1.0 - shrinkage) * corr + shrinkage * np.eye(k)
+    # por pares la matriz puede no ser semidefinida: se recortan los autovalores
+    w, v = np.linalg.eigh(corr)
+    if w.min() < 1e-6:
+        corr = (v * np.clip(w, 1e-6, None)) @ v.T
+    return {
+        "mean": shift + np.where(available, np.diag(m), 0.0),
+        "scale": scale,
+        "corr": corr,
+        "precision": np.linalg.pinv(corr),
+        "available": available,
+    }
+
+
+class _Progress:
+    def __init__(self, store: ModelStore, total: int):
+        self.store = store
+        self.total = max(total, 1)
+        self._last = 0.0
+
+    def update(self, stage: str, base: float, done: int) -> None:
+        now = time.monotonic()
+        if now - self._last < _STATUS_EVERY_S:
+            return
+        self._last = now
+        self.store.touch_lock()  # un entrenamiento largo no deja el lock como huerfano
+        self.store.write_status(stage=stage, progress=round(base + 0.5 * min(done / self.total, 1.0), 4))
+
+
+def train(
+    db_url: str,
+    root: str,
+    name: str,
+    version: str,
+    chunk_rows: int = 20000,
+    val_every: int = 5,
+    shrinkage: float = 0.05,
+    quantile: float = 0.995,
+    activate: bool = True,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Entrena, guarda la version ``version`` y (opcionalmente) la activa. Devuelve ``meta``."""
+    store = ModelStore(root, name)
+    t0 = time.time()
+    store.write_status(training=True, stage="features", progress=0.0, training_version=version,
+                       started_at=t0, error=None)
+    engine = make_engine(db_url, "exporter")  # lectura larga por bloques: pool DB_EXPORTER_*
+    Session = sessionmaker(bind=engine, future=True)
+    os.makedirs(store.path, exist_ok=True)
+    k = len(FEATURE_NAMES)
+    with tempfile.TemporaryDirectory(dir=store.path, prefix=".features-") as tmp:
+        try:
+            # ---- pasada 1: features de cada fila y momentos de las de entrenamiento ----
+            with Session() as db:
+                until = max_id(db) or 0
+                total = db.execute(select(func.count()).where(models.Measurement.id <= until)).scalar() or 0
+                progress = _Progress(store, total)
+                n, shift = 0, None
+                cnt, s, ss = np.zeros((k, k)), np.zeros((k, k)), np.zeros((k, k))
+                rows_x = 0
+                feats, done = ChunkFeatures(), 0
+                with open(os.path.join(tmp, "X.f64"), "wb") as fx, open(os.path.join(tmp, "ids.i64"), "wb") as fi:
+                    for rows in iter_chunks(db, until_id=until, chunk_rows=chunk_rows):
+                        ids, X = feats.push(rows)
+                        if len(X):
+                            fx.write(np.ascontiguousarray(X).tobytes())
+                            fi.write(ids.tobytes())
+                            rows_x += len(X)
+                            Xt = X[ids % val_every != 0]
+                            if len(Xt):
+                                M = present_mask(Xt)
+                                if shift is None:
+                                    # centrar mejora la precision de sum(x x^T)
+                                    seen = M.sum(axis=0)
+                                    shift = np.where(M, Xt, 0.0).sum(axis=0) / np.maximum(seen, 1)
+                                Xc = np.where(M, Xt - shift, 0.0)
+                                Mf = M.astype(np.float64)
+                                n += len(Xc)
+                                cnt += Mf.T @ Mf
+                                s += Xc.T @ Mf
+                                ss += Xc.T @ Xc
+                        done += len(rows)
+                        progress.update("features", 0.0, done)
+            if n < _MIN_SAMPLES:
+                raise ValueError(f"datos insuficientes: {n} muestras de entrenamiento (minimo {_MIN_SAMPLES})")
+            params = fit_moments(cnt, shift, s, ss, shrinkage)
+
+            # ---- pasada 2: umbral y metricas sobre las features ya calculadas ----
+            X_all = np.memmap(os.path.join(tmp, "X.f64"), dtype=np.float64, mode="r", shape=(rows_x, k))
+            ids_all = np.memmap(os.path.join(tmp, "ids.i64"), dtype=np.int64, mode="r", shape=(rows_x,))
+            progress.total = max(rows_x, 1)
+            rng = np.random.default_rng(seed)
+            keep = min(1.0, _RESERVOIR / n)
+            train_scores, val_scores = [], []
+            for start in range(0, rows_x, chunk_rows):
+                sc = score(np.asarray(X_all[start:start + chunk_rows]), params)
+                is_val = np.asarray(ids_all[start:start + chunk_rows]) % val_every == 0
+                scored = ~np.isnan(sc)  # filas sin ninguna variable que el modelo conozca
+                sc, is_val = sc[scored], is_val[scored]
+                tr = sc[~is_val]
+                train_scores.append(tr[rng.random(len(tr)) < keep] if keep < 1.0 else tr)
+                val_scores.append(sc[is_val])
+                progress.update("scoring", 0.5, start + len(scored))
+            del X_all, ids_all
+
+            train_sc = np.concatenate(train_scores)
+            val_sc = np.concatenate(val_scores) if val_scores else np.empty(0)
+            threshold = float(np.quantile(train_sc, quantile))
+            metrics = {
+                "threshold": threshold,
+                "train_score_p50": float(np.median(train_sc)),
+                "val_score_p50": float(np.median(val_sc)) if len(val_sc) else 0.0,
+                "val_score_p99": float(np.quantile(val_sc, 0.99)) if len(val_sc) else 0.0,
+                "val_anomaly_rate": float((val_sc > threshold).mean()) if len(val_sc) else 0.0,
+            }
+            duration = time.time() - t0
+            meta = {
+                "algo": ALGO,
+                "version": version,
+                "features": list(FEATURE_NAMES),
+                "windows_s": list(FEATURE_WINDOWS_S),
+                "trained_at": time.time(),
+                "duration_s": duration,
+                "samples": {"rows": int(total), "train": int(n), "val": int(len(val_sc)), "last_id": int(until)},
+                "metrics": metrics,
+            }
+            params["threshold"] = np.array(threshold)
+            store.save(version, params, meta)
+            if activate:
+                store.activate(version)
+            store.write_status(training=False, stage="done", progress=1.0, duration_s=duration,
+                               samples=meta["samples"], metrics=metrics, error=None)
+            return meta
+        except Exception as exc:
+            store.write_status(training=False, stage="error", duration_s=time.time() - t0, error=str(exc))
+            raise
+        finally:
+            engine.dispose()
+
+
+# ---- lado del worker web ----
+def _init_worker(nice: int) -> None:
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _job(lock_token: Optional[str], **kwargs) -> Dict[str, Any]:
+    try:
+        return train(**kwargs)
+    finally:
+        if lock_token is not None:
+            ModelStore(kwargs["root"], kwargs["name"]).release_lock(lock_token)
+
+
+class Trainer:
+    """
+    Lanza entrenamientos en un pool de un proceso. Con ``workers=0`` usa un
+    hilo (tests); en ambos casos la peticion que lo lanza no espera.
+    """
+
+    def __init__(self, store: ModelStore, workers: int = 1, nice: int = 10, stale_after_s: float = 3600.0,
+                 **train_kwargs: Any):
+        self.store = store
+        self.workers = workers
+        self.nice = nice
+        self.stale_after_s = stale_after_s
+        self.train_kwargs = train_kwargs
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.future: Optional[Future] = None
+
+    def _pool(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers <= 0:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="train")
+                else:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.nice,),
+                    )
+            return self._executor
+
+    @property
+    def busy(self) -> bool:
+        return self.store.locked()
+
+    def start(self, db_url: str, **overrides: Any) -> str:
+        """Encola un entrenamiento y devuelve la version que producira."""
+        token = self.store.acquire_lock(self.stale_after_s)
+        if token is None:
+            raise TrainingInProgress()
+        try:
+            version = self.store.next_version()
+            self.store.write_status(training=True, stage="queued", progress=0.0, training_version=version,
+                                    started_at=time.time(), error=None)
+            kwargs = dict(self.train_kwargs, **overrides)
+            kwargs.update(db_url=db_url, root=self.store.root, name=self.store.name, version=version)
+            executor = self._pool()
+            try:
+                fut = executor.submit(_job, token, **kwargs)
+            except BrokenProcessPool:
+                # el pool murio antes de que _done lo viera: uno nuevo
+                self._discard(executor)
+                executor = self._pool()
+                fut = executor.submit(_job, token, **kwargs)
+        except BaseException:
+            self.store.release_lock(token)
+            raise
+        fut.add_done_callback(functools.partial(self._done, token, executor))
+        self.future = fut
+        return version
+
+    def _discard(self, executor: Executor) -> None:
+        """Retira un pool roto; el siguiente ``start`` crea otro."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, token: str, executor: Executor, fut: Future) -> None:
+        if fut.cancelled():
+            self.store.release_lock(token)
+            return
+        exc = fut.exception()
+        if exc is None:
+            return
+        if isinstance(exc, BrokenProcessPool):
+            self._discard(executor)
+        # El proceso pudo morir sin escribir su estado ni liberar el lock
+        # (BrokenProcessPool, OOM...); si _job ya lo libero, el token no coincide
+        if self.store.read_status().get("stage") != "error":
+            self.store.write_status(training=False, stage="error", error=str(exc) or type(exc).__name__)
+        self.store.release_lock(token)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _make_trainer() -> Trainer:
+    from .model_store import model_store
+    from .settings import settings
+    return Trainer(
+        model_store,
+        workers=settings.model_train_workers,
+        nice=settings.model_train_nice,
+        stale_after_s=settings.model_train_timeout_s,
+        chunk_rows=settings.model_train_chunk_rows,
+        val_every=settings.model_val_every,
+        quantile=settings.model_threshold_quantile,
+    )
+
+
+trainer = _make_trainer()
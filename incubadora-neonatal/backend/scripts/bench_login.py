@@ -0,0 +1,113 @@
+"""
+Benchmark de logins concurrentes frente a lecturas de telemetria.
+
+Mide la latencia de ``/query/latest`` (p50/p99) con ``--readers`` clientes
+en dos fases de ``--duration`` segundos: sin carga y con ``--logins``
+clientes haciendo ``/auth/login`` sin pausa (rafaga de cambio de turno;
+ante un ``503`` esperan ``Retry-After``).
+Reporta logins por segundo, respuestas ``503`` del pool de hash y la
+diferencia de latencia de las lecturas entre ambas fases.
+
+El usuario del token de lectura debe tener ``--device`` vinculado; el de
+login (``--username``/``--password``) debe existir. Comparar con
+``PASSWORD_HASH_WORKERS=0`` (hash en el hilo del handler) muestra el
+efecto del pool.
+
+Ejemplo::
+
+    python scripts/bench_login.py --base-url http://localhost:8000/incubadora \\
+        --token $TOKEN --device esp32-001 --username turno --password secret
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import requests
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def reader(base: str, token: str, device: str, stop: threading.Event, out: List[float]) -> None:
+    s = requests.Session()
+    s.headers["Authorization"] = f"Bearer {token}"
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        r = s.get(f"{base}/query/latest", params={"device_id": device})
+        if r.status_code == 200:
+            out.append((time.perf_counter() - t0) * 1000)
+
+
+def login(base: str, username: str, password: str, stop: threading.Event, counts: Dict[int, int], lock: threading.Lock) -> None:
+    s = requests.Session()
+    while not stop.is_set():
+        r = s.post(f"{base}/auth/login", data={"username": username, "password": password})
+        with lock:
+            counts[r.status_code] = counts.get(r.status_code, 0) + 1
+        if r.status_code == 503:
+            # Como el frontend: reintentar tras Retry-After
+            stop.wait(float(r.headers.get("Retry-After", 1)))
+
+
+def phase(args, with_logins: bool) -> Dict[str, float]:
+    stop = threading.Event()
+    latencies: List[float] = []
+    counts: Dict[int, int] = {}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=reader, args=(args.base_url, args.token, args.device, stop, latencies))
+        for _ in range(args.readers)
+    ]
+    if with_logins:
+        threads += [
+            threading.Thread(target=login, args=(args.base_url, args.username, args.password, stop, counts, lock))
+            for _ in range(args.logins)
+        ]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {
+        "reads": len(latencies),
+        "read_p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "read_p99_ms": _pct(latencies, 99),
+        "logins_ok_per_s": counts.get(200, 0) / args.duration,
+        "logins_503": counts.get(503, 0),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://localhost:8000/incubadora")
+    ap.add_argument("--token", required=True, help="JWT del usuario lector")
+    ap.add_argument("--device", required=True)
+    ap.add_argument("--username", required=True)
+    ap.add_argument("--password", required=True)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--logins", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=10.0)
+    args = ap.parse_args()
+
+    base = phase(args, with_logins=False)
+    burst = phase(args, with_logins=True)
+    for name, res in (("sin logins", base), ("con logins", burst)):
+        print(
+            f"{name:>11}: lecturas={res['reads']} p50={res['read_p50_ms']:.1f}ms "
+            f"p99={res['read_p99_ms']:.1f}ms logins/s={res['logins_ok_per_s']:.1f} 503={res['logins_503']}"
+        )
+    if base["read_p99_ms"]:
+        print(f"p99 de lecturas con rafaga: x{burst['read_p99_ms'] / base['read_p99_ms']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
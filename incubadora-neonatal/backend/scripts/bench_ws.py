@@ -0,0 +1,151 @@
+"""
+Benchmark del canal WebSocket ``/ws``.
+
+Abre ``--sockets`` conexiones (1000 por defecto) con el mismo usuario,
+todas suscritas a ``--devices``, publica mediciones via ``/ingest`` a
+``--rate`` por segundo durante ``--duration`` segundos y reporta tramas
+recibidas, bytes, tramas por segundo y latencia (p50/p99) desde el ``ts``
+asignado por el servidor hasta la recepcion.
+
+Los dispositivos deben estar vinculados al usuario del token. Para 1000
+sockets puede hacer falta subir el limite de descriptores (``ulimit -n 4096``).
+
+Ejemplo::
+
+    python scripts/bench_ws.py --base-url http://localhost:8000/incubadora \\
+        --token $TOKEN --devices esp32-001,esp32-002 --sockets 1000 --encoding msgpack
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import requests
+import websockets
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class Stats:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.latencies_ms: List[float] = []
+        self.connected = 0
+        self.failed = 0
+
+
+def _decode(raw, binary: bool) -> Dict:
+    return msgpack.unpackb(raw, raw=False) if binary else json.loads(raw)
+
+
+def _encode(msg: Dict, binary: bool):
+    return msgpack.packb(msg, use_bin_type=True) if binary else json.dumps(msg)
+
+
+async def client(url: str, devices: List[str], binary: bool, stats: Stats, stop: asyncio.Event, sem: asyncio.Semaphore):
+    try:
+        async with sem:
+            ws = await websockets.connect(url, max_queue=None)
+        await ws.send(_encode({"op": "subscribe", "devices": devices}, binary))
+        await ws.recv()  # confirmacion de suscripcion
+        stats.connected += 1
+    except Exception:
+        stats.failed += 1
+        return
+    try:
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            now_ms = time.time() * 1000
+            msg = _decode(raw, binary)
+            if msg.get("op") != "m":
+                continue
+            stats.frames += 1
+            stats.bytes += len(raw)
+            if msg.get("ts_ms"):
+                stats.latencies_ms.append(now_ms - msg["ts_ms"])
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        await ws.close()
+
+
+def producer(base_url: str, devices: List[str], rate: float, duration: float) -> int:
+    session = requests.Session()
+    sent = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for dev in devices:
+            session.post(f"{base_url}/ingest", json={
+                "device_id": dev,
+                "temp_aire_c": round(36 + random.random(), 2),
+                "humedad": 55,  # constante: no viaja en las tramas delta
+            }, timeout=10)
+            sent += 1
+        time.sleep(1.0 / rate)
+    return sent
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run(args) -> None:
+    binary = args.encoding == "msgpack"
+    ws_base = args.base_url.replace("http", "ws", 1)
+    url = f"{ws_base}/ws?token={args.token}&encoding={args.encoding}"
+    devices = [d.strip() for d in args.devices.split(",") if d.strip()]
+
+    stats, stop = Stats(), asyncio.Event()
+    sem = asyncio.Semaphore(args.connect_concurrency)
+    t0 = time.monotonic()
+    tasks = [asyncio.create_task(client(url, devices, binary, stats, stop, sem)) for _ in range(args.sockets)]
+    while stats.connected + stats.failed < args.sockets:
+        await asyncio.sleep(0.05)
+    print(f"conectados: {stats.connected} (fallidos {stats.failed}) en {time.monotonic() - t0:.2f}s")
+
+    t1 = time.monotonic()
+    sent = await asyncio.to_thread(producer, args.base_url, devices, args.rate, args.duration)
+    await asyncio.sleep(1.0)  # margen para las ultimas tramas
+    elapsed = time.monotonic() - t1
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    print(f"mediciones enviadas: {sent}")
+    print(f"tramas recibidas:    {stats.frames} ({stats.frames / elapsed:.0f}/s)")
+    print(f"bytes por trama:     {stats.bytes / max(stats.frames, 1):.1f}")
+    print(f"latencia p50/p99:    {_pct(stats.latencies_ms, 50):.1f} / {_pct(stats.latencies_ms, 99):.1f} ms")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--base-url", default="http://localhost:8000/incubadora")
+    p.add_argument("--token", required=True, help="JWT de un usuario con los dispositivos vinculados")
+    p.add_argument("--devices", required=True, help="Lista separada por comas")
+    p.add_argument("--sockets", type=int, default=1000)
+    p.add_argument("--rate", type=float, default=2.0, help="Rondas de ingesta por segundo")
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--encoding", choices=("json", "msgpack"), default="json")
+    p.add_argument("--connect-concurrency", type=int, default=100)
+    args = p.parse_args(argv)
+    if args.encoding == "msgpack" and msgpack is None:
+        p.error("msgpack no esta instalado")
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
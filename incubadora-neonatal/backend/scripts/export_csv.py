@@ -0,0 +1,62 @@
+"""
+Exporta la tabla ``measurements`` a CSV, Parquet o Arrow IPC, particionada
+por dispositivo y dia.
+
+Por defecto la exportacion es incremental: solo escribe las filas nuevas
+desde la ultima ejecucion (marca de agua en ``<out>/_watermark.json``;
+con ``--device`` en ``<out>/_watermark.<device>.json``, sin mover la de
+los demas dispositivos).
+
+Ejemplos::
+
+    python scripts/export_csv.py --out /data/export
+    python scripts/export_csv.py --out /data/export --format arrow --device esp32-001
+    python scripts/export_csv.py --out /tmp/full --format csv --full
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+# Permite ejecutar el script desde backend/ sin instalar el paquete
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.db import session_factory  # noqa: E402
+from app.export import DEFAULT_CHUNK_ROWS, FORMATS, export_partitioned  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta mediciones particionadas por dispositivo y dia")
+    parser.add_argument("--out", required=True, help="Directorio de salida")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--device", default=None, help="Exportar solo este device_id")
+    parser.add_argument("--full", action="store_true", help="Ignorar la marca de agua y exportar todo")
+    parser.add_argument("--compression", default="zstd", help="zstd, snappy, gzip, lz4 o none")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    with session_factory("exporter")() as db:
+        stats = export_partitioned(
+            db,
+            args.out,
+            fmt=args.format,
+            incremental=not args.full,
+            device_id=args.device,
+            compression=args.compression,
+            chunk_rows=args.chunk_rows,
+        )
+    elapsed = time.perf_counter() - t0
+    print(
+        f"[export] {stats['rows']} filas en {stats['files']} archivos "
+        f"(last_id={stats['last_id']}) en {elapsed:.1f}s -> {args.out}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Entrena el modelo de anomalias sin pasar por la API (cron, mantenimiento).
+
+Ejecuta el mismo entrenamiento que ``POST /models/retrain`` en este
+proceso: lee ``measurements`` por bloques, guarda la nueva version en
+``MODEL_DIR`` y la activa (salvo ``--no-activate``). Respeta
+``training.lock``, asi que no se solapa con un entrenamiento lanzado desde
+la API. Solo CPU y sin red.
+
+Ejemplos::
+
+    python scripts/retrain_ml.py
+    python scripts/retrain_ml.py --database-url postgresql+psycopg2://ro@replica/incu --no-activate
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+# Permite ejecutar el script desde backend/ sin instalar el paquete
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.model_store import model_store  # noqa: E402
+from app.settings import settings  # noqa: E402
+from app.training import train  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Entrena y versiona el modelo de anomalias")
+    parser.add_argument("--database-url", default=settings.database_read_url or settings.database_url)
+    parser.add_argument("--chunk-rows", type=int, default=settings.model_train_chunk_rows)
+    parser.add_argument("--val-every", type=int, default=settings.model_val_every)
+    parser.add_argument("--quantile", type=float, default=settings.model_threshold_quantile)
+    parser.add_argument("--no-activate", action="store_true", help="Guardar la version sin activarla")
+    args = parser.parse_args(argv)
+
+    token = model_store.acquire_lock(settings.model_train_timeout_s)
+    if token is None:
+        print("[retrain] ya hay un entrenamiento en curso", file=sys.stderr)
+        return 1
+    t0 = time.perf_counter()
+    try:
+        version = model_store.next_version()
+        meta = train(
+            args.database_url,
+            model_store.root,
+            model_store.name,
+            version,
+            chunk_rows=args.chunk_rows,
+            val_every=args.val_every,
+            quantile=args.quantile,
+            activate=not args.no_activate,
+        )
+    except ValueError as exc:
+        print(f"[retrain] {exc}", file=sys.stderr)
+        return 1
+    finally:
+        model_store.release_lock(token)
+    m = meta["metrics"]
+    print(
+        f"[retrain] {version} ({meta['algo']}) con {meta['samples']['train']} ventanas "
+        f"en {time.perf_counter() - t0:.1f}s: umbral={m['threshold']:.3f} "
+        f"anomalias_val={m['val_anomaly_rate']:.2%} -> {model_store.path}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
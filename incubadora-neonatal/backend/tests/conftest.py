@@ -7,6 +7,7 @@ y ajusta 'sys.path' para que Python encuentre el paquete local 'app'.
 
 import os
 import sys
+import uuid
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -19,7 +20,13 @@ if BASE_DIR not in sys.path:
 
 from app.main import app  # importa la FastAPI del proyecto
 from app.db import get_db
+from app.deps import get_read_db
 from app.models import Base
+from app.rules import rule_engine
+from app.principals import principal_cache
+from app.api_keys import api_keys
+from app.inference import scorer
+from app.feature_store import feature_store
 
 # Crea una base de datos SQLite temporal para las pruebas
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -44,6 +51,15 @@ def override_get_db():
 
 # Aplica la sobrecarga en la aplicacion
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+
+# Los temporizadores del motor de reglas abren sus propias sesiones
+rule_engine.session_factory = TestingSessionLocal
+# El indice de claves de API se carga con su propia sesion
+api_keys.session_factory = TestingSessionLocal
+# El scorer de anomalias escribe las puntuaciones con su propia sesion
+scorer.session_factory = TestingSessionLocal
+feature_store.session_factory = TestingSessionLocal
 
 @pytest.fixture(scope="module")
 def client():
@@ -52,3 +68,34 @@ def client():
     """
     with TestClient(app) as c:
         yield c
+
+@pytest.fixture
+def auth_headers(client):
+    """
+    Registra un usuario nuevo, inicia sesion y devuelve los headers
+    'Authorization' listos para usar en rutas protegidas.
+    """
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    client.post(
+        "/incubadora/auth/register",
+        json={"username": name, "email": f"{name}@test.local", "password": "secret"},
+    )
+    r = client.post("/incubadora/auth/login", data={"username": name, "password": "secret"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.fixture
+def admin_headers(client, auth_headers):
+    """Como 'auth_headers' pero el usuario se promueve a administrador en la BD."""
+    from jose import jwt
+    from app.auth import ALGORITHM, SECRET_KEY
+    from app.models import User
+
+    token = auth_headers["Authorization"].split()[1]
+    username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["sub"]
+    with TestingSessionLocal() as db:
+        db.query(User).filter(User.username == username).update({"is_admin": True})
+        db.commit()
+    # Cambio directo en la BD: invalidar el cache de principales como haria la API
+    principal_cache.invalidate(username)
+    return auth_headers
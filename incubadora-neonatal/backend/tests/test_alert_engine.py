@@ -0,0 +1,71 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.alert_engine import AlertEngine
+from tests.conftest import TestingSessionLocal
+
+
+def _ingest(client, device, ts, **fields):
+    r = client.post("/incubadora/ingest", json={"device_id": device, "ts": ts.isoformat(), **fields})
+    assert r.status_code == 200
+    return r.json()["id"]
+
+
+def test_ingest_opens_and_closes_episodes(client, auth_headers):
+    """
+    Solo los cambios de bit escriben en alert_events; al cerrarse el
+    episodio se guardan fin, duracion, muestras y extremos.
+    """
+    device = f"al-{uuid.uuid4().hex[:8]}"
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    masks_temps = [(0, 36.5), (1, 38.0), (1, 39.5), (5, 38.5), (4, 37.0), (0, 36.8)]
+    for i, (mask, temp) in enumerate(masks_temps):
+        _ingest(client, device, t0 + timedelta(seconds=10 * i), alerts=mask, temp_aire_c=temp, humedad=80 - i)
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+
+    r = client.get(f"/incubadora/alerts?device_id={device}", headers=auth_headers)
+    assert r.status_code == 200
+    episodes = {e["mask"]: e for e in r.json()}
+    assert set(episodes) == {1, 4}
+
+    over = episodes[1]
+    assert over["labels"] == ["Sobretemperatura"]
+    assert over["active"] is False
+    assert over["duration_s"] == 30.0
+    assert over["samples"] == 3
+    assert over["max_temp_aire_c"] == 39.5
+
+    hum = episodes[4]
+    assert hum["duration_s"] == 20.0
+    assert hum["min_humedad"] == 76.0
+
+
+def test_open_episode_is_listed_as_active(client, auth_headers):
+    device = f"al-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, datetime.now(timezone.utc), alerts=16, peso_g=900)
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+
+    r = client.get(f"/incubadora/alerts?device_id={device}&active=true", headers=auth_headers)
+    assert [(e["mask"], e["active"]) for e in r.json()] == [(16, True)]
+
+
+def test_alerts_only_for_owned_devices(client, auth_headers):
+    device = f"al-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, datetime.now(timezone.utc), alerts=1)
+    r = client.get(f"/incubadora/alerts?device_id={device}", headers=auth_headers)
+    assert r.json() == []
+
+
+def test_engine_rebuilds_state_from_open_episodes():
+    """Un motor sin estado (reinicio, otro worker) no duplica episodios abiertos."""
+    device = f"al-{uuid.uuid4().hex[:8]}"
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with TestingSessionLocal() as db:
+        for i, mask in enumerate((2, 2)):
+            row = models.Measurement(device_id=device, ts=ts + timedelta(seconds=i), alerts=mask)
+            db.add(row)
+            db.commit()
+            AlertEngine().process(db, row)  # motor nuevo en cada muestra
+        open_events = db.query(models.AlertEvent).filter(models.AlertEvent.device_id == device).all()
+        assert [(e.bit, e.ended_at) for e in open_events] == [(2, None)]
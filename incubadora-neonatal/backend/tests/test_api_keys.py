@@ -0,0 +1,76 @@
+import uuid
+
+from app.api_keys import api_keys
+from app.settings import settings
+
+
+def _linked_device(client, headers):
+    device = f"key-{uuid.uuid4().hex[:8]}"
+    client.post(f"/incubadora/devices/{device}/link", headers=headers)
+    return device
+
+
+def test_key_binds_device_id(client, auth_headers):
+    device = _linked_device(client, auth_headers)
+    r = client.post(f"/incubadora/devices/{device}/api-key", headers=auth_headers)
+    assert r.status_code == 200
+    key = {"X-API-Key": r.json()["api_key"]}
+
+    # Sin device_id en el cuerpo: lo pone la clave (antes caia en "esp32")
+    r = client.post("/incubadora/ingest", json={"temp_aire_c": 36.6}, headers=key)
+    assert r.status_code == 200
+    r = client.get("/incubadora/query/latest", params={"device_id": device}, headers=auth_headers)
+    assert r.json()["temp_aire_c"] == 36.6
+
+    r = client.post("/incubadora/ingest", json={"device_id": "otro", "temp_aire_c": 1}, headers=key)
+    assert r.status_code == 403
+
+    devices = client.get("/incubadora/devices/my-devices", headers=auth_headers).json()
+    assert [d["api_key_rotated_at"] is not None for d in devices if d["device_id"] == device] == [True]
+
+
+def test_keyless_ingest_to_keyed_device_rejected(client, auth_headers):
+    """Sin cabecera no se aceptan muestras a nombre de un dispositivo con clave."""
+    device = _linked_device(client, auth_headers)
+    assert client.post("/incubadora/ingest", json={"device_id": device}).status_code == 200
+
+    key = client.post(f"/incubadora/devices/{device}/api-key", headers=auth_headers).json()["api_key"]
+    r = client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 99})
+    assert r.status_code == 401
+    assert api_keys.has_key(device)
+    # tras rotar sigue exigiendo clave
+    client.post(f"/incubadora/devices/{device}/api-key", headers=auth_headers)
+    assert client.post("/incubadora/ingest", json={"device_id": device}).status_code == 401
+    assert client.post("/incubadora/ingest", json={"device_id": device}, headers={"X-API-Key": key}).status_code == 401
+
+
+def test_rotation_and_revocation_invalidate_cache(client, auth_headers):
+    device = _linked_device(client, auth_headers)
+    old = client.post(f"/incubadora/devices/{device}/api-key", headers=auth_headers).json()["api_key"]
+    assert client.post("/incubadora/ingest", json={}, headers={"X-API-Key": old}).status_code == 200
+
+    new = client.post(f"/incubadora/devices/{device}/api-key", headers=auth_headers).json()["api_key"]
+    assert client.post("/incubadora/ingest", json={}, headers={"X-API-Key": old}).status_code == 401
+    assert client.post("/incubadora/ingest", json={}, headers={"X-API-Key": new}).status_code == 200
+
+    client.delete(f"/incubadora/devices/{device}/api-key", headers=auth_headers)
+    assert client.post("/incubadora/ingest", json={}, headers={"X-API-Key": new}).status_code == 401
+
+
+def test_verification_does_not_query_between_rotations(client, auth_headers):
+    device = _linked_device(client, auth_headers)
+    key = client.post(f"/incubadora/devices/{device}/api-key", headers=auth_headers).json()["api_key"]
+    assert api_keys.lookup(key) == device
+    reloads = api_keys.stats()["reloads"]
+    for _ in range(5):
+        assert api_keys.lookup(key) == device
+    assert api_keys.lookup("no-es-una-clave") is None
+    assert api_keys.stats()["reloads"] == reloads
+
+
+def test_required_key(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_require_api_key", True)
+    r = client.post("/incubadora/ingest", json={"device_id": "sin-clave"})
+    assert r.status_code == 401
+    r = client.post(f"/incubadora/devices/not-mine-{uuid.uuid4().hex[:6]}/api-key", headers=auth_headers)
+    assert r.status_code == 404
@@ -0,0 +1,68 @@
+import uuid
+
+from app.principals import PrincipalCache
+
+
+def _user(client):
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    r = client.post(
+        "/incubadora/auth/register",
+        json={"username": name, "email": f"{name}@test.local", "password": "secret"},
+    )
+    token = client.post("/incubadora/auth/login", data={"username": name, "password": "secret"}).json()["access_token"]
+    return r.json()["id"], {"Authorization": f"Bearer {token}"}
+
+
+def test_principal_cache_generation_and_lru():
+    cache = PrincipalCache(None, ttl=60, max_entries=2)
+    loads = []
+
+    def loader(name):
+        return lambda: loads.append(name) or {"username": name}
+
+    cache.resolve("a", loader("a"))
+    cache.resolve("a", loader("a"))
+    assert loads == ["a"] and cache.hits == 1
+
+    cache.invalidate("a")
+    cache.resolve("a", loader("a"))
+    assert loads == ["a", "a"]
+
+    cache.resolve("b", loader("b"))
+    cache.resolve("c", loader("c"))  # expulsa "a"
+    cache.resolve("a", loader("a"))
+    assert loads[-1] == "a" and cache.stats()["entries"] == 2
+    assert cache.resolve("nadie", lambda: None) is None
+
+
+def test_repeated_requests_hit_cache(client, admin_headers):
+    before = client.get("/incubadora/auth/cache/stats", headers=admin_headers).json()
+    for _ in range(3):
+        assert client.get("/incubadora/auth/me", headers=admin_headers).status_code == 200
+    after = client.get("/incubadora/auth/cache/stats", headers=admin_headers).json()
+    assert after["hits"] - before["hits"] >= 3
+
+
+def test_deactivated_user_is_cut_off_immediately(client, admin_headers):
+    user_id, headers = _user(client)
+    assert client.get("/incubadora/auth/me", headers=headers).status_code == 200
+
+    r = client.patch(f"/incubadora/auth/users/{user_id}/toggle-active", headers=admin_headers)
+    assert r.json()["is_active"] is False
+    assert client.get("/incubadora/auth/me", headers=headers).status_code == 400
+
+    client.patch(f"/incubadora/auth/users/{user_id}/toggle-active", headers=admin_headers)
+    assert client.get("/incubadora/auth/me", headers=headers).status_code == 200
+
+    client.delete(f"/incubadora/auth/users/{user_id}", headers=admin_headers)
+    assert client.get("/incubadora/auth/me", headers=headers).status_code == 401
+
+
+def test_rename_via_me_invalidates_old_subject(client):
+    _, headers = _user(client)
+    assert client.get("/incubadora/auth/me", headers=headers).status_code == 200
+    new_name = f"renamed-{uuid.uuid4().hex[:8]}"
+    r = client.put("/incubadora/auth/me", headers=headers, json={"username": new_name})
+    assert r.status_code == 200 and r.json()["username"] == new_name
+    # El token sigue apuntando al nombre anterior
+    assert client.get("/incubadora/auth/me", headers=headers).status_code == 401
@@ -0,0 +1,55 @@
+import time
+import uuid
+
+from app.cache import MemoryBackend, QueryCache
+
+
+def test_memory_backend_lru_and_ttl():
+    """El backend en memoria respeta el limite de entradas y el TTL."""
+    b = MemoryBackend(max_entries=2)
+    b.set("a", b"1", ttl=60)
+    b.set("b", b"2", ttl=60)
+    assert b.get("a") == b"1"      # "a" pasa a ser la mas reciente
+    b.set("c", b"3", ttl=60)       # expulsa "b"
+    assert b.get("b") is None
+    assert b.get("a") == b"1" and b.get("c") == b"3"
+
+    b.set("short", b"x", ttl=0.01)
+    time.sleep(0.02)
+    assert b.get("short") is None
+
+
+def test_query_cache_device_invalidation():
+    """Invalidar un dispositivo cambia la clave y fuerza una recarga."""
+    cache = QueryCache(MemoryBackend(), ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return b"payload"
+
+    key = cache.key("latest", ["dev-a"])
+    assert cache.get_or_set(key, loader) == b"payload"
+    assert cache.get_or_set(cache.key("latest", ["dev-a"]), loader) == b"payload"
+    assert len(calls) == 1
+
+    cache.invalidate_device("dev-a")
+    cache.get_or_set(cache.key("latest", ["dev-a"]), loader)
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_latest_sees_new_ingest(client, auth_headers):
+    """Tras una ingesta, /query/latest no devuelve el valor cacheado anterior."""
+    device = f"cache-{uuid.uuid4().hex[:8]}"
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 30})
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+
+    params = {"device_id": device}
+    first = client.get("/incubadora/query/latest", params=params, headers=auth_headers).json()
+    again = client.get("/incubadora/query/latest", params=params, headers=auth_headers).json()
+    assert first == again
+
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 31})
+    fresh = client.get("/incubadora/query/latest", params=params, headers=auth_headers).json()
+    assert fresh["temp_aire_c"] == 31
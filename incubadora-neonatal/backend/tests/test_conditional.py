@@ -0,0 +1,52 @@
+import uuid
+
+
+def test_latest_etag_304(client, auth_headers):
+    """
+    /query/latest emite ETag y responde 304 a If-None-Match mientras no
+    llegue una medicion nueva.
+    """
+    device = f"etag-{uuid.uuid4().hex[:8]}"
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 30})
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+
+    params = {"device_id": device}
+    r = client.get("/incubadora/query/latest", params=params, headers=auth_headers)
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    assert "last-modified" in r.headers
+
+    r = client.get(
+        "/incubadora/query/latest", params=params,
+        headers={**auth_headers, "If-None-Match": etag},
+    )
+    assert r.status_code == 304
+    assert r.content == b""
+
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 31})
+    r = client.get(
+        "/incubadora/query/latest", params=params,
+        headers={**auth_headers, "If-None-Match": etag},
+    )
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+
+def test_series_etag_depends_on_format(client, auth_headers):
+    """El ETag de /query/series cambia con los parametros de la respuesta."""
+    device = f"etag-{uuid.uuid4().hex[:8]}"
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 30})
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+
+    rows = client.get("/incubadora/query/series", params={"device_id": device}, headers=auth_headers)
+    cols = client.get(
+        "/incubadora/query/series", params={"device_id": device, "format": "columnar"},
+        headers=auth_headers,
+    )
+    assert rows.headers["etag"] != cols.headers["etag"]
+
+    r = client.get(
+        "/incubadora/query/series", params={"device_id": device},
+        headers={**auth_headers, "If-None-Match": rows.headers["etag"]},
+    )
+    assert r.status_code == 304
@@ -0,0 +1,111 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+from app.db import InstrumentedQueuePool, _engines, _metrics, get_engine, make_engine, pool_stats
+from app.models import Measurement
+from app.settings import settings
+from tests.conftest import TestingSessionLocal
+
+
+def test_pool_settings_per_role():
+    assert settings.db_pool("api") == {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_s,
+        "pool_recycle": settings.db_pool_recycle_s,
+    }
+    assert settings.db_pool("collector")["pool_size"] == settings.db_collector_pool_size
+    assert settings.db_pool("exporter")["pool_timeout"] == settings.db_exporter_pool_timeout_s
+
+
+def test_pool_events_count_in_use_overflow_and_timeouts(tmp_path):
+    """Pool de 1 + 1 de overflow: la tercera conexion espera y acaba en timeout."""
+    engine = make_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", "test-pool",
+        poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.05,
+    )
+    metrics = _metrics["test-pool"]
+    try:
+        a = engine.connect()
+        b = engine.connect()
+        a.execute(text("select 1"))
+        stats = metrics.stats(engine.pool)
+        assert stats["in_use"] == 2 and stats["overflow"] == 1
+        assert stats["overflow_checkouts"] == 1 and stats["overflow_peak"] == 1
+
+        with pytest.raises(PoolTimeout):
+            engine.connect()
+        stats = metrics.stats(engine.pool)
+        assert stats["timeouts"] == 1
+        assert stats["wait_max_ms"] >= 50
+
+        a.close()
+        b.close()
+        stats = metrics.stats(engine.pool)
+        assert stats["in_use"] == 0 and stats["in_use_peak"] == 2
+        assert stats["checkouts"] == stats["checkins"] == 2
+
+        engine.dispose()  # el pool nuevo conserva la telemetria
+        with engine.connect():
+            pass
+        assert metrics.stats(engine.pool)["checkouts"] == 3
+    finally:
+        engine.dispose()
+        _metrics.pop("test-pool", None)
+
+
+def test_engines_shared_per_role():
+    assert get_engine("api") is _engines["api"]
+    with pytest.raises(ValueError):
+        get_engine("nope")
+
+
+def test_collector_import_has_no_side_effects():
+    """Importar el colector no crea engine ni tablas; su pool se crea al usarlo."""
+    import app.collector as collector
+    assert not hasattr(collector, "engine")
+    assert collector._Session is None or "collector" in _engines
+
+
+def test_collector_persists_sample(monkeypatch):
+    """El colector crea su sesion en la primera muestra y guarda la medicion."""
+    import app.collector as collector
+
+    url = f"http://esp32-{uuid.uuid4().hex[:8]}.local"
+
+    class _Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"temperatura": 36.2, "humedad": 55, "peso": 2500}
+
+    monkeypatch.setattr(collector.requests, "get", lambda *a, **kw: _Response())
+    monkeypatch.setattr(collector, "session_factory", lambda role: TestingSessionLocal)
+    monkeypatch.setattr(collector, "_Session", None)
+    monkeypatch.setitem(collector._REG, url, {"base_url": url, "last_ok": None, "last_error": None, "last_sample": None})
+
+    collector._fetch_one(url)
+    collector._fetch_one(url)
+    assert collector._REG[url]["last_error"] is None
+    assert collector._Session is TestingSessionLocal
+    with TestingSessionLocal() as db:
+        rows = db.query(Measurement).filter(Measurement.device_id == url).all()
+        assert len(rows) == 2
+        assert rows[0].temp_aire_c == 36.2
+
+
+def test_pool_stats_requires_admin(client, auth_headers):
+    assert client.get("/incubadora/query/pool/stats", headers=auth_headers).status_code == 403
+
+
+def test_pool_stats_endpoint(client, admin_headers):
+    r = client.get("/incubadora/query/pool/stats", headers=admin_headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["pid"] == pool_stats()["pid"]
+    assert body["api"]["role"] == "api"
+    assert {"in_use", "overflow_peak", "timeouts", "wait_p99_ms"} <= set(body["api"])
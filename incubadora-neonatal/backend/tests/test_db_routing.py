@@ -0,0 +1,57 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.cache import MemoryBackend
+from app.db import SessionRouter
+from app.models import Base, Device
+
+
+def _factory(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def test_reads_go_to_replica_until_user_writes(tmp_path):
+    """
+    Con dos bases SQLite (primario y replica atrasada), las lecturas van a la
+    replica salvo justo despues de una escritura del mismo usuario.
+    """
+    primary = _factory(tmp_path / "primary.db")
+    replica = _factory(tmp_path / "replica.db")
+    with primary() as db:
+        db.add(Device(device_id="dev-rw", user_id=1))
+        db.commit()
+
+    router = SessionRouter(primary, replica, sticky_seconds=60)
+
+    def visible():
+        with router.session_for(1) as db:
+            return db.query(Device).filter(Device.device_id == "dev-rw").first() is not None
+
+    assert visible() is False          # la replica aun no tiene el dispositivo
+    router.mark_write(1)
+    assert visible() is True           # read-your-writes: primario
+    with router.session_for(2) as db:  # otros usuarios siguen en la replica
+        assert db.get_bind().url.database.endswith("replica.db")
+
+
+def test_sticky_mark_shared_through_store(tmp_path):
+    """Con un store compartido, la marca la ve cualquier otro router (worker)."""
+    primary = _factory(tmp_path / "p.db")
+    replica = _factory(tmp_path / "r.db")
+    store = MemoryBackend()
+    worker_a = SessionRouter(primary, replica, store=store)
+    worker_b = SessionRouter(primary, replica, store=store)
+
+    worker_a.mark_write(7)
+    with worker_b.session_for(7) as db:
+        assert db.get_bind().url.database.endswith("p.db")
+
+
+def test_without_replica_everything_uses_primary(tmp_path):
+    primary = _factory(tmp_path / "only.db")
+    router = SessionRouter(primary, primary)
+    assert router.has_replica is False
+    with router.session_for(1) as db:
+        assert db.get_bind().url.database.endswith("only.db")
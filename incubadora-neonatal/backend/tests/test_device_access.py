@@ -0,0 +1,56 @@
+import uuid
+
+from app.cache import MemoryBackend
+from app.device_access import DeviceAccessCache
+from app.models import Device, User
+from tests.conftest import TestingSessionLocal
+
+
+def _user_with_device():
+    name = f"da-{uuid.uuid4().hex[:8]}"
+    with TestingSessionLocal() as db:
+        user = User(username=name, email=f"{name}@test.local", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(Device(device_id=f"{name}-dev", user_id=user.id))
+        db.commit()
+        return user.id, f"{name}-dev"
+
+
+def test_version_counter_invalidates_other_workers():
+    shared = MemoryBackend()
+    worker_a, worker_b = DeviceAccessCache(shared), DeviceAccessCache(shared)
+    user_id, device = _user_with_device()
+
+    with TestingSessionLocal() as db:
+        assert worker_a.owns(db, user_id, [device])
+        assert worker_b.owns(db, user_id, [device])
+        assert worker_b.owns(db, user_id, [device]) and worker_b.hits == 1
+
+        # El worker A desvincula: aplica el cambio en su entrada y sube la version
+        db.query(Device).filter(Device.device_id == device).update({"user_id": None})
+        db.commit()
+        worker_a.set_device(user_id, device, linked=False)
+        assert worker_a.devices(db, user_id) == {} and worker_a.misses == 1
+
+        # El worker B ve otra version y recarga
+        assert not worker_b.owns(db, user_id, [device])
+        assert worker_b.misses == 2
+
+
+def test_link_and_unlink_update_ownership(client, auth_headers):
+    device = f"da-{uuid.uuid4().hex[:8]}"
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 36.5})
+    params = {"device_id": device}
+
+    assert client.get("/incubadora/query/latest", params=params, headers=auth_headers).status_code == 403
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+    assert client.get("/incubadora/query/latest", params=params, headers=auth_headers).status_code == 200
+
+    client.patch(f"/incubadora/devices/{device}", headers=auth_headers, json={"name": "Cuna 4"})
+    rows = client.get("/incubadora/query/devices", headers=auth_headers).json()
+    assert [r["name"] for r in rows if r["id"] == device] == ["Cuna 4"]
+
+    client.post(f"/incubadora/devices/{device}/unlink", headers=auth_headers)
+    assert client.get("/incubadora/query/latest", params=params, headers=auth_headers).status_code == 403
+    assert client.get("/incubadora/query/series", params=params, headers=auth_headers).status_code == 403
@@ -0,0 +1,96 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.feature_store import feature_store
+from app.models import DeviceFeatures, Measurement
+from tests.conftest import TestingSessionLocal
+
+
+def _ingest(client, device, n, step_s=60):
+    t0 = datetime.now(timezone.utc) - timedelta(seconds=step_s * n)
+    for i in range(n):
+        r = client.post("/incubadora/ingest", json={
+            "device_id": device, "ts": (t0 + timedelta(seconds=step_s * i)).isoformat(),
+            # aire sube 0.2 por minuto; humedad constante
+            "temp_aire_c": 36.0 + 0.2 * i, "humedad": 55.0,
+        })
+        assert r.status_code == 200
+
+
+def test_features_endpoint(client, auth_headers):
+    device = f"feat-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 5)
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+    assert feature_store.snapshot() >= 3
+
+    r = client.get("/incubadora/query/features", params={"device_id": device}, headers=auth_headers)
+    assert r.status_code == 200
+    [body] = r.json()
+    assert body["device_id"] == device
+    assert [w["window_min"] for w in body["windows"]] == [5, 15, 60]
+
+    five = body["windows"][0]
+    assert five["samples"] == 5
+    air = five["variables"]["temp_aire_c"]
+    assert air["mean"] == pytest.approx(36.4)
+    assert air["slope"] == pytest.approx(0.2)
+    assert five["variables"]["humedad"]["var"] == pytest.approx(0.0)
+    # sin muestras de piel no hay estadisticos
+    assert five["variables"]["temp_piel_c"]["mean"] is None
+
+
+def test_snapshot_only_dirty_devices(client):
+    device = f"feat-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 3)
+    feature_store.snapshot()
+    assert feature_store.snapshot() == 0
+
+    _ingest(client, device, 1)
+    assert feature_store.snapshot() == 3
+    with TestingSessionLocal() as db:
+        rows = db.query(DeviceFeatures).filter(DeviceFeatures.device_id == device).all()
+        assert len(rows) == 3
+        assert {r.samples for r in rows if r.window_s == 3600} == {4}
+
+
+def test_warm_up_from_history(client):
+    """Un worker que no conoce el dispositivo parte de sus ultimos 60 minutos."""
+    device = f"feat-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 4)
+    feature_store._devices.pop(device, None)
+    _ingest(client, device, 1)
+    x = feature_store.vector(device)
+    assert x is not None
+    feature_store.snapshot()
+    with TestingSessionLocal() as db:
+        row = db.get(DeviceFeatures, (device, 3600))
+        assert row.samples == 5
+
+
+def test_features_requires_linked_device(client, auth_headers):
+    r = client.get("/incubadora/query/features", params={"device_id": "not-mine"}, headers=auth_headers)
+    assert r.status_code == 403
+
+
+def test_catches_up_rows_from_other_workers(client):
+    """Las muestras que recibio otro worker entran en las ventanas antes de la siguiente."""
+    device = f"feat-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 3)
+    with TestingSessionLocal() as db:  # como si las hubiera ingerido otro worker
+        db.add_all(Measurement(device_id=device, ts=datetime.now(timezone.utc), temp_aire_c=37.0, humedad=55.0)
+                   for _ in range(2))
+        db.commit()
+    caught_up = feature_store.caught_up
+    r = client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 37.0, "humedad": 55.0})
+    assert r.status_code == 200
+    assert feature_store.caught_up == caught_up + 2
+    dev = feature_store._devices[device]
+    assert len(dev.windows[-1].buf) == 6
+    assert dev.last_id == r.json()["id"]
+
+    # una fila ya aplicada no se cuenta dos veces
+    with TestingSessionLocal() as db:
+        feature_store.update(db.get(Measurement, r.json()["id"]), db)
+    assert len(dev.windows[-1].buf) == 6
@@ -0,0 +1,95 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from app.hashing import HashPool, HashPoolBroken, HashPoolSaturated, hash_pool
+
+
+def test_inline_pool_hashes_and_verifies():
+    pool = HashPool(workers=0)
+    hashed = pool.hash("secret")
+    assert pool.verify("secret", hashed) and not pool.verify("otra", hashed)
+
+
+def test_saturated_pool_rejects_without_waiting():
+    pool = HashPool(workers=1, max_queue=0)
+    try:
+        busy = threading.Thread(target=pool._run, args=(time.sleep, 1.0))
+        busy.start()
+        time.sleep(0.05)
+        t0 = time.monotonic()
+        with pytest.raises(HashPoolSaturated):
+            pool.hash("secret")
+        assert time.monotonic() - t0 < 0.1
+        busy.join()
+        assert pool.verify("secret", pool.hash("secret"))
+        assert pool.stats()["rejected"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_pool_counts_failures_and_timeouts_apart():
+    pool = HashPool(workers=1, max_queue=1, timeout_s=0.5)
+    try:
+        assert pool.verify("secret", pool.hash("secret"))  # arranca el proceso
+        with pytest.raises(ValueError):
+            pool._run(int, "x")
+        with pytest.raises(TimeoutError):
+            pool._run(time.sleep, 2.0)
+        # en cola tras la anterior: vence y se cancela sin ejecutarse
+        with pytest.raises(TimeoutError):
+            pool._run(time.sleep, 0.0)
+        stats = pool.stats()
+        assert (stats["completed"], stats["failed"], stats["timeouts"]) == (2, 1, 2)
+        assert stats["in_flight"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_broken_pool_is_replaced():
+    """Si un proceso del pool muere, la llamada falla con HashPoolBroken y la siguiente usa un pool nuevo."""
+    pool = HashPool(workers=1, max_queue=1, timeout_s=10.0)
+    try:
+        hashed = pool.hash("secret")
+        broken = pool._executor
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        with pytest.raises(HashPoolBroken):
+            pool.verify("secret", hashed)
+        assert pool.verify("secret", hashed)
+        assert pool._executor is not broken
+        stats = pool.stats()
+        assert stats["restarts"] == 1 and stats["failed"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_login_returns_503_when_pool_is_broken(client, monkeypatch):
+    client.post(
+        "/incubadora/auth/register",
+        json={"username": "hash-broken", "email": "hash-broken@test.local", "password": "secret"},
+    )
+
+    def broken(*args):
+        raise HashPoolBroken()
+
+    monkeypatch.setattr(hash_pool, "_run", broken)
+    r = client.post("/incubadora/auth/login", data={"username": "hash-broken", "password": "secret"})
+    assert r.status_code == 503
+
+
+def test_login_returns_503_when_pool_is_full(client, monkeypatch):
+    client.post(
+        "/incubadora/auth/register",
+        json={"username": "hash-busy", "email": "hash-busy@test.local", "password": "secret"},
+    )
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(hash_pool, "workers", max(hash_pool.workers, 1))
+    monkeypatch.setattr(hash_pool, "_slots", slots)
+    r = client.post("/incubadora/auth/login", data={"username": "hash-busy", "password": "secret"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
@@ -0,0 +1,185 @@
+import os
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from app.feature_store import feature_store
+from app.inference import _Item, scorer
+from app.ml_features import DeviceWindows
+from app.model_store import model_store
+from app.models import Measurement
+from app.training import train
+from tests.conftest import TestingSessionLocal, engine
+from tests.test_training import _seed
+
+
+@pytest.fixture
+def trained(tmp_path, monkeypatch):
+    """Modelo v0.0.1 activo en un directorio temporal y scorer sin modelo cargado."""
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    monkeypatch.setattr(scorer.handle, "_model", None)
+    monkeypatch.setattr(scorer.handle, "_checked", 0.0)
+    monkeypatch.setattr(scorer.handle, "reload_s", 0.0)
+    monkeypatch.setattr(scorer.handle, "_rejected", None)
+    feature_store._devices.clear()
+    _seed()
+    url = engine.url.render_as_string(hide_password=False)
+    train(url, model_store.root, model_store.name, "v0.0.1")
+    yield url
+
+
+def _ingest(client, device, n, temp=36.0):
+    for i in range(n):
+        r = client.post(
+            "/incubadora/ingest",
+            json={"device_id": device, "temp_aire_c": temp + 0.01 * i, "temp_piel_c": 36.5, "humedad": 55},
+        )
+        assert r.status_code == 200
+    assert scorer.flush()
+
+
+def _scores(device):
+    with TestingSessionLocal() as db:
+        rows = db.query(Measurement).filter(Measurement.device_id == device).order_by(Measurement.id)
+        return [r.anomaly_score for r in rows]
+
+
+def test_ingest_scores_rows(client, admin_headers, trained):
+    device = f"inf-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 6)
+
+    scores = _scores(device)
+    # con una sola muestra no hay varianza ni pendiente
+    assert scores[0] is None
+    assert all(s is not None and s >= 0 for s in scores[1:])
+
+    inf = client.get("/incubadora/models/status", headers=admin_headers).json()["inference"]
+    assert inf["model_version"] == "v0.0.1"
+    assert inf["scored"] >= 3
+    assert inf["latency_p99_ms"] >= inf["latency_p50_ms"] > 0
+    assert inf["throughput_per_s"] > 0
+
+
+def test_scores_without_skin_temperature(client, trained):
+    """Sin ``temp_piel_c`` (colector, modo aire) se puntua con aire y humedad."""
+    device = f"inf-{uuid.uuid4().hex[:8]}"
+    for i in range(4):
+        r = client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 36.0 + 0.01 * i, "humedad": 55})
+        assert r.status_code == 200
+    assert scorer.flush()
+    scores = _scores(device)
+    assert scores[0] is None
+    assert all(s is not None and s >= 0 for s in scores[1:])
+
+
+def test_window_warms_from_history(client, trained):
+    """Un dispositivo con historial se puntua desde su primera muestra en este worker."""
+    device = f"inf-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 5)
+    feature_store._devices.clear()  # como un worker recien arrancado
+    warmups = feature_store.warmups
+    _ingest(client, device, 1)
+    assert feature_store.warmups == warmups + 1
+    assert _scores(device)[-1] is not None
+
+
+def test_hot_swap(client, admin_headers, trained):
+    device = f"inf-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 4)
+    swaps = scorer.handle.swaps
+
+    train(trained, model_store.root, model_store.name, "v0.0.2")
+    _ingest(client, device, 1)
+
+    assert scorer.handle.swaps == swaps + 1
+    inf = client.get("/incubadora/models/status", headers=admin_headers).json()["inference"]
+    assert inf["model_version"] == "v0.0.2"
+    assert _scores(device)[-1] is not None
+
+
+def test_micro_batch_across_devices(trained):
+    """Un lote con muestras de varios dispositivos se puntua y guarda de una vez."""
+    devices = [f"inf-{uuid.uuid4().hex[:8]}" for _ in range(3)]
+    windows = {d: DeviceWindows() for d in devices}
+    now = time.time()
+    with TestingSessionLocal() as db:
+        rows = [
+            Measurement(device_id=d, temp_aire_c=36.0 + i * 0.01, temp_piel_c=36.5, humedad=55.0)
+            for i in range(4) for d in devices
+        ]
+        db.add_all(rows)
+        db.commit()
+        items = []
+        for r in rows:
+            windows[r.device_id].update(now + r.id, (r.temp_aire_c, r.temp_piel_c, r.humedad), r.id)
+            items.append(_Item(r.id, r.device_id, windows[r.device_id].vector(), time.perf_counter()))
+    batches, unscored = scorer.batches, scorer.unscored
+    assert scorer.process(items) == 9  # todas menos la primera de cada dispositivo
+    assert scorer.batches == batches + 1
+    assert scorer.unscored == unscored + 3
+    for d in devices:
+        assert _scores(d)[-1] is not None
+
+
+def test_no_model_leaves_rows_unscored(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    monkeypatch.setattr(scorer.handle, "_model", None)
+    monkeypatch.setattr(scorer.handle, "_checked", 0.0)
+    unscored = scorer.unscored
+
+    device = f"inf-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 2)
+    assert _scores(device) == [None, None]
+    assert scorer.unscored == unscored + 2
+
+
+def test_model_with_other_features_is_ignored(tmp_path, monkeypatch):
+    """Una version entrenada con otras features no se carga (hay que reentrenar)."""
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    monkeypatch.setattr(scorer.handle, "_model", None)
+    monkeypatch.setattr(scorer.handle, "_checked", 0.0)
+    monkeypatch.setattr(scorer.handle, "reload_s", 0.0)
+    monkeypatch.setattr(scorer.handle, "_rejected", None)
+    params = {"mean": np.zeros(2), "scale": np.ones(2), "precision": np.eye(2), "threshold": np.array(1.0)}
+    model_store.save("v0.0.1", params, {"version": "v0.0.1", "features": ["a", "b"]})
+    model_store.activate("v0.0.1")
+    assert scorer.handle.get() is None
+
+
+def test_params_are_memory_mapped(client, admin_headers, trained):
+    """Cada parametro es un .npy mapeado en solo lectura, cargado en el primer lote."""
+    assert scorer.handle.model is None  # nada cargado hasta que hay que puntuar
+    params, _ = model_store.load("v0.0.1")
+    assert all(isinstance(a, np.memmap) and not a.flags.writeable for a in params.values())
+
+    device = f"inf-{uuid.uuid4().hex[:8]}"
+    _ingest(client, device, 2)
+    body = client.get("/incubadora/models/status", headers=admin_headers).json()
+    assert body["inference"]["model_mmap"] is True
+    assert body["inference"]["model_mapped_bytes"] > 0
+    [worker] = [w for w in body["workers"] if w["pid"] == body["inference"]["pid"]]
+    assert worker["version"] == "v0.0.1" and worker["mmap"] is True
+
+
+def test_legacy_npz_version_loads(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    base = tmp_path / model_store.name / "v0.0.1"
+    base.mkdir(parents=True)
+    np.savez(base / "params.npz", mean=np.zeros(2), threshold=np.array(1.0))
+    (base / "meta.json").write_text('{"version": "v0.0.1"}')
+    params, meta = model_store.load("v0.0.1")
+    assert params["mean"].tolist() == [0.0, 0.0] and meta["version"] == "v0.0.1"
+
+
+def test_dead_workers_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    model_store.register_worker(version="v0.0.1", mmap=True, mapped_bytes=10)
+    monkeypatch.setattr("os.getpid", lambda: 2**22 + 12345)  # pid que no existe
+    model_store.register_worker(version="v0.0.1", mmap=True, mapped_bytes=10)
+    monkeypatch.undo()
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    assert [w["pid"] for w in model_store.workers()] == [os.getpid()]
+    model_store.unregister_worker()
+    assert model_store.workers() == []
@@ -1,3 +1,9 @@
+import asyncio
+import importlib
+
+ingest_router = importlib.import_module("app.routers.ingest")
+
+
 def test_ingest_aliases(client):
     """
     Comprueba que el endpoint /ingest acepta tanto los nombres antiguos
@@ -31,3 +37,21 @@ def test_ingest_aliases(client):
     r = client.post("/api/incubadora/ingest", json=payload_new)
     assert r.status_code == 200
     assert r.json()["ok"] is True
+
+
+def test_ingest_pipeline_runs_off_event_loop(client, monkeypatch):
+    """El guardado y ``after_insert`` no bloquean el bucle de eventos."""
+    loops = []
+    after_insert = ingest_router.after_insert
+
+    def spy(row, db=None):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        after_insert(row, db)
+
+    monkeypatch.setattr(ingest_router, "after_insert", spy)
+    r = client.post("/incubadora/ingest", json={"device_id": "esp32-loop", "temp_aire_c": 36.0})
+    assert r.status_code == 200
+    assert loops == [None]
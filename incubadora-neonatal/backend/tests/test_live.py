@@ -0,0 +1,141 @@
+import asyncio
+import importlib
+import threading
+import uuid
+
+from app.live import Broker, sse_frame
+from app.routers.stream import _backlog, _db_replay
+from tests.conftest import TestingSessionLocal
+
+
+def _event(device, i):
+    return {"id": i, "device_id": device, "temp_aire_c": 30.0 + i}
+
+
+def test_broker_filters_by_device_and_drops_oldest():
+    """
+    Cada suscriptor recibe solo sus dispositivos y, si no consume, la cola
+    acotada conserva los eventos mas recientes.
+    """
+    async def scenario():
+        broker = Broker(queue_size=3)
+        sub = broker.subscribe(["a"])
+        for i in range(5):
+            broker.publish(_event("a", i))
+        broker.publish(_event("b", 99))
+
+        got = [await sub.get(timeout=0.1) for _ in range(3)]
+        assert [e["id"] for e in got] == [2, 3, 4]
+        assert sub.dropped == 2
+        assert await sub.get(timeout=0.01) is None
+
+        broker.unsubscribe(sub)
+        assert broker.stats()["subscribers"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_broker_publish_from_thread():
+    """El colector publica desde otro hilo; el evento llega al loop del suscriptor."""
+    async def scenario():
+        broker = Broker()
+        sub = broker.subscribe(["dev"])
+        t = threading.Thread(target=broker.publish, args=(_event("dev", 1),))
+        t.start()
+        t.join()
+        event = await sub.get(timeout=1)
+        assert event["id"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_sse_frame_has_event_id():
+    frame = sse_frame(_event("dev", 42))
+    assert frame.startswith("id: 42\nevent: measurement\ndata: {")
+    assert frame.endswith("\n\n")
+
+
+def test_stream_requires_token(client):
+    r = client.get("/incubadora/stream")
+    assert r.status_code == 401
+
+
+def test_broker_replay_from_ring_buffer():
+    """El hueco tras ``Last-Event-ID`` se reenvia desde el buffer si lo cubre."""
+    broker = Broker(replay_size=3)
+    broker.mark_covered(0)
+    for i in range(1, 4):
+        broker.publish(_event("a", i))
+    broker.publish(_event("b", 10))
+
+    events, missing = broker.replay(["a", "b"], 1)
+    assert [e["id"] for e in events] == [2, 3, 10]
+    assert missing == set()
+
+
+def test_broker_replay_reports_gap_beyond_buffer():
+    broker = Broker(replay_size=2)
+    for i in range(1, 5):  # se expulsan 1 y 2
+        broker.publish(_event("a", i))
+
+    events, missing = broker.replay(["a"], 2)
+    assert [e["id"] for e in events] == [3, 4]
+    assert broker.replay(["a"], 1) == ([], {"a"})
+    # Sin marca de cobertura no se sabe que paso antes de arrancar
+    assert broker.replay(["c"], 1) == ([], {"c"})
+
+
+def test_db_replay_fallback(client, auth_headers):
+    device = f"rp-{uuid.uuid4().hex[:8]}"
+    ids = [client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 30 + i}).json()["id"]
+           for i in range(3)]
+    with TestingSessionLocal() as db:
+        events = _db_replay(db, {device}, ids[0], limit=10)
+        assert [e["id"] for e in events] == ids[1:]
+        assert _db_replay(db, {device}, 0, limit=2) is None
+
+
+def test_backlog_replays_overlap_for_late_commits(monkeypatch):
+    """Una fila de id menor confirmada tarde se reenvia aunque el cliente ya viera una mayor."""
+    stream = importlib.import_module("app.routers.stream")
+    broker = Broker(replay_size=10)
+    broker.mark_covered(0)
+    monkeypatch.setattr(stream, "broker", broker)
+    monkeypatch.setattr(stream.settings, "live_replay_overlap_ids", 5)
+    broker.publish(_event("a", 1))
+    broker.publish(_event("a", 3))  # el cliente llega a ver 3...
+    broker.publish(_event("a", 2))  # ...y 2 se confirma despues
+
+    events, reset = _backlog(None, {"a"}, 3)
+    assert not reset
+    # Al menos una vez: 2 llega y el resto son duplicados que descarta el cliente
+    assert [e["id"] for e in events] == [1, 2, 3]
+
+    monkeypatch.setattr(stream.settings, "live_replay_overlap_ids", 0)
+    assert _backlog(None, {"a"}, 3) == ([], False)
+
+
+def test_conflating_subscription_keeps_latest_per_device():
+    """Con max_rate solo se entrega el ultimo valor de cada dispositivo por lote."""
+    async def scenario():
+        broker = Broker()
+        sub = broker.subscribe(["a", "b"], max_rate=20)
+        for i in range(1, 6):
+            broker.publish(_event("a", i))
+        broker.publish(_event("b", 6))
+
+        batch = await sub.get_batch(timeout=0.1)
+        assert [(e["device_id"], e["id"]) for e in batch] == [("a", 5), ("b", 6)]
+        assert sub.conflated == 4
+        assert broker.stats()["conflated"] == 4
+
+        # El siguiente lote espera al menos 1/max_rate
+        broker.publish(_event("a", 7))
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        batch = await sub.get_batch(timeout=0.5)
+        assert [e["id"] for e in batch] == [7]
+        assert loop.time() - t0 >= 0.04
+        assert await sub.get_batch(timeout=0.01) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+
+import msgpack
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.device_access import device_access
+from app.routers.live_ws import delta_frame
+
+
+def _token(headers):
+    return headers["Authorization"].split()[1]
+
+
+def _linked_device(client, headers):
+    device = f"ws-{uuid.uuid4().hex[:8]}"
+    client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 30.0, "humedad": 50})
+    client.post(f"/incubadora/devices/{device}/link", headers=headers)
+    return device
+
+
+def test_delta_frame_only_changed_fields():
+    last = {}
+    first = delta_frame({"id": 1, "ts_ms": 10, "device_id": "d", "temp_aire_c": 30.0, "humedad": 50.0}, last)
+    assert first["temp_aire_c"] == 30.0 and first["humedad"] == 50.0
+    second = delta_frame({"id": 2, "ts_ms": 20, "device_id": "d", "temp_aire_c": 30.5, "humedad": 50.0}, last)
+    assert second == {"op": "m", "d": "d", "id": 2, "ts_ms": 20, "temp_aire_c": 30.5}
+
+
+def test_ws_rejects_bad_token(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/incubadora/ws?token=nope") as ws:
+            ws.receive_json()
+
+
+def test_ws_auth_runs_off_event_loop(client, auth_headers, monkeypatch):
+    """Las consultas de la sesion sincrona no bloquean el bucle de eventos."""
+    loops = []
+    devices = device_access.devices
+
+    def spy(db, user_id):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return devices(db, user_id)
+
+    monkeypatch.setattr(device_access, "devices", spy)
+    with client.websocket_connect(f"/incubadora/ws?token={_token(auth_headers)}") as ws:
+        ws.send_json({"op": "ping", "t": 1})
+        assert ws.receive_json() == {"op": "pong", "t": 1}
+    assert loops == [None]
+
+
+def test_ws_subscribe_ping_and_delta(client, auth_headers):
+    """
+    Solo se puede suscribir a dispositivos propios; la primera trama trae
+    todos los campos y la siguiente solo los que cambiaron.
+    """
+    device = _linked_device(client, auth_headers)
+    with client.websocket_connect(f"/incubadora/ws?token={_token(auth_headers)}") as ws:
+        ws.send_json({"op": "ping", "t": 7})
+        assert ws.receive_json() == {"op": "pong", "t": 7}
+
+        ws.send_json({"op": "subscribe", "devices": [device, "ajeno"], "max_rate": 1000})
+        reply = ws.receive_json()
+        assert reply["devices"] == [device]
+
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 31.0, "humedad": 50})
+        first = ws.receive_json()
+        assert first["d"] == device and first["temp_aire_c"] == 31.0 and "humedad" in first
+
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 31.5, "humedad": 50})
+        second = ws.receive_json()
+        assert second["temp_aire_c"] == 31.5
+        assert "humedad" not in second
+        assert second["id"] > first["id"]
+
+
+def test_ws_drops_unlinked_device(client, auth_headers, monkeypatch):
+    """Un socket abierto deja de recibir un dispositivo desvinculado."""
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "ws_access_recheck_s", 0.0)
+    device = _linked_device(client, auth_headers)
+    with client.websocket_connect(f"/incubadora/ws?token={_token(auth_headers)}") as ws:
+        ws.send_json({"op": "subscribe", "devices": [device], "max_rate": 1000})
+        assert ws.receive_json()["devices"] == [device]
+
+        client.post(f"/incubadora/devices/{device}/unlink", headers=auth_headers)
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 33.0})
+        reply = ws.receive_json()
+        assert reply["op"] == "subscribed"
+        assert reply["devices"] == [] and reply["revoked"] == [device]
+
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 33.5})
+        ws.send_json({"op": "ping", "t": 2})
+        assert ws.receive_json() == {"op": "pong", "t": 2}
+
+
+def test_ws_msgpack(client, auth_headers):
+    device = _linked_device(client, auth_headers)
+    url = f"/incubadora/ws?token={_token(auth_headers)}&encoding=msgpack"
+    with client.websocket_connect(url) as ws:
+        ws.send_bytes(msgpack.packb({"op": "subscribe", "devices": [device]}))
+        assert msgpack.unpackb(ws.receive_bytes())["devices"] == [device]
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 32.0})
+        frame = msgpack.unpackb(ws.receive_bytes())
+        assert frame["op"] == "m" and frame["temp_aire_c"] == 32.0
@@ -0,0 +1,54 @@
+import os
+import threading
+
+import pytest
+
+from app.pubsub import MemoryTransport, PostgresTransport
+
+
+def test_memory_transport_delivers_to_handler():
+    got = []
+    t = MemoryTransport()
+    t.publish({"id": 1})  # sin receptor: se descarta
+    t.start(got.append)
+    t.publish({"id": 2, "device_id": "d"})
+    assert got == [{"id": 2, "device_id": "d"}]
+
+
+def test_postgres_publish_only_enqueues():
+    """Publicar no abre conexiones: encola y, con la cola llena, descarta."""
+    t = PostgresTransport(engine=None, queue_size=1)
+    t.publish({"id": 1, "device_id": "d"})
+    t.publish({"id": 2, "device_id": "d"})
+    stats = t.stats()
+    assert stats["notify_pending"] == 1 and stats["notify_dropped"] == 1
+    assert stats["sent"] == 0 and stats["errors"] == 0
+
+
+def test_stream_stats_reports_transport(client, admin_headers):
+    r = client.get("/incubadora/stream/stats", headers=admin_headers)
+    assert r.status_code == 200
+    assert r.json()["transport"] == "memory"
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="requires TEST_POSTGRES_URL")
+def test_postgres_transport_roundtrip():
+    """Dos transportes (dos 'workers') sobre el mismo canal reciben el evento."""
+    from sqlalchemy import create_engine
+
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    received = [[], []]
+    done = threading.Event()
+    workers = [PostgresTransport(engine, "incubadora_test", poll_timeout=0.2) for _ in range(2)]
+    for i, w in enumerate(workers):
+        w.start(lambda e, i=i: (received[i].append(e), all(received) and done.set()))
+    try:
+        for _ in range(50):  # esperar a que ambos LISTEN esten activos
+            workers[0].publish({"id": 1, "device_id": "d"})
+            if done.wait(0.2):
+                break
+        assert received[0][0]["device_id"] == "d"
+        assert received[1][0]["device_id"] == "d"
+    finally:
+        for w in workers:
+            w.stop()
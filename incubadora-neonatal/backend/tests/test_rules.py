@@ -0,0 +1,231 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import models
+from app.device_access import device_access
+from app.cache import MemoryBackend
+from app.rules import RuleEngine, TimerWheel, rule_engine
+from tests.conftest import TestingSessionLocal
+
+
+def _device(client, headers):
+    device = f"ru-{uuid.uuid4().hex[:8]}"
+    client.post("/incubadora/ingest", json={"device_id": device})
+    client.post(f"/incubadora/devices/{device}/link", headers=headers)
+    return device
+
+
+def _ingest(client, device, ts, **fields):
+    r = client.post("/incubadora/ingest", json={"device_id": device, "ts": ts.isoformat(), **fields})
+    assert r.status_code == 200
+
+
+def _rule_episodes(client, headers, device):
+    r = client.get(f"/incubadora/alerts?device_id={device}", headers=headers)
+    return [e for e in r.json() if e["rule_id"]]
+
+
+def test_timer_wheel_expires_only_due_keys():
+    wheel = TimerWheel(tick_s=1.0, slots=8)
+    wheel.schedule("a", 100.5)
+    wheel.schedule("b", 103.0)
+    wheel.schedule("far", 100.5 + 8 * 3)  # varias vueltas: misma ranura que "a"
+    assert wheel.advance(99.0) == []
+    assert wheel.advance(101.0) == ["a"]
+    wheel.cancel("b")
+    assert wheel.advance(110.0) == []
+    assert wheel.advance(125.0) == ["far"]
+    assert len(wheel) == 0
+
+
+def test_threshold_rule_with_hysteresis(client, auth_headers):
+    device = _device(client, auth_headers)
+    r = client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Aire > 37.5", "kind": "threshold", "variable": "temp_aire_c",
+        "op": ">", "threshold": 37.5, "hysteresis": 0.3, "device_id": device,
+    })
+    assert r.status_code == 201
+
+    t0 = datetime(2025, 2, 1, tzinfo=timezone.utc)
+    # 37.8 enciende, 37.4 sigue dentro de la histeresis, 37.1 apaga
+    for i, temp in enumerate((37.0, 37.8, 37.4, 37.1)):
+        _ingest(client, device, t0 + timedelta(seconds=10 * i), temp_aire_c=temp)
+
+    episodes = _rule_episodes(client, auth_headers, device)
+    assert len(episodes) == 1
+    ep = episodes[0]
+    assert ep["labels"] == ["Aire > 37.5"] and ep["mask"] == 0
+    assert ep["active"] is False
+    assert ep["duration_s"] == 20.0
+    assert ep["max_temp_aire_c"] == 37.8
+
+
+def test_rate_rule(client, auth_headers):
+    device = _device(client, auth_headers)
+    client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Humedad cae", "kind": "rate", "variable": "humedad",
+        "op": "<", "threshold": -5.0, "window_s": 120, "device_id": device,
+    })
+    t0 = datetime(2025, 2, 1, tzinfo=timezone.utc)
+    for i, hum in enumerate((60, 59.5, 50)):  # -10 en 20 s = -30/min
+        _ingest(client, device, t0 + timedelta(seconds=10 * i), humedad=hum)
+
+    episodes = _rule_episodes(client, auth_headers, device)
+    assert [e["active"] for e in episodes] == [True]
+
+
+def test_no_data_rule_uses_timer(client, auth_headers):
+    device = _device(client, auth_headers)
+    client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Sin datos", "kind": "no_data", "timeout_s": 3600, "device_id": device,
+    })
+    _ingest(client, device, datetime.now(timezone.utc), temp_aire_c=36.5)
+    assert _rule_episodes(client, auth_headers, device) == []
+
+    with TestingSessionLocal() as db:
+        rule_engine.tick(now=time.time() + 4000, db=db)
+    episodes = _rule_episodes(client, auth_headers, device)
+    assert [e["active"] for e in episodes] == [True]
+
+    # Una medicion nueva cierra el episodio
+    _ingest(client, device, datetime.now(timezone.utc), temp_aire_c=36.6)
+    assert [e["active"] for e in _rule_episodes(client, auth_headers, device)] == [False]
+
+
+def test_no_data_episode_closed_by_other_worker():
+    """Un episodio abierto por el temporizador de un worker lo cierra la medicion que llega a otro."""
+    counters = MemoryBackend()
+    workers = [RuleEngine(TestingSessionLocal, counters=counters) for _ in range(2)]
+    device = f"ru-{uuid.uuid4().hex[:8]}"
+    with TestingSessionLocal() as db:
+        rule = models.AlertRule(name="Sin datos", kind="no_data", timeout_s=60, device_id=device)
+        first = models.Measurement(device_id=device, ts=datetime.now(timezone.utc))
+        db.add_all([rule, first])
+        db.commit()
+        for w in workers:
+            w.process(db, first)
+        rules_gen = counters.counters(["rules"])
+
+        workers[0].tick(now=time.time() + 4000, db=db)
+        E = models.AlertEvent
+        [episode] = db.query(E).filter(E.rule_id == rule.id).all()
+        assert episode.ended_at is None
+
+        second = models.Measurement(device_id=device, ts=datetime.now(timezone.utc))
+        db.add(second)
+        db.commit()
+        workers[1].process(db, second)
+        db.refresh(episode)
+        assert episode.ended_at is not None and episode.end_measurement_id == second.id
+
+        # el primer worker vuelve a vigilar el dispositivo
+        workers[0].process(db, second)
+        assert not workers[0]._states[(rule.id, device)].active
+        assert (rule.id, device) in workers[0].wheel._slot_of
+        # abrir y cerrar episodios no fuerza recargar todas las reglas
+        assert counters.counters(["rules"]) == rules_gen
+
+
+def test_rule_state_checkpoint(client, auth_headers):
+    device = _device(client, auth_headers)
+    r = client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Piel alta", "kind": "threshold", "variable": "temp_piel_c",
+        "op": ">", "threshold": 37.5, "device_id": device,
+    })
+    _ingest(client, device, datetime.now(timezone.utc), temp_piel_c=38.0)
+    with TestingSessionLocal() as db:
+        rule_engine.checkpoint(db)
+        st = db.get(models.AlertRuleState, (r.json()["id"], device))
+        assert st is not None and st.active is True
+
+
+def test_delete_rule_keeps_episodes(client, auth_headers):
+    device = _device(client, auth_headers)
+    r = client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Aire alto", "kind": "threshold", "variable": "temp_aire_c",
+        "op": ">", "threshold": 37.5, "device_id": device,
+    })
+    rule_id = r.json()["id"]
+    _ingest(client, device, datetime.now(timezone.utc), temp_aire_c=38.0)
+    assert [e["active"] for e in _rule_episodes(client, auth_headers, device)] == [True]
+
+    assert client.delete(f"/incubadora/alerts/rules/{rule_id}", headers=auth_headers).status_code == 204
+    [episode] = _rule_episodes(client, auth_headers, device)
+    assert episode["rule_id"] == rule_id and episode["labels"] == ["Aire alto"]
+    assert episode["active"] is False
+    rules = client.get("/incubadora/alerts/rules", headers=auth_headers).json()
+    assert rule_id not in [rule["id"] for rule in rules]
+
+    # la regla ya no se evalua
+    _ingest(client, device, datetime.now(timezone.utc), temp_aire_c=38.5)
+    assert len(_rule_episodes(client, auth_headers, device)) == 1
+    assert client.delete(f"/incubadora/alerts/rules/{rule_id}", headers=auth_headers).status_code == 404
+
+
+def test_rule_scope_permissions(client, auth_headers):
+    r = client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Global", "kind": "no_data", "timeout_s": 60,
+    })
+    assert r.status_code == 403
+    r = client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Sin variable", "kind": "threshold", "device_id": "x",
+    })
+    assert r.status_code == 422
+
+
+def test_list_rules_uses_device_access(client, auth_headers, monkeypatch):
+    device = _device(client, auth_headers)
+    r = client.post("/incubadora/alerts/rules", headers=auth_headers, json={
+        "name": "Sin datos", "kind": "no_data", "timeout_s": 60, "device_id": device,
+    })
+    rule_id = r.json()["id"]
+    calls = []
+    devices = device_access.devices
+    monkeypatch.setattr(device_access, "devices", lambda db, user_id: calls.append(user_id) or devices(db, user_id))
+
+    r = client.get("/incubadora/alerts/rules", headers=auth_headers)
+    assert r.status_code == 200
+    assert rule_id in [rule["id"] for rule in r.json()]
+    assert calls
+
+
+def test_firmware_labels_match_frontend(client, auth_headers):
+    device = _device(client, auth_headers)
+    _ingest(client, device, datetime.now(timezone.utc), alerts=1 | 16)
+    r = client.get(f"/incubadora/alerts?device_id={device}", headers=auth_headers)
+    assert sorted(l for e in r.json() for l in e["labels"]) == ["Postura incorrecta", "Sobretemperatura"]
+
+
+def test_alerts_summary_per_bit_and_mask(client, auth_headers):
+    device = _device(client, auth_headers)
+    now = datetime.now(timezone.utc)
+    hour = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+    for i, mask in enumerate((0, 1, 1, 1, 0, 1 | 16, 16, 0)):
+        _ingest(client, device, hour + timedelta(minutes=1, seconds=30 * i), alerts=mask)
+    _ingest(client, device, hour + timedelta(hours=1, minutes=5), alerts=1)
+
+    r = client.get(f"/incubadora/alerts/summary?device_id={device}&since_minutes=180", headers=auth_headers)
+    assert r.status_code == 200
+    # La medicion de la creacion del dispositivo (sin ts) cae en el intervalo actual
+    first, second = [b for b in r.json() if b["bucket"] < now.isoformat()][:2]
+
+    assert first["samples"] == 8
+    assert first["covered_s"] == pytest.approx(7 * 30 + 120, abs=0.01)  # hueco acotado a max_gap_s
+    bits = {b["sigla"]: b for b in first["bits"]}
+    assert set(bits) == {"ST", "PI"}
+    assert (bits["ST"]["samples"], bits["ST"]["episodes"]) == (4, 2)
+    assert bits["ST"]["seconds"] == pytest.approx(120, abs=0.01)
+    assert (bits["PI"]["episodes"], bits["PI"]["minutes"]) == (1, pytest.approx(1.0, abs=0.01))
+    masks = {m["mask"]: m for m in first["masks"]}
+    assert masks[17]["labels"] == ["Sobretemperatura", "Postura incorrecta"]
+    assert [masks[m]["samples"] for m in (1, 16, 17)] == [3, 1, 1]
+
+    assert [(b["sigla"], b["episodes"], b["seconds"]) for b in second["bits"]] == [("ST", 1, 120.0)]
+
+
+def test_alerts_summary_rejects_unowned_device(client, auth_headers):
+    r = client.get(f"/incubadora/alerts/summary?device_id=nope-{uuid.uuid4().hex[:8]}", headers=auth_headers)
+    assert r.status_code == 403
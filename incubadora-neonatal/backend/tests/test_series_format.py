@@ -0,0 +1,84 @@
+import uuid
+
+
+def _linked_device(client, headers, n_points=3):
+    device = f"col-{uuid.uuid4().hex[:8]}"
+    for i in range(n_points):
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": 30 + i, "humedad": 50})
+    client.post(f"/incubadora/devices/{device}/link", headers=headers)
+    return device
+
+
+def test_series_columnar(client, auth_headers):
+    """
+    format=columnar devuelve un objeto con una lista por columna y los
+    mismos valores que el formato por filas.
+    """
+    device = _linked_device(client, auth_headers)
+
+    rows = client.get(
+        "/incubadora/query/series", params={"device_id": device}, headers=auth_headers
+    ).json()
+    r = client.get(
+        "/incubadora/query/series",
+        params={"device_id": device, "format": "columnar"},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    cols = r.json()
+    assert set(cols) == {"ts", "temp_aire_c", "temp_piel_c", "humedad", "peso_g"}
+    assert cols["temp_aire_c"] == [row["temp_aire_c"] for row in rows]
+    assert cols["humedad"] == [50, 50, 50]
+
+
+def test_series_columnar_epoch_ms(client, auth_headers):
+    """ts_format=epoch_ms emite enteros ascendentes en milisegundos."""
+    device = _linked_device(client, auth_headers)
+    r = client.get(
+        "/incubadora/query/series",
+        params={"device_id": device, "format": "columnar", "ts_format": "epoch_ms"},
+        headers=auth_headers,
+    )
+    ts = r.json()["ts"]
+    assert len(ts) == 3
+    assert all(isinstance(t, int) for t in ts)
+    assert ts == sorted(ts)
+
+
+def test_series_multi_device_grouped(client, auth_headers):
+    """
+    Varios device_id en una peticion devuelven la serie agrupada por
+    dispositivo, con el limite aplicado a cada uno.
+    """
+    a = _linked_device(client, auth_headers, n_points=3)
+    b = _linked_device(client, auth_headers, n_points=2)
+
+    r = client.get(
+        "/incubadora/query/series",
+        params={"device_id": [a, b], "limit": 2},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert set(data) == {a, b}
+    assert [p["temp_aire_c"] for p in data[a]] == [30, 31]
+    assert len(data[b]) == 2
+
+    r = client.get(
+        "/incubadora/query/series",
+        params={"group_by_device": True, "format": "columnar"},
+        headers=auth_headers,
+    )
+    data = r.json()
+    assert data[a]["temp_aire_c"] == [30, 31, 32]
+
+
+def test_series_multi_device_forbidden(client, auth_headers):
+    """Si alguno de los dispositivos no pertenece al usuario se responde 403."""
+    a = _linked_device(client, auth_headers)
+    r = client.get(
+        "/incubadora/query/series",
+        params={"device_id": [a, "not-mine"]},
+        headers=auth_headers,
+    )
+    assert r.status_code == 403
@@ -0,0 +1,38 @@
+import uuid
+
+import pytest
+
+
+def test_stats_endpoint(client, auth_headers):
+    """
+    /query/stats resume la ventana en el servidor: conteos, media,
+    percentiles y porcentaje de muestras dentro del rango objetivo.
+    """
+    device = f"stats-{uuid.uuid4().hex[:8]}"
+    for t in (30.0, 33.0, 34.0, 36.0, 38.0):
+        client.post("/incubadora/ingest", json={"device_id": device, "temp_aire_c": t, "humedad": 50})
+    client.post(f"/incubadora/devices/{device}/link", headers=auth_headers)
+
+    r = client.get(
+        "/incubadora/query/stats",
+        params={"device_id": device, "temp_aire_c_min": 32, "temp_aire_c_max": 37},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert data["samples"] == 5
+
+    air = data["variables"]["temp_aire_c"]
+    assert air["count"] == 5
+    assert air["mean"] == pytest.approx(34.2)
+    assert air["min"] == 30.0 and air["max"] == 38.0
+    assert air["p50"] == pytest.approx(34.0)
+    assert air["in_range_pct"] == pytest.approx(60.0)
+
+    assert data["variables"]["temp_piel_c"]["count"] == 0
+    assert data["variables"]["humedad"]["in_range_pct"] == pytest.approx(100.0)
+
+
+def test_stats_requires_linked_device(client, auth_headers):
+    r = client.get("/incubadora/query/stats", params={"device_id": "not-mine"}, headers=auth_headers)
+    assert r.status_code == 403
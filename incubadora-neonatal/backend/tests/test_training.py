@@ -0,0 +1,283 @@
+import math
+import os
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.export import EXPORT_COLUMNS
+from app.ml_features import (
+    FEATURE_NAMES, FEATURE_VARIABLE_INDEX, FEATURE_WINDOWS_S, ChunkFeatures, DeviceWindows, present_mask,
+)
+from app.model_store import model_store
+from app.models import Base, Measurement
+from app.training import _Progress, fit_moments, score, train, trainer
+from tests.conftest import TestingSessionLocal, engine
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Artefactos en un directorio temporal y entrenamiento en un hilo."""
+    monkeypatch.setattr(model_store, "root", str(tmp_path))
+    monkeypatch.setattr(trainer, "workers", 0)
+    yield model_store
+    trainer.shutdown()
+
+
+def _row(i, device, ts, aire):
+    values = dict.fromkeys(EXPORT_COLUMNS)
+    values.update(id=i, device_id=device, ts=ts, temp_aire_c=aire, temp_piel_c=36.5, humedad=55.0)
+    return tuple(values[c] for c in EXPORT_COLUMNS)
+
+
+def _seed(n=300, skin=True):
+    device = f"ml-{uuid.uuid4().hex[:8]}"
+    t0 = datetime.now(timezone.utc) - timedelta(seconds=5 * n)
+    with TestingSessionLocal() as db:
+        db.add_all(
+            Measurement(
+                device_id=device, ts=t0 + timedelta(seconds=5 * i),
+                temp_aire_c=36.0 + 0.3 * math.sin(i / 7),
+                temp_piel_c=36.5 + 0.1 * math.cos(i / 5) if skin else None,
+                humedad=55.0 + (i % 9) * 0.2,
+            )
+            for i in range(n)
+        )
+        db.commit()
+    return device
+
+
+def test_rolling_windows_match_numpy():
+    """Media, varianza y pendiente por minuto iguales a recalcular cada ventana."""
+    rng = np.random.default_rng(1)
+    ts = np.cumsum(rng.uniform(2.0, 20.0, 800))
+    aire = 36.0 + np.cumsum(rng.normal(0, 0.02, 800))
+    dev = DeviceWindows()
+    for t, v in zip(ts, aire):
+        dev.update(float(t), (float(v), 36.5, None))
+    x = dict(zip(FEATURE_NAMES, dev.vector()))
+
+    for w in FEATURE_WINDOWS_S:
+        m = ts > ts[-1] - w
+        t, v = ts[m], aire[m]
+        assert x[f"temp_aire_c_mean_{w // 60}m"] == pytest.approx(v.mean())
+        assert x[f"temp_aire_c_var_{w // 60}m"] == pytest.approx(v.var(), rel=1e-6, abs=1e-12)
+        assert x[f"temp_aire_c_slope_{w // 60}m"] == pytest.approx(np.polyfit(t, v, 1)[0] * 60.0, rel=1e-6)
+        assert x[f"temp_piel_c_slope_{w // 60}m"] == pytest.approx(0.0)
+        assert math.isnan(x[f"humedad_mean_{w // 60}m"])
+
+
+def test_chunk_features_cross_chunks():
+    """Las ventanas cruzan bloques y la pendiente sale en unidades por minuto."""
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    # temp_aire_c sube 0.5 cada 30 s = 1.0 por minuto
+    rows = [_row(i + 1, "d1", t0 + timedelta(seconds=30 * i), 30 + 0.5 * i) for i in range(20)]
+
+    ids, X = ChunkFeatures().push(rows)
+    # la primera fila no tiene varianza ni pendiente
+    assert ids.tolist() == list(range(2, 21))
+    assert X.shape == (19, len(FEATURE_NAMES))
+    col = {name: X[:, i] for i, name in enumerate(FEATURE_NAMES)}
+    assert np.allclose(col["temp_aire_c_slope_5m"], 1.0)
+    assert np.allclose(col["temp_piel_c_slope_60m"], 0.0)
+    assert col["temp_aire_c_value"][0] == 30.5
+    # 5 min = 10 muestras de 30 s: la ventana corta se llena y desliza
+    assert col["temp_aire_c_mean_5m"][-1] == pytest.approx(np.mean(30 + 0.5 * np.arange(10, 20)))
+    assert col["temp_aire_c_mean_60m"][-1] == pytest.approx(np.mean(30 + 0.5 * np.arange(20)))
+
+    feats = ChunkFeatures()
+    parts = [feats.push(rows[:7]), feats.push(rows[7:13]), feats.push(rows[13:])]
+    assert np.concatenate([p[0] for p in parts]).tolist() == ids.tolist()
+    assert np.allclose(np.concatenate([p[1] for p in parts]), X)
+
+
+def test_chunk_features_skip_nulls():
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = [_row(i + 1, "d1", t0 + timedelta(seconds=5 * i), None if i == 5 else 30.0) for i in range(10)]
+    ids, X = ChunkFeatures().push(rows)
+    # la fila 6 no tiene valor de aire pero si piel y humedad
+    assert ids.tolist() == list(range(2, 11))
+    mask = present_mask(X)
+    assert not mask[4, FEATURE_VARIABLE_INDEX == 0].any()
+    assert mask[4, FEATURE_VARIABLE_INDEX != 0].all()
+    assert mask[[0, 1, 2, 3, 5, 6, 7, 8]].all()
+
+    rows = [_row(i + 1, "d2", t0 + timedelta(seconds=5 * i), None) for i in range(5)]
+    ids, X = ChunkFeatures().push(rows)
+    assert ids.tolist() == [2, 3, 4, 5]
+    assert np.isnan(X[:, FEATURE_VARIABLE_INDEX == 0]).all()
+
+    rows = [_row(i + 1, "d3", t0 + timedelta(seconds=5 * i), None) for i in range(5)]
+    rows = [r[:EXPORT_COLUMNS.index("temp_piel_c")] + (None,) + r[EXPORT_COLUMNS.index("temp_piel_c") + 1:]
+            for r in rows]
+    rows = [r[:EXPORT_COLUMNS.index("humedad")] + (None,) + r[EXPORT_COLUMNS.index("humedad") + 1:] for r in rows]
+    ids, X = ChunkFeatures().push(rows)
+    assert len(ids) == 0 and X.shape == (0, len(FEATURE_NAMES))
+
+
+def test_fit_moments_pairwise_matches_complete():
+    """Sin ausencias los momentos por pares dan la covarianza de siempre."""
+    rng = np.random.default_rng(2)
+    k = len(FEATURE_NAMES)
+    X = rng.normal(size=(500, k)) @ rng.normal(size=(k, k)) * 0.1 + 3.0
+    ones = np.ones_like(X)
+    params = fit_moments(ones.T @ ones, np.zeros(k), X.T @ ones, X.T @ X, 0.05)
+    cov = np.cov(X, rowvar=False, bias=True)
+    assert np.allclose(params["mean"], X.mean(axis=0))
+    assert np.allclose(params["scale"], np.sqrt(np.diag(cov)))
+    corr = 0.95 * cov / np.outer(params["scale"], params["scale"]) + 0.05 * np.eye(k)
+    assert np.allclose(params["precision"], np.linalg.pinv(corr), atol=1e-6)
+    assert params["available"].all()
+    # una fila completa y la misma sin piel: la segunda usa solo aire y humedad
+    z = np.stack([X[0], np.where(FEATURE_VARIABLE_INDEX == 1, np.nan, X[0])])
+    sc = score(z, params)
+    assert not np.isnan(sc).any() and sc[0] != sc[1]
+    assert math.isnan(score(np.full((1, k), np.nan), params)[0])
+
+
+def test_retrain_requires_admin(client, auth_headers):
+    assert client.post("/incubadora/models/retrain", headers=auth_headers).status_code == 403
+
+
+def test_retrain_versions_and_status(client, admin_headers, store):
+    _seed()
+    r = client.get("/incubadora/models/status", headers=admin_headers)
+    assert r.status_code == 200
+    assert r.json()["training"] is False
+
+    r = client.post("/incubadora/models/retrain", headers=admin_headers)
+    assert r.status_code == 202
+    assert r.json()["training_version"] == "v0.0.1"
+    meta = trainer.future.result(timeout=60)
+    assert meta["samples"]["train"] > 0
+
+    body = client.get("/incubadora/models/status", headers=admin_headers).json()
+    assert body["algo"] == "mahalanobis"
+    assert body["version"] == "v0.0.1"
+    assert body["training"] is False
+    assert body["stage"] == "done"
+    assert body["progress"] == 1.0
+    assert body["duration_s"] > 0
+    assert body["metrics"]["threshold"] > 0
+    assert 0.0 <= body["metrics"]["val_anomaly_rate"] <= 1.0
+    assert not store.locked()
+
+    params, saved = store.load("v0.0.1")
+    assert params["precision"].shape == (len(FEATURE_NAMES), len(FEATURE_NAMES))
+    assert saved["features"] == list(FEATURE_NAMES)
+    assert saved["windows_s"] == list(FEATURE_WINDOWS_S)
+
+    client.post("/incubadora/models/retrain", headers=admin_headers)
+    trainer.future.result(timeout=60)
+    assert store.versions() == ["v0.0.1", "v0.0.2"]
+    assert store.current() == "v0.0.2"
+
+
+def test_retrain_conflict(client, admin_headers, store):
+    assert store.acquire_lock(stale_after_s=60)
+    try:
+        r = client.post("/incubadora/models/retrain", headers=admin_headers)
+        assert r.status_code == 409
+    finally:
+        store.release_lock()
+
+
+def test_progress_keeps_lock_fresh(store):
+    """Un entrenamiento que informa progreso no deja que otro tome su lock por antiguo."""
+    token = store.acquire_lock(stale_after_s=60)
+    path = os.path.join(store.path, "training.lock")
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    _Progress(store, total=10).update("features", 0.0, 5)
+    assert store.acquire_lock(stale_after_s=60) is None
+    store.release_lock(token)
+
+
+def test_failed_job_does_not_release_newer_lock(store):
+    """Si _job ya libero el lock y otro entrenamiento lo tomo, _done no lo borra."""
+    first = store.acquire_lock(stale_after_s=60)
+    store.release_lock(first)  # como el finally de _job
+    second = store.acquire_lock(stale_after_s=60)
+    assert second and second != first
+
+    fut = Future()
+    fut.set_exception(RuntimeError("boom"))
+    trainer._done(first, None, fut)
+    assert store.locked()
+    assert store.read_status()["stage"] == "error"
+
+    trainer._done(second, None, fut)  # el proceso murio sin liberarlo
+    assert not store.locked()
+
+
+class _BrokenPool:
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker killed")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_broken_training_pool_is_replaced(store, monkeypatch):
+    """Un proceso de entrenamiento muerto (OOM) no deja el pool roto para siempre."""
+    broken = _BrokenPool()
+    monkeypatch.setattr(trainer, "_executor", broken)
+    fut = Future()
+    fut.set_exception(BrokenProcessPool("worker killed"))
+    token = store.acquire_lock(stale_after_s=60)
+    trainer._done(token, broken, fut)
+    assert trainer._executor is None and broken.shut_down
+    assert not store.locked()
+
+    # si start lo encuentra roto antes que _done, reintenta con uno nuevo
+    broken = _BrokenPool()
+    monkeypatch.setattr(trainer, "_executor", broken)
+    _seed()
+    version = trainer.start(engine.url.render_as_string(hide_password=False))
+    assert trainer.future.result(timeout=60)["version"] == version
+    assert broken.shut_down and trainer._executor is not broken
+
+
+def test_retrain_error_reported(client, admin_headers, store, monkeypatch):
+    monkeypatch.setattr("app.training._MIN_SAMPLES", 10**9)
+    client.post("/incubadora/models/retrain", headers=admin_headers)
+    with pytest.raises(ValueError):
+        trainer.future.result(timeout=60)
+
+    body = client.get("/incubadora/models/status", headers=admin_headers).json()
+    assert body["stage"] == "error"
+    assert "insuficientes" in body["error"]
+    assert store.current() is None
+    assert not store.locked()
+
+
+def test_train_without_skin_temperature(store, tmp_path):
+    """Dispositivos sin ``temp_piel_c`` (colector, modo aire) entrenan con el resto."""
+    url = f"sqlite:///{tmp_path / 'noskin.db'}"
+    db_engine = create_engine(url)
+    Base.metadata.create_all(db_engine)
+    t0 = datetime.now(timezone.utc) - timedelta(hours=1)
+    with Session(db_engine) as db:
+        db.add_all(
+            Measurement(device_id="esp32", ts=t0 + timedelta(seconds=5 * i), temp_aire_c=36.0 + 0.3 * math.sin(i / 7),
+                        temp_piel_c=None, humedad=55.0 + (i % 9) * 0.2)
+            for i in range(300)
+        )
+        db.commit()
+    db_engine.dispose()
+
+    meta = train(url, store.root, store.name, "v0.0.1")
+    assert meta["samples"]["train"] > 0
+    params, _ = store.load("v0.0.1")
+    assert not params["available"][FEATURE_VARIABLE_INDEX == 1].any()
+    assert params["available"][FEATURE_VARIABLE_INDEX != 1].all()
+    assert meta["metrics"]["threshold"] > 0
@@ -0,0 +1,32 @@
+import uuid
+
+
+def test_user_listing_keyset_pages_and_filters(client, admin_headers):
+    tag = uuid.uuid4().hex[:6]
+    ids = []
+    for i in range(5):
+        name = f"pg_{tag}-{i}"
+        r = client.post(
+            "/incubadora/auth/register",
+            json={"username": name, "email": f"{name}@test.local", "password": "secret"},
+        )
+        ids.append(r.json()["id"])
+    client.patch(f"/incubadora/auth/users/{ids[1]}/toggle-active", headers=admin_headers)
+
+    url = "/incubadora/auth/users"
+    params = {"username_prefix": f"pg_{tag}", "limit": 2}
+    r = client.get(url, params=params, headers=admin_headers)
+    assert [u["id"] for u in r.json()] == ids[:2]
+    assert r.headers["X-Has-More"] == "true"
+
+    seen = [u["id"] for u in r.json()]
+    while r.headers["X-Has-More"] == "true":
+        r = client.get(url, params={**params, "after_id": r.headers["X-Next-Cursor"]}, headers=admin_headers)
+        seen += [u["id"] for u in r.json()]
+    assert seen == ids and "X-Next-Cursor" not in r.headers
+
+    r = client.get(url, params={"username_prefix": f"pg_{tag}", "is_active": False}, headers=admin_headers)
+    assert [u["id"] for u in r.json()] == [ids[1]]
+    # "%" es literal en el prefijo, no comodin de LIKE
+    r = client.get(url, params={"username_prefix": f"pg%{tag}"}, headers=admin_headers)
+    assert r.json() == []
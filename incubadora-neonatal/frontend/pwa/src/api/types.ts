@@ -17,6 +17,7 @@ export type MeasurementOut = {
   humedad?: number | null;
   peso_g?: number | null;
   alerts?: number | null;
+  anomaly_score?: number | null;
 };
 
 export interface SeriesPoint {
@@ -59,12 +60,57 @@ export interface DeviceMetrics {
   peso_g?: number | null;
 }
 
+/** Puntuacion en linea del worker que respondio */
+export interface InferenceStats {
+  pid: number;
+  enabled: boolean;
+  running: boolean;
+  model_version: string | null;
+  model_loaded_at: ISODate | null;
+  model_swaps: number;
+  model_mmap: boolean;
+  model_mapped_bytes: number;
+  queued: number;
+  submitted: number;
+  dropped: number;
+  scored: number;
+  unscored: number;
+  anomalies: number;
+  batches: number;
+  errors: number;
+  avg_batch: number;
+  throughput_per_s: number;
+  latency_p50_ms: number;
+  latency_p99_ms: number;
+}
+
+/** Version que tiene cargada cada worker */
+export interface ModelWorker {
+  pid: number;
+  host: string;
+  version: string;
+  loaded_at: ISODate | null;
+  mmap: boolean;
+  mapped_bytes: number;
+  updated_at: ISODate | null;
+}
+
 /** Estado de los modelos de ML */
 export interface ModelStatus {
   algo: string;
   version: string;
   training: boolean;
   updated_at: ISODate | null;
+  training_version?: string | null;
+  stage?: "queued" | "features" | "scoring" | "done" | "error" | null;
+  progress?: number | null;
+  started_at?: ISODate | null;
+  duration_s?: number | null;
+  samples?: Record<string, number>;
+  metrics?: Record<string, number>;
+  error?: string | null;
+  inference?: InferenceStats | null;
+  workers?: ModelWorker[];
 }
 
 
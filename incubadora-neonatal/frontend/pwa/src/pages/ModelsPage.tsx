@@ -14,13 +14,22 @@ export default function ModelsPage() {
 
   useEffect(() => { load(); }, []);
 
+  // Mientras entrena, refrescar el progreso cada 2 s
+  useEffect(() => {
+    if (!st?.training) return;
+    const id = setInterval(load, 2000);
+    return () => clearInterval(id);
+  }, [st?.training]);
+
+  const metrics = Object.entries(st?.metrics ?? {});
+
   return (
     <div className="space-y-6">
       <h1 className="text-2xl font-semibold">Modelos</h1>
 
       <div className="card space-y-3">
         <div className="text-sm text-slate-600">
-          Estado actual del modelo (stub). Al hacer reentrenar, el backend marca training=true y luego actualiza updated_at.
+          Modelo de anomalias entrenado en el servidor con ventanas de mediciones. Reentrenar lanza un proceso aparte y activa la nueva version al terminar.
         </div>
         <div className="grid grid-cols-1 md:grid-cols-4 gap-4">
           <div><div className="text-xs text-slate-500">Algo</div><div className="text-lg font-medium">{st?.algo ?? "--"}</div></div>
@@ -29,6 +38,51 @@ export default function ModelsPage() {
           <div><div className="text-xs text-slate-500">Updated at</div><div className="text-lg font-medium">{st?.updated_at?.replace("T"," ").slice(0,19) ?? "--"}</div></div>
         </div>
 
+        {st?.stage && (
+          <div className="space-y-1">
+            <div className="text-xs text-slate-500">
+              Ultimo entrenamiento {st.training_version ?? ""}: {st.stage}
+              {st.duration_s != null && ` (${st.duration_s.toFixed(1)} s)`}
+            </div>
+            {st.training && (
+              <div className="h-2 bg-slate-200 rounded">
+                <div className="h-2 bg-sky-500 rounded" style={{ width: `${Math.round((st.progress ?? 0) * 100)}%` }} />
+              </div>
+            )}
+            {st.error && <div className="text-sm text-red-600">{st.error}</div>}
+          </div>
+        )}
+
+        {metrics.length > 0 && (
+          <div className="grid grid-cols-2 md:grid-cols-5 gap-4">
+            {metrics.map(([k, v]) => (
+              <div key={k}><div className="text-xs text-slate-500">{k}</div><div className="font-medium">{v.toFixed(3)}</div></div>
+            ))}
+          </div>
+        )}
+
+        {st?.inference && (
+          <div className="grid grid-cols-2 md:grid-cols-5 gap-4">
+            <div><div className="text-xs text-slate-500">Puntuadas</div><div className="font-medium">{st.inference.scored}</div></div>
+            <div><div className="text-xs text-slate-500">Anomalias</div><div className="font-medium">{st.inference.anomalies}</div></div>
+            <div><div className="text-xs text-slate-500">Muestras/s</div><div className="font-medium">{st.inference.throughput_per_s.toFixed(1)}</div></div>
+            <div><div className="text-xs text-slate-500">p99 puntuacion</div><div className="font-medium">{st.inference.latency_p99_ms.toFixed(1)} ms</div></div>
+            <div><div className="text-xs text-slate-500">Worker {st.inference.pid}</div><div className="font-medium">{st.inference.model_version ?? "sin modelo"}</div></div>
+          </div>
+        )}
+
+        {(st?.workers?.length ?? 0) > 0 && (
+          <div className="space-y-1">
+            <div className="text-xs text-slate-500">Workers</div>
+            {st!.workers!.map(w => (
+              <div key={`${w.host}-${w.pid}`} className="text-sm">
+                {w.host} / {w.pid}: <span className="font-medium">{w.version}</span>
+                {" "}({w.mmap ? "mapeado" : "en memoria"}, {(w.mapped_bytes / 1024).toFixed(1)} KiB)
+              </div>
+            ))}
+          </div>
+        )}
+
         <div>
           <button className="btn" onClick={retrain} disabled={busy || st?.training}>Reentrenar</button>
           <button className="btn ml-2" onClick={load} disabled={busy}>Refresh</button>
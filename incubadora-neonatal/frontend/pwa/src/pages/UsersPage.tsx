@@ -13,6 +13,7 @@ interface User {
 export default function UsersPage() {
   const { token } = useAuth();
   const [users, setUsers] = useState<User[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
   const [showCreateForm, setShowCreateForm] = useState(false);
@@ -25,18 +26,21 @@ export default function UsersPage() {
 
   const BASE = (import.meta.env.VITE_API_BASE as string) || (location.origin + "/api/incubadora");
 
-  const loadUsers = async () => {
+  // Paginacion keyset: la API indica si hay mas en X-Has-More / X-Next-Cursor
+  const loadUsers = async (after?: string) => {
     setLoading(true);
     setError("");
     try {
-      const response = await fetch(`${BASE}/auth/users`, {
+      const query = after ? `?after_id=${encodeURIComponent(after)}` : "";
+      const response = await fetch(`${BASE}/auth/users${query}`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       });
       if (!response.ok) throw new Error("Error al cargar usuarios");
-      const data = await response.json();
-      setUsers(data);
+      const data: User[] = await response.json();
+      setUsers((prev) => (after ? [...prev, ...data] : data));
+      setNextCursor(response.headers.get("X-Has-More") === "true" ? response.headers.get("X-Next-Cursor") : null);
     } catch (err: any) {
       setError(err.message);
     } finally {
@@ -207,7 +211,7 @@ export default function UsersPage() {
       )}
 
       <div className="bg-white border rounded-lg overflow-hidden">
-        {loading ? (
+        {loading && users.length === 0 ? (
           <div className="p-4 text-center text-slate-600">Cargando...</div>
         ) : (
           <table className="min-w-full divide-y divide-slate-200">
@@ -295,6 +299,17 @@ export default function UsersPage() {
             </tbody>
           </table>
         )}
+        {nextCursor && (
+          <div className="p-4 text-center">
+            <button
+              onClick={() => loadUsers(nextCursor)}
+              disabled={loading}
+              className="px-4 py-2 text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+            >
+              Cargar mas
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );